@@ -0,0 +1,201 @@
+"""
+WSGI against ASGI under the same load.
+
+Starts gunicorn twice with the same number of workers - threaded WSGI workers
+(config.wsgi) and uvicorn event-loop workers (config.asgi) - and drives each
+with the load_test.py traffic mix. The async views (home, course detail, daily
+classes, Razorpay checkout) only pay off under ASGI, where a worker keeps
+serving while a request waits on the database or the payment gateway.
+
+With ``--gateway-delay`` the servers talk to a local fake Razorpay API that
+answers after that many seconds, and logged-in virtual users also create
+Razorpay orders; that is where a thread-per-request worker runs out of threads.
+
+Usage:
+    python benchmarks/asgi_load.py --users 50 --duration 30 \\
+        --username loadtest --password secret --gateway-delay 0.3
+
+Run it against a seeded database (manage.py seed_courses --courses 200
+--students 1000) with the same environment the servers would use.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import CSRF_RE, SCENARIO_WEIGHTS, LoadTest, Session  # noqa: E402
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'wsgi': ['config.wsgi:application', '--worker-class', 'gthread'],
+    'asgi': ['config.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+GATEWAY_WEIGHT = 20
+
+
+class FakeGateway(BaseHTTPRequestHandler):
+    """Razorpay's POST /orders, answering after ``delay`` seconds"""
+
+    delay = 0.0
+    ids = itertools.count(1)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.delay)
+        payload = json.dumps({'id': f'order_bench_{next(self.ids)}', 'amount': body.get('amount')}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GatewayLoadTest(LoadTest):
+    """The load_test.py mix plus Razorpay order creation for logged-in users"""
+
+    def user_loop(self, deadline):
+        if not (self.args.gateway_delay and self.args.username and self.buy_now_paths):
+            return super().user_loop(deadline)
+
+        session = Session(self.args.base_url, self.args.timeout)
+        try:
+            session.login(self.args.username, self.args.password)
+            # buy-now fills the cart and lands on the checkout page
+            _, html = session.request(random.choice(self.buy_now_paths))
+            token = CSRF_RE.search(html).group(1)
+        except (AttributeError, RuntimeError, urllib.error.URLError, OSError):
+            return super().user_loop(deadline)
+
+        scenarios = [*SCENARIO_WEIGHTS, 'razorpay_order']
+        weights = [*SCENARIO_WEIGHTS.values(), GATEWAY_WEIGHT]
+        while time.monotonic() < deadline:
+            scenario = random.choices(scenarios, weights)[0]
+            if scenario == 'razorpay_order':
+                self.timed_post(session, 'razorpay_order', '/payments/payment/razorpay/create-order/', token)
+            elif scenario == 'checkout':
+                self.timed(session, 'checkout', random.choice(self.buy_now_paths))
+            elif scenario == 'home':
+                self.timed(session, 'home', '/')
+            elif scenario == 'course_list':
+                self.timed(session, 'course_list', f'/courses/?page={random.randint(1, 3)}')
+            else:
+                self.timed(session, 'course_detail', random.choice(self.course_paths))
+
+    def timed_post(self, session, name, path, token):
+        start = time.perf_counter()
+        ok = True
+        try:
+            status, _ = session.request(path, {'csrfmiddlewaretoken': token})
+            ok = status < 400
+        except (urllib.error.URLError, OSError):
+            ok = False
+        self.record(name, time.perf_counter() - start, ok)
+
+
+def start_gateway(delay):
+    FakeGateway.delay = delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGateway)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_until_up(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=5):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+def run_mode(mode, args, env):
+    base_url = f'http://127.0.0.1:{args.port}'
+    command = [
+        sys.executable, '-m', 'gunicorn', *MODES[mode],
+        '--bind', f'127.0.0.1:{args.port}',
+        '--workers', str(args.workers),
+        '--threads', str(args.threads),
+        '--max-requests', '0',
+    ]
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(base_url)
+        test = GatewayLoadTest(argparse.Namespace(**{**vars(args), 'base_url': base_url}))
+        elapsed = test.run()
+        print(f'\n== {mode.upper()} ==', end='')
+        test.report(elapsed)
+        return test, elapsed
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def compare(results):
+    names = [*SCENARIO_WEIGHTS, 'razorpay_order']
+    print(f"\n{'Endpoint':<15} {'WSGI req/s':>11} {'ASGI req/s':>11} {'WSGI p95':>9} {'ASGI p95':>9}")
+    for name in [*names, 'total']:
+        row = []
+        for mode in MODES:
+            test, elapsed = results[mode]
+            if name == 'total':
+                values = [v for values in test.latencies.values() for v in values]
+            else:
+                values = test.latencies.get(name, [])
+            p95 = sorted(values)[int(len(values) * 0.95)] * 1000 if values else 0
+            row.append((len(values) / elapsed, p95))
+        if any(rate for rate, _ in row):
+            (wsgi_rate, wsgi_p95), (asgi_rate, asgi_p95) = row
+            print(f"{name:<15} {wsgi_rate:>11.1f} {asgi_rate:>11.1f} {wsgi_p95:>9.0f} {asgi_p95:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='Workers per server (same for both modes)')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per WSGI worker')
+    parser.add_argument('--users', type=int, default=50, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=int, default=30, help='Seconds per mode')
+    parser.add_argument('--think-time', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--username', help='Account used for checkout traffic')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--gateway-delay', type=float, default=0.0, help='Fake Razorpay response time (s); 0 disables')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    env = {**os.environ, 'PROFILING_ENABLED': 'False'}
+    if args.gateway_delay:
+        gateway = start_gateway(args.gateway_delay)
+        env.update({
+            'RAZORPAY_API_URL': f'http://127.0.0.1:{gateway.server_port}',
+            'RAZORPAY_KEY_ID': 'rzp_bench_key',
+            'RAZORPAY_KEY_SECRET': 'rzp_bench_secret',
+        })
+
+    results = {mode: run_mode(mode, args, env) for mode in args.modes}
+    if len(results) == len(MODES):
+        compare(results)
+
+
+if __name__ == '__main__':
+    main()
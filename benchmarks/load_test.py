@@ -0,0 +1,191 @@
+"""
+Closed-loop load test against a running instance.
+
+Virtual users loop over a weighted mix of the catalog and checkout pages for a
+fixed duration and the script reports throughput and latency percentiles per
+endpoint. Only the standard library is used, so it runs anywhere Python does.
+
+Usage:
+    gunicorn config.wsgi:application &
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 \\
+        --users 50 --duration 60 --username loadtest --password secret
+
+Checkout traffic needs an account without 2FA enabled; without credentials
+only the anonymous catalog pages are exercised.
+"""
+
+import argparse
+import http.cookiejar
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+COURSE_LINK_RE = re.compile(r'href="(/courses/(?!search/|category/|instructor/|ajax/)[\w-]+/)"')
+BUY_NOW_RE = re.compile(r'href="(/payments/buy-now/\d+/)"')
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+SCENARIO_WEIGHTS = {
+    'home': 30,
+    'course_list': 30,
+    'course_detail': 30,
+    'checkout': 10,
+}
+
+
+class Session:
+    """One virtual user with its own cookie jar"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, path, data=None):
+        url = self.base_url + path
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body, headers={'Referer': url})
+        with self.opener.open(request, timeout=self.timeout) as response:
+            return response.status, response.read().decode('utf-8', errors='replace')
+
+    def login(self, username, password):
+        _, html = self.request('/users/login/')
+        match = CSRF_RE.search(html)
+        if not match:
+            raise RuntimeError('No CSRF token on the login page')
+        self.request('/users/login/', {
+            'csrfmiddlewaretoken': match.group(1),
+            'username': username,
+            'password': password,
+        })
+        # Accounts without 2FA finish logging in through the skip endpoint
+        _, html = self.request('/users/2fa/skip/')
+        if '/users/logout/' not in html:
+            raise RuntimeError(f'Login failed for {username}')
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        self.course_paths = []
+        self.buy_now_paths = []
+
+    def discover(self):
+        """Collect course detail and buy-now URLs from the catalog"""
+        session = Session(self.args.base_url, self.args.timeout)
+        _, html = session.request('/courses/')
+        self.course_paths = sorted(set(COURSE_LINK_RE.findall(html)))
+        if not self.course_paths:
+            raise RuntimeError('No published courses found - seed the database first')
+
+        for path in self.course_paths:
+            _, html = session.request(path)
+            self.buy_now_paths.extend(BUY_NOW_RE.findall(html))
+
+    def record(self, name, elapsed, ok):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+
+    def timed(self, session, name, path):
+        start = time.perf_counter()
+        ok = True
+        try:
+            status, _ = session.request(path)
+            ok = status < 400
+        except (urllib.error.URLError, OSError):
+            ok = False
+        self.record(name, time.perf_counter() - start, ok)
+
+    def user_loop(self, deadline):
+        session = Session(self.args.base_url, self.args.timeout)
+        logged_in = False
+        if self.args.username and self.buy_now_paths:
+            try:
+                session.login(self.args.username, self.args.password)
+                logged_in = True
+            except (RuntimeError, urllib.error.URLError, OSError):
+                pass
+
+        scenarios = [s for s in SCENARIO_WEIGHTS if s != 'checkout' or logged_in]
+        weights = [SCENARIO_WEIGHTS[s] for s in scenarios]
+
+        while time.monotonic() < deadline:
+            scenario = random.choices(scenarios, weights)[0]
+            if scenario == 'home':
+                self.timed(session, 'home', '/')
+            elif scenario == 'course_list':
+                self.timed(session, 'course_list', f'/courses/?page={random.randint(1, 3)}')
+            elif scenario == 'course_detail':
+                self.timed(session, 'course_detail', random.choice(self.course_paths))
+            else:
+                # buy-now resets the cart and redirects to the checkout page
+                self.timed(session, 'checkout', random.choice(self.buy_now_paths))
+
+            if self.args.think_time:
+                time.sleep(random.uniform(0, self.args.think_time))
+
+    def run(self):
+        self.discover()
+        deadline = time.monotonic() + self.args.duration
+        threads = [
+            threading.Thread(target=self.user_loop, args=(deadline,), daemon=True)
+            for _ in range(self.args.users)
+        ]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+    def report(self, elapsed):
+        def percentile(values, pct):
+            if len(values) < 2:
+                return values[0] if values else 0
+            return statistics.quantiles(values, n=100)[pct - 1]
+
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\n{self.args.users} users for {elapsed:.1f}s against {self.args.base_url}")
+        print(f"{'Endpoint':<15} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name in SCENARIO_WEIGHTS:
+            values = self.latencies.get(name)
+            if not values:
+                continue
+            print(
+                f"{name:<15} {len(values):>9} {self.errors[name]:>7} {len(values) / elapsed:>8.1f} "
+                f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} "
+                f"{percentile(values, 99) * 1000:>8.1f}"
+            )
+        print(f"{'total':<15} {total:>9} {sum(self.errors.values()):>7} {total / elapsed:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=int, default=30, help='Test length in seconds')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between requests (s)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--username', help='Account used for checkout traffic')
+    parser.add_argument('--password', default='')
+    args = parser.parse_args()
+
+    test = LoadTest(args)
+    elapsed = test.run()
+    test.report(elapsed)
+
+
+if __name__ == '__main__':
+    main()
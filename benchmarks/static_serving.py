@@ -0,0 +1,125 @@
+"""
+Static file throughput: django.views.static.serve (the old DEBUG urls.py
+route) against config.staticfiles.StaticFilesMiddleware.
+
+Both paths are driven in-process through the full WSGI handler, so the numbers
+include middleware and URL resolution overhead but not network I/O.
+
+Usage:
+    python benchmarks/static_serving.py [--requests 2000] [--size 100000]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.conf.urls.static import static  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.urls import clear_url_caches  # noqa: E402
+
+from config import urls as project_urls  # noqa: E402
+from config.staticfiles import compress_file  # noqa: E402
+
+
+def make_asset(root, size):
+    """Write a CSS-like asset of roughly ``size`` bytes plus its compressed variants"""
+    css_dir = Path(root) / 'css'
+    css_dir.mkdir(parents=True, exist_ok=True)
+    rule = '.course-card .card-body { padding: 1rem; color: #1c1d1f; }\n'
+    path = css_dir / 'bench.css'
+    path.write_text(rule * (size // len(rule) + 1))
+    compress_file(str(path))
+    return '/static/css/bench.css'
+
+
+def make_environ(url, method='GET', headers=None):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+    environ.update(headers or {})
+    return environ
+
+
+def run(handler, url, count, headers=None):
+    status_holder = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        status_holder['status'] = status
+
+    transferred = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        body = handler(make_environ(url, headers=headers), start_response)
+        for chunk in body:
+            transferred += len(chunk)
+        if hasattr(body, 'close'):
+            body.close()
+    elapsed = time.perf_counter() - start
+    return count / elapsed, transferred / count, status_holder.get('status')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=100_000, help='Asset size in bytes')
+    args = parser.parse_args()
+
+    static_root = tempfile.mkdtemp()
+    try:
+        url = make_asset(static_root, args.size)
+        original_patterns = list(project_urls.urlpatterns)
+
+        results = []
+
+        # Old setup: DEBUG static() route, no middleware
+        middleware = [m for m in settings.MIDDLEWARE if m != 'config.staticfiles.StaticFilesMiddleware']
+        project_urls.urlpatterns = original_patterns + static(settings.STATIC_URL, document_root=static_root)
+        clear_url_caches()
+        with override_settings(STATIC_ROOT=static_root, MIDDLEWARE=middleware, ALLOWED_HOSTS=['*']):
+            results.append(('django.views.static.serve', run(WSGIHandler(), url, args.requests)))
+
+        # New setup: middleware, no static() route
+        project_urls.urlpatterns = original_patterns
+        clear_url_caches()
+        with override_settings(STATIC_ROOT=static_root, ALLOWED_HOSTS=['*']):
+            handler = WSGIHandler()
+            results.append(('StaticFilesMiddleware identity', run(handler, url, args.requests)))
+            results.append(('StaticFilesMiddleware brotli/gzip', run(
+                handler, url, args.requests, {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+            )))
+            etag = handler(make_environ(url, method='HEAD'), lambda *a: None).headers['ETag']
+            results.append(('StaticFilesMiddleware 304 revalidation', run(
+                handler, url, args.requests, {'HTTP_IF_NONE_MATCH': etag}
+            )))
+    finally:
+        shutil.rmtree(static_root, ignore_errors=True)
+
+    baseline = results[0][1][0]
+    print(f"{'Mode':<40} {'req/s':>10} {'bytes/req':>12} {'speedup':>9}  status")
+    for label, (rate, size, status) in results:
+        print(f"{label:<40} {rate:>10.0f} {size:>12.0f} {rate / baseline:>8.1f}x  {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Fake Razorpay webhook deliveries against a running instance.
+
+Senders post signed ``payment.captured`` events to the webhook endpoint in a
+closed loop for a fixed duration, and the script reports how quickly the
+deliveries were acknowledged. The receiver only stores each event (see
+payments/webhooks.py), so acknowledgements should stay in single-digit
+milliseconds however far behind the background consumer falls. Only the
+standard library is used.
+
+Usage:
+    RAZORPAY_WEBHOOK_SECRET=whsec_local gunicorn config.wsgi:application &
+    python benchmarks/webhook_load.py --base-url http://127.0.0.1:8000 \\
+        --senders 20 --duration 30 --secret whsec_local --duplicate-rate 0.1
+
+Events name made-up Razorpay orders unless ``--order-ids`` lists real ones, so
+the consumer records them as unmatched; pass the ids of pending Razorpay
+orders to exercise fulfilment too. ``--duplicate-rate`` resends that share of
+events with their original event id, as Razorpay does when an acknowledgement
+is lost.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+WEBHOOK_PATH = '/payments/payment/razorpay/webhook/'
+
+
+def fake_event(secret, order_id, amount):
+    """A signed ``payment.captured`` delivery shaped like Razorpay's: ``(body, headers)``"""
+    body = json.dumps({
+        'entity': 'event',
+        'event': 'payment.captured',
+        'contains': ['payment'],
+        'payload': {'payment': {'entity': {
+            'id': f'pay_{uuid.uuid4().hex[:14]}', 'entity': 'payment', 'amount': amount, 'currency': 'INR',
+            'status': 'captured', 'order_id': order_id, 'method': 'upi',
+        }}},
+        'created_at': int(time.time()),
+    }).encode()
+    return body, {
+        'Content-Type': 'application/json',
+        'X-Razorpay-Signature': hmac.new(secret.encode(), body, hashlib.sha256).hexdigest(),
+        'X-Razorpay-Event-Id': f'evt_{uuid.uuid4().hex[:14]}',
+    }
+
+
+class WebhookLoad:
+    def __init__(self, args):
+        self.args = args
+        self.url = args.base_url.rstrip('/') + WEBHOOK_PATH
+        self.order_ids = [order_id for order_id in (args.order_ids or '').split(',') if order_id]
+        self.latencies = []
+        self.errors = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+
+    def post(self, body, headers):
+        start = time.perf_counter()
+        ok = True
+        try:
+            request = urllib.request.Request(self.url, data=body, headers=headers)
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+            self.errors += not ok
+
+    def sender_loop(self, deadline):
+        sent = []
+        while time.monotonic() < deadline:
+            if sent and random.random() < self.args.duplicate_rate:
+                body, headers = random.choice(sent)
+                with self.lock:
+                    self.duplicates += 1
+            else:
+                order_id = random.choice(self.order_ids) if self.order_ids else f'order_fake{uuid.uuid4().hex[:10]}'
+                body, headers = fake_event(self.args.secret, order_id, self.args.amount)
+                sent.append((body, headers))
+            self.post(body, headers)
+
+    def run(self):
+        deadline = time.monotonic() + self.args.duration
+        threads = [
+            threading.Thread(target=self.sender_loop, args=(deadline,), daemon=True)
+            for _ in range(self.args.senders)
+        ]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+    def report(self, elapsed):
+        values = sorted(self.latencies)
+        if not values:
+            print('No deliveries were sent')
+            return
+        quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else [values[0]] * 99
+        under_10ms = sum(value < 0.010 for value in values)
+        print(f"\n{self.args.senders} senders for {elapsed:.1f}s against {self.url}")
+        print(f"{'deliveries':>10} {'duplicates':>10} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'<10 ms':>7}")
+        print(
+            f"{len(values):>10} {self.duplicates:>10} {self.errors:>7} {len(values) / elapsed:>8.1f} "
+            f"{quantiles[49] * 1000:>8.1f} {quantiles[94] * 1000:>8.1f} {quantiles[98] * 1000:>8.1f} "
+            f"{under_10ms / len(values):>7.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--senders', type=int, default=10, help='Concurrent senders')
+    parser.add_argument('--duration', type=int, default=30, help='Test length in seconds')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--secret', default=os.environ.get('RAZORPAY_WEBHOOK_SECRET', ''),
+                        help="The server's RAZORPAY_WEBHOOK_SECRET")
+    parser.add_argument('--order-ids', help='Comma-separated Razorpay order ids to pay (made up if omitted)')
+    parser.add_argument('--amount', type=int, default=49900, help='Captured amount in paise')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='Share of deliveries that are resends')
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error('--secret (or RAZORPAY_WEBHOOK_SECRET) is required to sign the events')
+
+    load = WebhookLoad(args)
+    elapsed = load.run()
+    load.report(elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Helpers for views and middleware that run natively under ASGI.
+
+Django 4.2's ORM is synchronous, and every ``sync_to_async`` call made for one
+request runs on that request's single sync thread, so awaiting querysets one
+after another still runs them back to back. ``gather_queries`` runs each
+callable on a pool thread with its own database connection instead, so
+independent queries overlap. Pass callables that evaluate their queryset
+(``lambda: list(qs)``); a lazy queryset would only run later, in the template.
+
+The pool is one ``ThreadPoolExecutor`` of ``ASYNC_QUERY_THREADS`` threads per
+process, not the event loop's default executor. Under WSGI every async view
+gets a fresh event loop, and its default executor (with its threads and
+their connections) is shut down with it, so each request would open new
+database connections. The shared pool's threads live as long as the process
+and reuse their connections within ``CONN_MAX_AGE``.
+
+With ``ASYNC_CONCURRENT_QUERIES`` off, everything runs on the request thread.
+
+Django's ``login_required`` and ``require_POST`` only support async views from
+Django 5.0, so async versions live here too.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import render
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _query_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(settings.ASYNC_QUERY_THREADS, thread_name_prefix='async-query')
+    return _executor
+
+
+def close_pool_connections():
+    """Close the database connections held by the query threads (tests drop their database afterwards)"""
+    if _executor is None:
+        return
+    # Every thread must take one task, so none may finish before all have started
+    barrier = threading.Barrier(settings.ASYNC_QUERY_THREADS)
+
+    def close():
+        barrier.wait(timeout=5)
+        connections.close_all()
+
+    for future in [_executor.submit(close) for _ in range(settings.ASYNC_QUERY_THREADS)]:
+        future.result()
+
+
+def _with_own_connection(func):
+    def run(*args, **kwargs):
+        # Pool threads keep their connections between calls, like WSGI
+        # threads keep theirs between requests (CONN_MAX_AGE)
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return run
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable off the event loop, in parallel with others when enabled"""
+    if settings.ASYNC_CONCURRENT_QUERIES:
+        return sync_to_async(
+            _with_own_connection(func), thread_sensitive=False, executor=_query_executor(),
+        )(*args, **kwargs)
+    return sync_to_async(func)(*args, **kwargs)
+
+
+async def gather_queries(*funcs):
+    """Run independent blocking callables concurrently; results come back in order"""
+    return await asyncio.gather(*(run_blocking(func) for func in funcs))
+
+
+async def arender(request, template_name, context=None, **kwargs):
+    """``render()`` on the request thread, where lazy template lookups may query"""
+    return await sync_to_async(render)(request, template_name, context, **kwargs)
+
+
+def _load_user(request):
+    # request.user is lazy; touching it loads the session and the user
+    request.user.is_authenticated
+    return request.user
+
+
+async def aget_user(request):
+    """``request.user``, loaded without blocking the event loop"""
+    return await sync_to_async(_load_user)(request)
+
+
+def login_required(view):
+    """``django.contrib.auth.decorators.login_required`` for async views"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Imported here: config.metrics (imported by models) pulls in this module
+        from django.contrib.auth.views import redirect_to_login
+
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def require_POST(view):
+    """``django.views.decorators.http.require_POST`` for async views"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs without a thread hop under both WSGI and ASGI.
+
+    Subclasses implement ``handle(request)`` and ``async ahandle(request)``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        raise NotImplementedError
@@ -0,0 +1,51 @@
+"""
+In-process background execution for work that should not block a request.
+
+Jobs are handed to a small thread pool once the surrounding database
+transaction commits, so they always see committed rows.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .metrics import BACKGROUND_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+            thread_name_prefix='background',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {func.__name__} failed")
+    finally:
+        BACKGROUND_QUEUE_DEPTH.dec()
+        # Worker threads get their own DB connections; don't leak them
+        connections.close_all()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in the background after the current transaction commits"""
+    def submit():
+        if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+            func(*args, **kwargs)
+        else:
+            BACKGROUND_QUEUE_DEPTH.inc()
+            _get_executor().submit(_run, func, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,238 @@
+"""
+Prometheus metrics, exposed at ``/metrics``.
+
+Request latency and query counts are recorded by ``MetricsMiddleware``.
+Business counters (orders, enrollments, 2FA) are incremented where those
+events happen, and the pending-payment backlog is read from the database
+at scrape time, at most once every ``BACKLOG_CACHE_SECONDS`` across all
+workers.
+
+The endpoint needs ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+token it is open only when ``DEBUG`` is on, and refused otherwise.
+
+Under gunicorn every worker is a separate process. Set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty, writable directory before the
+workers start: each worker then writes its samples to memory-mapped files
+there, and a scrape of any worker aggregates all of them (gunicorn.conf.py
+cleans up after workers that exit). Without it, each process reports only
+its own numbers, which is fine for ``runserver`` and tests.
+"""
+
+import hmac
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.db.models import Count, Min
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_GET
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from monitoring.queries import QueryCounter, observe_queries
+
+from .async_views import HybridMiddleware
+
+_MISSING = object()
+
+# Scrapers poll every worker every few seconds; the backlog changes on a human scale
+BACKLOG_CACHE_SECONDS = 15
+BACKLOG_CACHE_KEY = 'metrics:payment_backlog'
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to produce a response, by URL name',
+    ['view', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries per request, by URL name',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+RESPONSES = Counter('http_responses', 'Responses by URL name and status class', ['view', 'status'])
+
+ORDERS_CREATED = Counter('orders_created', 'Orders created', ['payment_method', 'status'])
+ENROLLMENTS_CREATED = Counter('enrollments_created', 'Enrollments created')
+
+EMAIL_SEND_LATENCY = Histogram('email_send_duration_seconds', 'Time spent handing mail to the email backend', ['result'])
+EMAILS_IN_FLIGHT = Gauge('emails_in_flight', 'Emails currently being sent', multiprocess_mode='livesum')
+BACKGROUND_QUEUE_DEPTH = Gauge(
+    'background_tasks_queued', 'Background jobs (thumbnails, documents) waiting or running', multiprocess_mode='livesum'
+)
+
+TWO_FACTOR_ATTEMPTS = Counter('two_factor_attempts', '2FA code verifications by result', ['result'])
+TWO_FACTOR_LOCKOUTS = Counter('two_factor_lockouts', 'Accounts locked after too many failed 2FA codes')
+
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups by backend and result', ['backend', 'result'])
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# labels() takes the metric's lock; resolved children are reused without it
+_children = {}
+
+
+def child(metric, *labels):
+    key = (metric, labels)
+    resolved = _children.get(key)
+    if resolved is None:
+        resolved = _children[key] = metric.labels(*labels)
+    return resolved
+
+
+def record_order_created(order):
+    """Count an order once its transaction commits"""
+    labels = (order.payment_method or 'unknown', order.payment_status)
+    transaction.on_commit(lambda: child(ORDERS_CREATED, *labels).inc())
+
+
+def record_enrollment_created():
+    transaction.on_commit(ENROLLMENTS_CREATED.inc)
+
+
+def _cache_get(original):
+    def get(self, key, default=None, version=None):
+        value = original(self, key, _MISSING, version)
+        child(CACHE_REQUESTS, type(self).__name__, 'miss' if value is _MISSING else 'hit').inc()
+        return default if value is _MISSING else value
+    return get
+
+
+def _cache_get_many(original):
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = original(self, keys, version)
+        backend = type(self).__name__
+        child(CACHE_REQUESTS, backend, 'hit').inc(len(found))
+        child(CACHE_REQUESTS, backend, 'miss').inc(len(keys) - len(found))
+        return found
+    return get_many
+
+
+def _send_messages(original):
+    def send_messages(self, email_messages):
+        EMAILS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        result = 'failed'
+        try:
+            sent = original(self, email_messages)
+            result = 'sent'
+            return sent
+        finally:
+            EMAILS_IN_FLIGHT.dec()
+            child(EMAIL_SEND_LATENCY, result).observe(time.perf_counter() - start)
+    return send_messages
+
+
+def install_hooks():
+    """Instrument the configured cache and email backends"""
+    from django.core.cache.backends.base import BaseCache
+
+    from .profiling import wrap_method
+
+    for options in settings.CACHES.values():
+        backend = import_string(options['BACKEND'])
+        wrap_method(backend, 'get', _cache_get, marker='metered')
+        # BaseCache.get_many loops over get(), which is already counted
+        if backend.get_many is not BaseCache.get_many:
+            wrap_method(backend, 'get_many', _cache_get_many, marker='metered')
+
+    wrap_method(import_string(settings.EMAIL_BACKEND), 'send_messages', _send_messages, marker='metered')
+
+
+def _backlog():
+    from payments.models import PaymentTransaction
+
+    rows = cache.get(BACKLOG_CACHE_KEY)
+    if rows is None:
+        rows = list(
+            PaymentTransaction.objects.filter(status='pending')
+            .values('payment_method')
+            .annotate(count=Count('id'), oldest=Min('created_at'))
+            .order_by()
+        )
+        cache.set(BACKLOG_CACHE_KEY, rows, BACKLOG_CACHE_SECONDS)
+    return rows
+
+
+class BacklogCollector:
+    """Pending payment verifications, read from the database (or the cache) on each scrape"""
+
+    def collect(self):
+        pending = GaugeMetricFamily(
+            'payment_transactions_pending', 'Payment transactions awaiting verification', labels=['payment_method']
+        )
+        oldest = GaugeMetricFamily(
+            'payment_transactions_pending_oldest_seconds', 'Age of the oldest pending transaction', labels=['payment_method']
+        )
+        now = timezone.now()
+        for row in _backlog():
+            pending.add_metric([row['payment_method']], row['count'])
+            oldest.add_metric([row['payment_method']], (now - row['oldest']).total_seconds())
+        yield pending
+        yield oldest
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record latency and query count of every request; removed unless METRICS_ENABLED"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        install_hooks()
+
+    def handle(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start, queries.count)
+        return response
+
+    async def ahandle(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start, queries.count)
+        return response
+
+    def observe(self, request, response, elapsed, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        child(REQUEST_LATENCY, view, method).observe(elapsed)
+        child(REQUEST_QUERIES, view).observe(queries)
+        child(RESPONSES, view, f'{response.status_code // 100}xx').inc()
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus text exposition"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    backlog = CollectorRegistry()
+    backlog.register(BacklogCollector())
+
+    return HttpResponse(generate_latest(registry) + generate_latest(backlog), content_type=CONTENT_TYPE_LATEST)
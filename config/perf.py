@@ -0,0 +1,359 @@
+"""
+View performance harness.
+
+Seeds a realistic dataset (courses via ``seed_courses`` plus students,
+enrollments, orders and reviews) and drives every URL in the courses,
+enrollment, payments, reviews and users apps, and their admin changelists,
+through the test client. For
+each scenario it records the status, the number of SQL queries and wall-time
+percentiles, and checks the status and query count against the scenario's.
+
+Each scenario is requested once to warm the caches, then ``PERF_REPEAT``
+times to measure. Every request runs in a transaction that is rolled back
+afterwards, so a state-changing request (adding to the wishlist, enrolling,
+logging out) takes its real path every time instead of finding its work
+done. The budget is checked against the most queries any measured request
+made. A scenario whose URL is known to be broken is skipped, with the reason
+in the report.
+
+``config.tests.ViewPerformanceTests`` runs it as part of the test suite:
+
+    PERF_REPORT_PATH=perf_report.json python manage.py test config.tests.ViewPerformanceTests
+
+The JSON report is written with sorted keys so two runs can be diffed.
+Budgets assume the default dataset size (``PERF_COURSES``); with a different
+size the report is still produced but budgets are not enforced.
+"""
+
+import json
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+DEFAULT_COURSES = 30
+DEFAULT_REPEAT = 5
+
+
+class Scenario:
+    """One request to measure"""
+
+    def __init__(self, name, url_name, kwargs=None, method='get', data=None, query='', user=None, session=None,
+                 budget=None, status=200, skip=''):
+        self.name = name
+        self.url_name = url_name
+        self.kwargs = kwargs or {}
+        self.method = method
+        self.data = data or {}
+        self.query = query
+        self.user = user
+        self.session = session or {}
+        self.budget = budget
+        self.status = status
+        self.skip = skip
+
+    def url(self, dataset):
+        kwargs = self.kwargs(dataset) if callable(self.kwargs) else self.kwargs
+        url = reverse(self.url_name, kwargs=kwargs)
+        return f'{url}?{self.query}' if self.query else url
+
+
+class Dataset:
+    """References to the seeded objects scenarios need for their URLs"""
+
+
+def seed_dataset(courses=DEFAULT_COURSES, seed=0):
+    """Build the benchmark dataset inside the current (test) database"""
+    from courses.models import Course, Lecture
+    from enrollment.models import Certificate, DailyClass, Enrollment, LectureProgress, Wishlist
+    from payments.models import Cart, CartItem, Coupon, Invoice, Order, OrderItem, PaymentTransaction
+    from reviews.models import Review
+    from users.models import TwoFactorAuth, User
+
+    random.seed(seed)
+    with open(os.devnull, 'w') as devnull:
+        call_command('seed_courses', courses=courses, stdout=devnull)
+
+    data = Dataset()
+    published = list(Course.objects.filter(is_published=True).order_by('id'))
+    paid = [c for c in published if c.price > 0]
+    free = [c for c in published if c.price == 0]
+
+    data.instructor = User.objects.filter(is_instructor=True).order_by('id').first()
+    data.instructor_course = Course.objects.filter(instructor=data.instructor).order_by('id').first()
+    data.instructor_section = data.instructor_course.sections.order_by('order').first()
+
+    data.student = User.objects.create_user(username='perf_student', email='student@example.com', password='password123')
+    data.admin = User.objects.create_superuser(username='perf_admin', email='admin@example.com', password='password123')
+    data.two_factor_user = User.objects.create_user(
+        username='perf_2fa', email='2fa@example.com', password='password123', two_factor_enabled=True,
+    )
+    TwoFactorAuth.objects.create(user=data.two_factor_user, verification_code='123456')
+    others = [
+        User.objects.create_user(username=f'perf_user_{i}', email=f'user{i}@example.com', password='password123')
+        for i in range(10)
+    ]
+
+    # The student owns a few courses with partial progress
+    data.enrolled_course = paid[0]
+    enrolled = paid[:3]
+    for course in enrolled:
+        enrollment = Enrollment.objects.create(user=data.student, course=course)
+        lectures = Lecture.objects.filter(section__course=course).order_by('section__order', 'order')[:5]
+        for lecture in lectures:
+            LectureProgress.objects.create(enrollment=enrollment, lecture=lecture, is_completed=True)
+    data.lecture = Lecture.objects.filter(section__course=data.enrolled_course).order_by('section__order', 'order').first()
+    data.certificate = Certificate.objects.create(user=data.student, course=enrolled[0], certificate_number='CERT-PERF-0001')
+
+    # Reviews from everyone on the popular courses
+    for user in [data.student] + others:
+        for course in random.sample(published[:8], 3):
+            Review.objects.get_or_create(
+                user=user, course=course, defaults={'rating': random.randint(3, 5), 'comment': 'Useful course'}
+            )
+    data.review = Review.objects.filter(user=data.student).order_by('id').first()
+
+    # Order history: a mix of completed and pending UPI orders
+    data.orders = []
+    for i in range(8):
+        items = random.sample(paid, 2)
+        total = sum(c.get_actual_price() for c in items)
+        order = Order.objects.create(
+            user=data.student, total_amount=total, final_amount=total,
+            payment_method='upi', payment_status='completed' if i % 2 else 'pending',
+        )
+        for course in items:
+            OrderItem.objects.create(order=order, course=course, price=course.get_actual_price())
+        PaymentTransaction.objects.create(
+            order=order, transaction_id=f'PERF-UTR-{i}', payment_method='upi', amount=total,
+            status='success' if i % 2 else 'pending', upi_transaction_ref=f'PERF-UTR-{i}',
+        )
+        if order.payment_status == 'completed':
+            Invoice.objects.create(
+                order=order, invoice_number=f'INV-PERF-{i}', subtotal=total, total_amount=total,
+            )
+        data.orders.append(order)
+
+    today = timezone.now().date()
+    for offset in range(-3, 8):
+        for course in [None] + enrolled:
+            DailyClass.objects.create(
+                date=today + timedelta(days=offset), course=course, title='Live session',
+                description='Agenda', meet_link='https://meet.google.com/abc-defg-hij',
+                scheduled_time='18:00', created_by=data.instructor,
+            )
+
+    data.wishlist_course = paid[3]
+    Wishlist.objects.create(user=data.student, course=data.wishlist_course)
+    data.free_course = free[0] if free else None
+    data.cart_course = paid[4]
+    cart = Cart.objects.create(user=data.student)
+    data.cart_item = CartItem.objects.create(cart=cart, course=data.cart_course)
+    Coupon.objects.create(
+        code='PERF10', discount_type='percentage', discount_value=Decimal('10'),
+        valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=30),
+    )
+    return data
+
+
+def calendar_kwargs(dataset):
+    from enrollment.feeds import feed_token
+
+    return {'token': feed_token(dataset.student)}
+
+
+# Budgets are the query counts the views need today on the default dataset.
+# Lower them when a view gets faster; never raise them to make a test pass.
+# ``status`` is what the view answers when it does its work; a redirect to a
+# login or permission page would measure the wrong path.
+MISSING_TEMPLATE = 'renders {}, which does not exist yet'
+
+SCENARIOS = [
+    # courses
+    Scenario('home', 'home', budget=2),
+    Scenario('course_list', 'courses:course_list', budget=3),
+    Scenario('course_list_filtered', 'courses:course_list', query='level=beginner&price=paid', budget=3),
+    Scenario('search', 'courses:search', query='q=python', skip=MISSING_TEMPLATE.format('courses/search_results.html')),
+    Scenario('category_courses', 'courses:category_courses', kwargs=lambda d: {'slug': d.enrolled_course.category.slug}, skip=MISSING_TEMPLATE.format('courses/category_courses.html')),
+    Scenario('course_detail', 'courses:course_detail', kwargs=lambda d: {'slug': d.enrolled_course.slug}, budget=7),
+    Scenario('course_detail_enrolled', 'courses:course_detail', kwargs=lambda d: {'slug': d.enrolled_course.slug}, user='student', budget=10),
+    Scenario('course_player', 'courses:course_player', kwargs=lambda d: {'slug': d.enrolled_course.slug}, user='student', skip=MISSING_TEMPLATE.format('courses/course_player.html')),
+    Scenario('course_player_lecture', 'courses:course_player_lecture', kwargs=lambda d: {'slug': d.enrolled_course.slug, 'lecture_id': d.lecture.id}, user='student', skip=MISSING_TEMPLATE.format('courses/course_player.html')),
+    Scenario('update_lecture_progress', 'courses:update_lecture_progress', method='post', data=lambda d: {'lecture_id': d.lecture.id, 'is_completed': 'true'}, user='student', budget=15),
+    Scenario('request_callback', 'courses:request_callback', kwargs=lambda d: {'slug': d.enrolled_course.slug}, method='post', data={'callback_name': 'Lead', 'callback_email': 'lead@example.com', 'callback_phone': '9999999999'}, budget=3, status=302),
+    Scenario('create_course', 'courses:create_course', user='instructor', skip=MISSING_TEMPLATE.format('instructor/create_course.html')),
+    Scenario('edit_course', 'courses:edit_course', kwargs=lambda d: {'slug': d.instructor_course.slug}, user='instructor', skip=MISSING_TEMPLATE.format('instructor/edit_course.html')),
+    Scenario('manage_sections', 'courses:manage_sections', kwargs=lambda d: {'slug': d.instructor_course.slug}, user='instructor', skip=MISSING_TEMPLATE.format('instructor/manage_sections.html')),
+    Scenario('manage_lectures', 'courses:manage_lectures', kwargs=lambda d: {'slug': d.instructor_course.slug, 'section_id': d.instructor_section.id}, user='instructor', skip=MISSING_TEMPLATE.format('instructor/manage_lectures.html')),
+    Scenario('delete_course_confirm', 'courses:delete_course', kwargs=lambda d: {'slug': d.instructor_course.slug}, user='instructor', skip=MISSING_TEMPLATE.format('instructor/delete_course_confirm.html')),
+
+    # enrollment
+    Scenario('my_learning', 'enrollment:my_learning', user='student', budget=5),
+    Scenario('daily_classes', 'enrollment:daily_classes', user='student', budget=3),
+    Scenario('daily_class_changes', 'enrollment:daily_class_changes', user='student', budget=4),
+    Scenario('daily_classes_calendar', 'enrollment:daily_classes_calendar', kwargs=calendar_kwargs, budget=2),
+    Scenario('wishlist', 'enrollment:wishlist', user='student', budget=3),
+    Scenario('view_certificate', 'enrollment:view_certificate', kwargs=lambda d: {'certificate_id': d.certificate.id}, user='student', budget=3),
+    Scenario('download_certificate', 'enrollment:download_certificate', kwargs=lambda d: {'certificate_id': d.certificate.id}, user='student', budget=3, status=302),
+    Scenario('verify_certificate', 'enrollment:verify_certificate', query='number=CERT-PERF-0001', budget=0),
+    Scenario('add_to_wishlist', 'enrollment:add_to_wishlist', kwargs=lambda d: {'course_id': d.cart_course.id}, user='student', budget=12, status=302),
+    Scenario('remove_from_wishlist', 'enrollment:remove_from_wishlist', kwargs=lambda d: {'course_id': d.wishlist_course.id}, user='student', budget=9, status=302),
+    Scenario('enroll_free', 'enrollment:enroll_free', kwargs=lambda d: {'course_id': d.free_course.id}, user='student', budget=11, status=302),
+
+    # payments
+    Scenario('cart', 'payments:cart', user='student', budget=6),
+    Scenario('checkout', 'payments:checkout', user='student', budget=8),
+    Scenario('upi_payment', 'payments:upi_payment', user='student', budget=15),
+    Scenario('order_history', 'payments:order_history', user='student', budget=5),
+    Scenario('order_detail', 'payments:order_detail', kwargs=lambda d: {'order_number': d.orders[0].order_number}, user='student', budget=6),
+    Scenario('payment_success', 'payments:payment_success', kwargs=lambda d: {'order_number': d.orders[0].order_number}, user='student', budget=7),
+    Scenario('payment_cancel', 'payments:payment_cancel', user='student', skip=MISSING_TEMPLATE.format('payments/payment_cancel.html')),
+    Scenario('apply_coupon', 'payments:apply_coupon', method='post', data={'coupon_code': 'PERF10'}, user='student', budget=6, status=302),
+    Scenario('remove_coupon', 'payments:remove_coupon', user='student', budget=2, status=302),
+    Scenario('add_to_cart', 'payments:add_to_cart', kwargs=lambda d: {'course_id': d.wishlist_course.id}, user='student', budget=13, status=302),
+    Scenario('buy_now', 'payments:buy_now', kwargs=lambda d: {'course_id': d.cart_course.id}, user='student', budget=11, status=302),
+    Scenario('remove_from_cart', 'payments:remove_from_cart', kwargs=lambda d: {'item_id': d.cart_item.id}, user='student', budget=9, status=302),
+    Scenario('clear_cart', 'payments:clear_cart', method='post', user='student', budget=8, status=302),
+    Scenario('process_payment', 'payments:process_payment', method='post', user='student', budget=18, status=302),
+
+    # reviews
+    Scenario('add_review_form', 'reviews:add_review', kwargs=lambda d: {'slug': d.enrolled_course.slug}, user='student', skip=MISSING_TEMPLATE.format('reviews/add_review.html')),
+    Scenario('add_review', 'reviews:add_review', kwargs=lambda d: {'slug': d.enrolled_course.slug}, method='post', data={'rating': 5, 'comment': 'Great'}, user='student', budget=14, status=302),
+    Scenario('edit_review_form', 'reviews:edit_review', kwargs=lambda d: {'review_id': d.review.id}, user='student', skip=MISSING_TEMPLATE.format('reviews/edit_review.html')),
+    Scenario('edit_review', 'reviews:edit_review', kwargs=lambda d: {'review_id': d.review.id}, method='post', data={'rating': 4, 'comment': 'Good'}, user='student', budget=11, status=302),
+    Scenario('delete_review_confirm', 'reviews:delete_review', kwargs=lambda d: {'review_id': d.review.id}, user='student', skip=MISSING_TEMPLATE.format('reviews/delete_review_confirm.html')),
+
+    # users
+    Scenario('login_form', 'users:login', budget=0),
+    Scenario('register_form', 'users:register', budget=0),
+    Scenario('profile', 'users:profile', user='student', budget=3),
+    Scenario('edit_profile', 'users:edit_profile', user='student', budget=8),
+    Scenario('dashboard', 'users:dashboard', user='student', budget=2),
+    Scenario('my_courses', 'users:my_courses', user='student', skip=MISSING_TEMPLATE.format('users/my_courses.html')),
+    Scenario('instructor_dashboard', 'users:instructor_dashboard', user='admin', skip=MISSING_TEMPLATE.format('users/instructor/dashboard.html')),
+    Scenario('instructor_courses', 'users:instructor_courses', user='admin', skip=MISSING_TEMPLATE.format('users/instructor/courses.html')),
+    Scenario('instructor_analytics', 'users:instructor_analytics', user='admin', skip=MISSING_TEMPLATE.format('users/instructor/analytics.html')),
+    Scenario('setup_2fa_prompt', 'users:setup_2fa_prompt', user='student', budget=2),
+    Scenario('verify_2fa_setup', 'users:verify_2fa_setup', user='two_factor_user', budget=3),
+    Scenario('verify_2fa', 'users:verify_2fa', session=lambda d: {'pending_2fa_user_id': d.two_factor_user.id}, budget=1),
+    Scenario('disable_2fa', 'users:disable_2fa', user='two_factor_user', budget=2),
+    Scenario('password_reset', 'users:password_reset', skip=MISSING_TEMPLATE.format('users/password_reset.html')),
+    Scenario('logout', 'users:logout', user='student', budget=4, status=302),
+
+    # admin changelists
+    Scenario('admin_user', 'admin:users_user_changelist', user='admin', budget=5),
+    Scenario('admin_userprofile', 'admin:users_userprofile_changelist', user='admin', budget=5),
+    Scenario('admin_twofactorauth', 'admin:users_twofactorauth_changelist', user='admin', budget=5),
+    Scenario('admin_category', 'admin:courses_category_changelist', user='admin', budget=5),
+    Scenario('admin_course', 'admin:courses_course_changelist', user='admin', budget=6),
+    Scenario('admin_section', 'admin:courses_section_changelist', user='admin', budget=5),
+    Scenario('admin_lecture', 'admin:courses_lecture_changelist', user='admin', budget=5),
+    Scenario('admin_callbackrequest', 'admin:courses_callbackrequest_changelist', user='admin', budget=6),
+    Scenario('admin_enrollment', 'admin:enrollment_enrollment_changelist', user='admin', budget=5),
+    Scenario('admin_lectureprogress', 'admin:enrollment_lectureprogress_changelist', user='admin', budget=5),
+    Scenario('admin_wishlist', 'admin:enrollment_wishlist_changelist', user='admin', budget=5),
+    Scenario('admin_certificate', 'admin:enrollment_certificate_changelist', user='admin', budget=5),
+    Scenario('admin_dailyclass', 'admin:enrollment_dailyclass_changelist', user='admin', budget=7),
+    Scenario('admin_classschedule', 'admin:enrollment_classschedule_changelist', user='admin', budget=6),
+    Scenario('admin_cart', 'admin:payments_cart_changelist', user='admin', budget=5),
+    Scenario('admin_cartitem', 'admin:payments_cartitem_changelist', user='admin', budget=5),
+    Scenario('admin_order', 'admin:payments_order_changelist', user='admin', budget=7),
+    Scenario('admin_orderitem', 'admin:payments_orderitem_changelist', user='admin', budget=5),
+    Scenario('admin_coupon', 'admin:payments_coupon_changelist', user='admin', budget=5),
+    Scenario('admin_announcement', 'admin:payments_announcement_changelist', user='admin', budget=5),
+    Scenario('admin_paymenttransaction', 'admin:payments_paymenttransaction_changelist', user='admin', budget=6),
+    Scenario('admin_invoice', 'admin:payments_invoice_changelist', user='admin', budget=7),
+    Scenario('admin_paymentwebhookevent', 'admin:payments_paymentwebhookevent_changelist', user='admin', budget=6),
+    Scenario('admin_review', 'admin:reviews_review_changelist', user='admin', budget=6),
+]
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def run_scenario(scenario, dataset, repeat=DEFAULT_REPEAT):
+    """Measure one scenario: a warm-up request, then ``repeat`` measured ones, each against the seeded state"""
+    url = scenario.url(dataset)
+    data = scenario.data(dataset) if callable(scenario.data) else scenario.data
+    result = {
+        'url': url, 'method': scenario.method.upper(), 'budget': scenario.budget, 'expected_status': scenario.status,
+    }
+    if scenario.skip:
+        result['skipped'] = scenario.skip
+        return result
+
+    timings = []
+    queries = []
+    for run in range(repeat + 1):
+        client = Client()
+        if scenario.user:
+            client.force_login(getattr(dataset, scenario.user))
+        if scenario.session:
+            session = client.session
+            session.update(scenario.session(dataset) if callable(scenario.session) else scenario.session)
+            session.save()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                try:
+                    response = getattr(client, scenario.method)(url, data)
+                    status, error = response.status_code, None
+                except Exception as e:
+                    status, error = None, f'{type(e).__name__}: {e}'
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        if run:
+            timings.append(elapsed)
+            queries.append(len(captured))
+        result['status'] = status
+        if error and 'error' not in result:
+            result['error'] = error
+    result['queries'] = max(queries)
+
+    result['p50_ms'] = round(percentile(timings, 50) * 1000, 2)
+    result['p95_ms'] = round(percentile(timings, 95) * 1000, 2)
+    result['max_ms'] = round(max(timings) * 1000, 2)
+    return result
+
+
+def run_all(dataset, repeat=DEFAULT_REPEAT, scenarios=SCENARIOS):
+    return {scenario.name: run_scenario(scenario, dataset, repeat) for scenario in scenarios}
+
+
+def budget_failures(results):
+    """Human-readable list of scenarios that errored, answered another status or went over budget"""
+    failures = []
+    for name, result in sorted(results.items()):
+        if result.get('skipped'):
+            continue
+        if result.get('error') or (result['status'] or 500) >= 500:
+            failures.append(f"{name}: {result.get('error') or result['status']}")
+        elif result['status'] != result['expected_status']:
+            failures.append(f"{name}: status {result['status']} (expected {result['expected_status']})")
+        elif result['budget'] is None:
+            failures.append(f"{name}: no query budget ({result['queries']} queries)")
+        elif result['queries'] > result['budget']:
+            failures.append(f"{name}: {result['queries']} queries (budget {result['budget']})")
+    return failures
+
+
+def write_report(path, results, courses, repeat):
+    report = {
+        'dataset': {'courses': courses, 'repeat': repeat, 'database': connection.vendor},
+        'scenarios': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,330 @@
+"""
+Opt-in request profiling.
+
+With ``PROFILING_ENABLED`` on, ``ProfilingMiddleware`` samples
+``PROFILING_SAMPLE_RATE`` of requests and records for each one the view, total
+time, SQL query count and time, template render time, cache hits and misses,
+and time spent in external calls (email, payment gateway).
+
+Every sample is
+- kept in a per-process ring buffer shown at ``/admin/profiling/``,
+- logged as one JSON line on the ``config.profiling`` logger, which writes to a
+  rotating file when ``PROFILING_LOG_FILE`` is set,
+- summarised in a ``Server-Timing`` header that browser devtools display.
+"""
+
+import functools
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache.backends.base import BaseCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.shortcuts import render
+from django.template.backends.django import Template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from monitoring.queries import QueryCounter, observe_queries
+
+from .async_views import HybridMiddleware
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+_current_profile = ContextVar('request_profile', default=None)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Timings and counters collected while one sampled request runs"""
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.view = None
+        self.status = None
+        self.started_at = timezone.now()
+        self.start = time.perf_counter()
+        self.total_time = 0.0
+        self.queries = QueryCounter()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external = {}
+
+    @property
+    def external_time(self):
+        return sum(self.external.values())
+
+    @property
+    def sql_count(self):
+        return self.queries.count
+
+    @property
+    def sql_time(self):
+        return self.queries.time
+
+    def finish(self, response):
+        self.total_time = time.perf_counter() - self.start
+        self.status = response.status_code
+
+    def as_dict(self):
+        def ms(seconds):
+            return round(seconds * 1000, 2)
+
+        return {
+            'at': self.started_at.isoformat(),
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'status': self.status,
+            'total_ms': ms(self.total_time),
+            'sql_count': self.sql_count,
+            'sql_ms': ms(self.sql_time),
+            'template_ms': ms(self.template_time),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'external_ms': ms(self.external_time),
+            'external': {name: ms(seconds) for name, seconds in self.external.items()},
+        }
+
+    def server_timing(self):
+        def metric(name, seconds, desc=None):
+            value = f'{name};dur={seconds * 1000:.1f}'
+            return f'{value};desc="{desc}"' if desc else value
+
+        metrics = [
+            metric('db', self.sql_time, f'{self.sql_count} queries'),
+            metric('tpl', self.template_time, 'Templates'),
+        ]
+        if self.cache_hits or self.cache_misses:
+            metrics.append(f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"')
+        for name, seconds in self.external.items():
+            metrics.append(metric(f'ext-{name}', seconds, name))
+        metrics.append(metric('total', self.total_time))
+        return ', '.join(metrics)
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def external_call(name):
+    """Time a call to an outside service against the current request's profile"""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.external[name] = profile.external.get(name, 0.0) + time.perf_counter() - start
+
+
+def wrap_method(cls, name, make_wrapper, marker='profiled'):
+    """Replace ``cls.name`` with ``make_wrapper(original)``, once per ``marker``"""
+    original = getattr(cls, name)
+    if getattr(original, marker, False):
+        return
+    wrapper = functools.wraps(original)(make_wrapper(original))
+    setattr(wrapper, marker, True)
+    setattr(cls, name, wrapper)
+
+
+def _template_render(original):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        # Templates rendered from inside another render are already being timed
+        if profile is None or profile.template_depth:
+            return original(self, context, request)
+
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            profile.template_time += time.perf_counter() - start
+    return render
+
+
+def _cache_get(original):
+    def get(self, key, default=None, version=None):
+        value = original(self, key, _MISSING, version)
+        profile = current_profile()
+        if profile is not None:
+            if value is _MISSING:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return default if value is _MISSING else value
+    return get
+
+
+def _cache_get_many(original):
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = original(self, keys, version)
+        profile = current_profile()
+        if profile is not None:
+            profile.cache_hits += len(found)
+            profile.cache_misses += len(keys) - len(found)
+        return found
+    return get_many
+
+
+def _send_messages(original):
+    def send_messages(self, email_messages):
+        with external_call('email'):
+            return original(self, email_messages)
+    return send_messages
+
+
+def install_hooks():
+    """Instrument template rendering and the configured cache and email backends"""
+    wrap_method(Template, 'render', _template_render)
+
+    for options in settings.CACHES.values():
+        backend = import_string(options['BACKEND'])
+        wrap_method(backend, 'get', _cache_get)
+        # BaseCache.get_many loops over get(), which is already counted
+        if backend.get_many is not BaseCache.get_many:
+            wrap_method(backend, 'get_many', _cache_get_many)
+
+    wrap_method(import_string(settings.EMAIL_BACKEND), 'send_messages', _send_messages)
+
+
+def record(profile):
+    """Store a finished profile in the ring buffer and the structured log"""
+    global _buffer
+
+    entry = profile.as_dict()
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+        _buffer.append(entry)
+    logger.info(json.dumps(entry, sort_keys=True))
+
+
+def recent_profiles():
+    """Profiles recorded by this process, oldest first"""
+    with _buffer_lock:
+        return list(_buffer or ())
+
+
+def clear_profiles():
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.clear()
+
+
+def summarize(entries):
+    """Per-view aggregates, slowest total time first"""
+    by_view = {}
+    for entry in entries:
+        by_view.setdefault(entry['view'] or entry['path'], []).append(entry)
+
+    summary = []
+    for view, samples in by_view.items():
+        totals = sorted(sample['total_ms'] for sample in samples)
+        lookups = sum(sample['cache_hits'] + sample['cache_misses'] for sample in samples)
+        hits = sum(sample['cache_hits'] for sample in samples)
+        summary.append({
+            'view': view,
+            'requests': len(samples),
+            'avg_ms': round(statistics.fmean(totals), 2),
+            'p95_ms': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+            'avg_queries': round(statistics.fmean(sample['sql_count'] for sample in samples), 1),
+            'avg_sql_ms': round(statistics.fmean(sample['sql_ms'] for sample in samples), 2),
+            'avg_template_ms': round(statistics.fmean(sample['template_ms'] for sample in samples), 2),
+            'avg_external_ms': round(statistics.fmean(sample['external_ms'] for sample in samples), 2),
+            'cache_hit_ratio': round(hits / lookups, 2) if lookups else None,
+            'total_ms': round(sum(totals), 2),
+        })
+    summary.sort(key=lambda row: row['total_ms'], reverse=True)
+    return summary
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Profile a sample of requests; removed from the stack unless PROFILING_ENABLED"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        install_hooks()
+
+    def handle(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _current_profile.set(profile)
+        try:
+            with observe_queries(profile.queries):
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(profile, response)
+
+    async def ahandle(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _current_profile.set(profile)
+        try:
+            with observe_queries(profile.queries):
+                response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(profile, response)
+
+    def finish(self, profile, response):
+        profile.finish(response)
+        record(profile)
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile()
+        if profile is not None:
+            profile.view = request.resolver_match.view_name
+        return None
+
+
+@staff_member_required
+def profiling_dashboard(request):
+    """Admin page with the request profiles sampled by this process"""
+    if request.method == 'POST' and 'clear' in request.POST:
+        clear_profiles()
+
+    entries = recent_profiles()
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiling',
+        'enabled': settings.PROFILING_ENABLED,
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'summary': summarize(entries),
+        'entries': entries[::-1][:100],
+        'sample_count': len(entries),
+    }
+    return render(request, 'admin/profiling.html', context)
@@ -0,0 +1,265 @@
+"""
+Primary/replica database routing with read-after-write consistency.
+
+``ReplicaRoutingMiddleware`` marks GET requests for the views listed in
+``settings.REPLICA_READ_VIEWS`` as replica-safe, and ``PrimaryReplicaRouter``
+sends their reads to a replica. Everything else reads and writes on the primary.
+
+When a request writes, the primary's WAL position (LSN) at that moment is
+remembered for the client: in the session for logged-in users, in a cookie for
+anonymous visitors. Later reads only go to a replica that has replayed past
+that position, so a student never sees "not enrolled" right after paying.
+Without PostgreSQL LSNs the client is pinned to the primary for
+``REPLICA_PIN_SECONDS`` instead.
+
+A request counts as writing only if it runs an INSERT, UPDATE or DELETE that
+changes rows on the primary. The middleware watches the statements through
+the shared execute wrapper (``monitoring.queries``). Asking the router for
+the write database is not enough, because ``get_or_create()`` does that even
+when it only finds the row.
+
+Writes made for a student outside their own requests, such as webhook
+fulfilment or a reviewer approving a UPI payment, are recorded with
+``record_background_write()``. The LSN goes to the shared cache under the
+student's id, and their next replica-read page honours it like their own
+writes.
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from functools import cache
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import DatabaseError, connections, transaction
+
+from monitoring.queries import observe_queries
+
+from .async_views import HybridMiddleware
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE_NAME = 'db_primary_pin'
+LAST_WRITE_SESSION_KEY = '_db_last_write'
+LAST_WRITE_CACHE_PREFIX = 'db_last_write:'
+
+# Apps whose reads must always see the latest committed state
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# How long a replica's replay position is trusted before asking again (seconds)
+REPLICA_LSN_CACHE_SECONDS = 0.5
+
+_WRITE_RE = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)', re.IGNORECASE)
+
+_replica_lsn_cache = {}
+_replica_lsn_lock = threading.Lock()
+
+
+@cache
+def primary_only_tables():
+    return {model._meta.db_table for model in apps.get_models() if model._meta.app_label in PRIMARY_ONLY_APPS}
+
+
+class RoutingState:
+    """Per-request routing flags, mutated by the router and the middleware"""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+    def observe(self, sql, params, many, context, elapsed):
+        """Query observer: note a statement that changed rows on the primary"""
+        if self.wrote or context['connection'].alias != 'default':
+            return
+        match = _WRITE_RE.match(sql)
+        if match and match.group(1) not in primary_only_tables():
+            # -1 means the driver doesn't know; assume something changed
+            self.wrote = getattr(context.get('cursor'), 'rowcount', -1) != 0
+
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+
+def current_state():
+    return _routing_state.get()
+
+
+def parse_lsn(value):
+    """Convert a pg_lsn string such as '16/B374D848' to an integer"""
+    if not value:
+        return None
+    high, _, low = value.partition('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def primary_lsn():
+    """Current WAL write position on the primary, or None if unavailable"""
+    connection = connections['default']
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_current_wal_lsn()::text')
+            return parse_lsn(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning('Could not read primary WAL position', exc_info=True)
+        return None
+
+
+def replica_lsn(alias):
+    """Last WAL position replayed by a replica, cached briefly per process"""
+    now = time.monotonic()
+    cached = _replica_lsn_cache.get(alias)
+    if cached and now - cached[0] < REPLICA_LSN_CACHE_SECONDS:
+        return cached[1]
+
+    lsn = None
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT pg_last_wal_replay_lsn()::text')
+            lsn = parse_lsn(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning(f'Could not read replay position of {alias}', exc_info=True)
+
+    with _replica_lsn_lock:
+        _replica_lsn_cache[alias] = (now, lsn)
+    return lsn
+
+
+def record_background_write(user_ids):
+    """Once the current transaction commits, keep these users' reads off replicas that lack it"""
+    user_ids = set(user_ids)
+
+    def record():
+        last_write = {'lsn': primary_lsn(), 'at': time.time()}
+        shared_cache.set_many(
+            {f'{LAST_WRITE_CACHE_PREFIX}{user_id}': last_write for user_id in user_ids}, settings.REPLICA_PIN_SECONDS,
+        )
+
+    if user_ids:
+        transaction.on_commit(record)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_state()
+        if state is not None and state.replica and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return state.replica
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """Decide per request whether reads may go to a replica, and remember writes"""
+
+    def handle(self, request):
+        state = RoutingState()
+        token = _routing_state.set(state)
+        try:
+            with observe_queries(state.observe):
+                response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        if state.wrote:
+            self.record_write(request, response)
+        return response
+
+    async def ahandle(self, request):
+        state = RoutingState()
+        token = _routing_state.set(state)
+        try:
+            with observe_queries(state.observe):
+                response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        if state.wrote:
+            # Reads the session and the primary's LSN
+            await sync_to_async(self.record_write)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = current_state()
+        if state is None or request.method not in ('GET', 'HEAD'):
+            return None
+
+        if request.resolver_match.view_name in settings.REPLICA_READ_VIEWS:
+            state.replica = self.choose_replica(self.last_write(request))
+        return None
+
+    @staticmethod
+    def is_authenticated(request):
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated
+
+    def record_write(self, request, response):
+        written_at = time.time()
+
+        if self.is_authenticated(request) and hasattr(request, 'session'):
+            request.session[LAST_WRITE_SESSION_KEY] = {'lsn': primary_lsn(), 'at': written_at}
+        else:
+            pin_seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                str(int(written_at) + pin_seconds),
+                max_age=pin_seconds,
+                httponly=True,
+                samesite='Lax',
+            )
+
+    def last_write(self, request):
+        """The client's last write as {'lsn': int | None, 'at': float}, or None"""
+        if self.is_authenticated(request) and hasattr(request, 'session'):
+            writes = [
+                request.session.get(LAST_WRITE_SESSION_KEY),
+                shared_cache.get(f'{LAST_WRITE_CACHE_PREFIX}{request.user.pk}'),
+            ]
+            writes = [last_write for last_write in writes if last_write]
+            if writes:
+                return max(writes, key=lambda last_write: last_write['at'])
+
+        try:
+            pinned_until = int(request.COOKIES.get(PIN_COOKIE_NAME, 0))
+        except ValueError:
+            return None
+        if pinned_until:
+            return {'lsn': None, 'at': pinned_until - settings.REPLICA_PIN_SECONDS}
+        return None
+
+    def choose_replica(self, last_write):
+        """A replica that has caught up with ``last_write``, or None for the primary"""
+        replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+        random.shuffle(replicas)
+
+        if last_write is None:
+            return replicas[0] if replicas else None
+
+        # Old enough that any healthy replica has it; skip the LSN round-trip
+        if time.time() >= last_write['at'] + settings.REPLICA_PIN_SECONDS:
+            return replicas[0] if replicas else None
+
+        if last_write.get('lsn') is None:
+            return None
+
+        for alias in replicas:
+            lsn = replica_lsn(alias)
+            if lsn is not None and lsn >= last_write['lsn']:
+                return alias
+        return None
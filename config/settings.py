@@ -5,7 +5,7 @@ Generated by 'django-admin startproject' using Django 5.2.8.
 """
 
 from pathlib import Path
-from decouple import config  # Added for env variables
+from decouple import config, Csv  # Added for env variables
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,15 +46,21 @@ INSTALLED_APPS = [
     'enrollment',
     'payments',
     'reviews',
+    'monitoring',
 ]
 
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
+    'config.profiling.ProfilingMiddleware',
+    'monitoring.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'config.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,9 +96,49 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='your_password'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Keep connections open between requests and verify them before reuse
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Set DB_POOLER=pgbouncer when DB_HOST points at a transaction-mode PgBouncer.
+# Server-side cursors don't survive transaction pooling, so they are disabled.
+DB_POOLER = config('DB_POOLER', default='')
+if DB_POOLER == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replicas share the primary's credentials; list their hosts in DB_REPLICA_HOSTS
+for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['config.routers.PrimaryReplicaRouter']
+
+# Views whose GET requests may read from a replica (see config/routers.py).
+# Clients that just wrote only use a replica once it has replayed their write.
+# A view that writes on GET (course_player records lecture progress) can't be listed.
+REPLICA_READ_VIEWS = [
+    'home',
+    'courses:course_list',
+    'courses:course_detail',
+    'courses:search',
+    'enrollment:my_learning',
+    'enrollment:wishlist',
+    'enrollment:daily_classes',
+    'payments:payment_success',
+    'payments:order_history',
+    'payments:order_detail',
+]
+
+# Upper bound on replica lag (seconds). Within this window after a write, reads
+# wait for a replica past the write's LSN; without LSNs they stay on the primary.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -119,6 +165,114 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'  # Added
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hashed, precompressed static files (see config/staticfiles.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'config.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+# StaticFilesMiddleware cache lifetimes for files without a content hash (seconds)
+STATIC_MAX_AGE = config('STATIC_MAX_AGE', default=60, cast=int)
+MEDIA_MAX_AGE = config('MEDIA_MAX_AGE', default=3600, cast=int)
+# Serve MEDIA_ROOT from Django; in production let the web server do it, but
+# pass /media/payment/screenshots/, /media/invoices/ and /media/certificates/
+# through to Django, which serves them to staff only
+SERVE_MEDIA_FILES = config('SERVE_MEDIA_FILES', default=DEBUG, cast=bool)
+
+
+# Cache: per-process memory unless configured. With several workers, point
+# them all at one Redis (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://host:6379/0) so invalidations reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+
+# Background tasks (see config/background.py)
+BACKGROUND_TASK_WORKERS = config('BACKGROUND_TASK_WORKERS', default=2, cast=int)
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=False, cast=bool)
+
+
+# UPI verification queue (see payments/verification.py): payments handed to a
+# reviewer at a time, and how long they stay reserved for that reviewer
+VERIFICATION_BATCH_SIZE = config('VERIFICATION_BATCH_SIZE', default=20, cast=int)
+VERIFICATION_LEASE_SECONDS = config('VERIFICATION_LEASE_SECONDS', default=600, cast=int)
+
+# Idempotent payment verification (see payments/idempotency.py): how long a
+# completed response is served from the cache before falling back to the table
+IDEMPOTENCY_CACHE_SECONDS = config('IDEMPOTENCY_CACHE_SECONDS', default=24 * 60 * 60, cast=int)
+
+
+# Certificate PDFs (see enrollment/certificates.py); optional full-page background image
+CERTIFICATE_BACKGROUND = config('CERTIFICATE_BACKGROUND', default='')
+
+
+# Admin changelists (see config/changelists.py): unfiltered lists of tables at
+# least this large show the planner's row estimate instead of running COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=50000, cast=int)
+
+
+# Request profiling (see config/profiling.py); sampled requests are shown at /admin/profiling/
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.05, cast=float)
+PROFILING_BUFFER_SIZE = config('PROFILING_BUFFER_SIZE', default=500, cast=int)
+PROFILING_SERVER_TIMING = config('PROFILING_SERVER_TIMING', default=True, cast=bool)
+PROFILING_LOG_FILE = config('PROFILING_LOG_FILE', default='')
+
+if PROFILING_LOG_FILE:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'message': {'format': '%(message)s'},
+        },
+        'handlers': {
+            'profiling_file': {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': PROFILING_LOG_FILE,
+                'maxBytes': 10 * 1024 * 1024,
+                'backupCount': 5,
+                'formatter': 'message',
+            },
+        },
+        'loggers': {
+            'config.profiling': {
+                'handlers': ['profiling_file'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+        },
+    }
+
+
+# Prometheus metrics at /metrics (see config/metrics.py); the scraper sends
+# "Authorization: Bearer <token>". Without a token the endpoint only works with DEBUG
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Slow query log (see monitoring/slow_queries.py), browsable in the admin
+SLOW_QUERY_ENABLED = config('SLOW_QUERY_ENABLED', default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_FLUSH_SECONDS = config('SLOW_QUERY_FLUSH_SECONDS', default=30, cast=int)
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=3600, cast=int)
+SLOW_QUERY_EXPLAIN_TOP = config('SLOW_QUERY_EXPLAIN_TOP', default=5, cast=int)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = config('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', default=10000, cast=int)
+# Statements whose sample parameters each worker keeps for EXPLAIN ANALYZE
+SLOW_QUERY_SAMPLE_PARAMS = config('SLOW_QUERY_SAMPLE_PARAMS', default=500, cast=int)
+
+
+# Async views (see config/async_views.py): run a view's independent queries in
+# parallel threads, each with its own database connection. Switched off by the
+# test runner, since those connections can't see a test case's transaction.
+ASYNC_CONCURRENT_QUERIES = config('ASYNC_CONCURRENT_QUERIES', default=True, cast=bool)
+# Threads (and so database connections) per process for those queries
+ASYNC_QUERY_THREADS = config('ASYNC_QUERY_THREADS', default=4, cast=int)
+TEST_RUNNER = 'config.test_runner.TestRunner'
+
 
 # Primary key default
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -157,4 +311,14 @@ SESSION_COOKIE_AGE = 1209600  # 2 weeks
 
 # Payment Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
-RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
\ No newline at end of file
+RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
+RAZORPAY_API_URL = config('RAZORPAY_API_URL', default='https://api.razorpay.com/v1')
+RAZORPAY_TIMEOUT = config('RAZORPAY_TIMEOUT', default=10, cast=float)
+# Razorpay webhooks (see payments/webhooks.py): the secret set on the webhook in
+# the Razorpay dashboard, and how many stored events are applied per transaction
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=100, cast=int)
+# An event that fails is retried after this many seconds, doubling each time
+# (1 min, 2 min, ... about 2 hours in all), and left with its error after the last attempt
+WEBHOOK_RETRY_SECONDS = config('WEBHOOK_RETRY_SECONDS', default=60, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=8, cast=int)
@@ -0,0 +1,311 @@
+"""
+Static and media delivery.
+
+``CompressedManifestStaticFilesStorage`` gives collected files content-hashed
+names and writes ``.gz``/``.br`` siblings next to them at collectstatic time.
+``StaticFilesMiddleware`` serves STATIC_ROOT and MEDIA_ROOT straight from disk
+ahead of URL routing, with ETag/Last-Modified revalidation, byte ranges,
+precompressed variants and far-future caching for hashed names.
+
+Media is served this way only when ``SERVE_MEDIA_FILES`` is on (it defaults
+to ``DEBUG``; in production the web server serves MEDIA_ROOT). Payment
+screenshots, invoices and certificates (``PRIVATE_MEDIA_PREFIXES``) are never
+served publicly: the middleware lets those paths through to
+``private_media``, which serves them to staff only. Customers get their own
+invoices and certificates through the download views.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import serve
+
+from .async_views import HybridMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.json', '.map', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.otf', '.eot',
+)
+
+# Not worth a second file below this size
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Uploads that identify a customer or a payment; relative to MEDIA_ROOT
+PRIVATE_MEDIA_PREFIXES = ('payment/screenshots/', 'invoices/', 'certificates/')
+
+
+def accepted_encodings(header):
+    """The content codings an Accept-Encoding header allows, i.e. those without ``q=0``"""
+    weights = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    wildcard = weights.pop('*', 0.0)
+    accepted = {coding for coding, weight in weights.items() if weight > 0}
+    if wildcard > 0:
+        # "*" covers every coding the header doesn't name
+        accepted |= {coding for coding in ('br', 'gzip') if coding not in weights}
+    return accepted
+
+
+def compress_file(path):
+    """Write .gz (and .br when brotli is installed) next to ``path`` if they are smaller"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compressed in variants:
+        # Skip variants that don't save at least 5%
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also precompresses every collected text asset"""
+
+    # Fall back to the unhashed name instead of raising when a file was not collected
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if not isinstance(processed, Exception):
+                processed_names.add(name)
+                if hashed_name:
+                    processed_names.add(hashed_name)
+
+        if dry_run:
+            return
+
+        for name in processed_names:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(name))
+
+
+class StaticFilesMiddleware(HybridMiddleware):
+    """
+    Serve collected static files and uploaded media without entering the view layer.
+
+    Requests that don't map to an existing file fall through to the rest of
+    the stack unchanged.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.roots = [(settings.STATIC_URL, str(settings.STATIC_ROOT), True)]
+        if settings.SERVE_MEDIA_FILES:
+            self.roots.append((settings.MEDIA_URL, str(settings.MEDIA_ROOT), False))
+        self._hashed_names = None
+
+    def handle(self, request):
+        if request.method in ('GET', 'HEAD'):
+            response = self.serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        if request.method in ('GET', 'HEAD'):
+            # stat() and open() stay off the event loop; no database involved
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    @property
+    def hashed_names(self):
+        """Content-hashed names from the staticfiles manifest"""
+        if self._hashed_names is None:
+            self._hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self._hashed_names
+
+    def resolve(self, path):
+        """Map a request path to (filesystem path, relative name, is_static)"""
+        for prefix, root, is_static in self.roots:
+            if prefix and path.startswith(prefix):
+                name = path[len(prefix):]
+                if not is_static and name.startswith(PRIVATE_MEDIA_PREFIXES):
+                    return None
+                try:
+                    return safe_join(root, name), name, is_static
+                except (SuspiciousFileOperation, ValueError):
+                    return None
+        return None
+
+    def cache_control(self, name, is_static):
+        if is_static and name in self.hashed_names:
+            return IMMUTABLE_CACHE_CONTROL
+        if is_static:
+            return f'public, max-age={settings.STATIC_MAX_AGE}'
+        return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+    def serve(self, request):
+        resolved = self.resolve(request.path)
+        if resolved is None:
+            return None
+        path, name, is_static = resolved
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(name)
+        content_type = content_type or 'application/octet-stream'
+        range_header = request.META.get('HTTP_RANGE')
+
+        # Pick a precompressed variant; ranges always address the identity encoding
+        encoding = None
+        vary = False
+        if is_static and name.endswith(COMPRESSIBLE_EXTENSIONS):
+            vary = True
+            if not range_header:
+                accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+                for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+                    if candidate in accepted:
+                        try:
+                            stat = os.stat(path + suffix)
+                        except OSError:
+                            continue
+                        path = path + suffix
+                        encoding = candidate
+                        break
+
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Cache-Control': self.cache_control(name, is_static),
+            'Accept-Ranges': 'bytes',
+        }
+        if vary:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if self.not_modified(request, etag, stat.st_mtime):
+            response = HttpResponse(status=304)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        if range_header:
+            response = self.range_response(request, path, stat.st_size, range_header, content_type)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = stat.st_size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = stat.st_size
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def not_modified(self, request, etag, mtime):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return etag in tags or '*' in tags
+
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            return if_modified_since == http_date(mtime)
+        return False
+
+    def range_response(self, request, path, size, range_header, content_type):
+        match = RANGE_RE.match(range_header.strip())
+        start = end = None
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start = max(size - int(match.group(2)), 0)
+                end = size - 1
+            end = min(end, size - 1)
+
+        if start is None or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        length = end - start + 1
+
+        if request.method == 'HEAD':
+            response = HttpResponse(status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                self.read_range(path, start, length), status=206, content_type=content_type
+            )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = length
+        return response
+
+    @staticmethod
+    def read_range(path, start, length):
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while length > 0:
+                chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+
+@staff_member_required
+def private_media(request, name):
+    """Payment screenshots, invoices and certificates from MEDIA_ROOT, for staff only"""
+    if not name.startswith(PRIVATE_MEDIA_PREFIXES):
+        raise Http404
+    response = serve(request, name, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = 'private, no-store'
+    return response
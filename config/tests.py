@@ -0,0 +1,747 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+
+from datetime import datetime, timedelta
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from courses.models import CallbackRequest, Course
+from prometheus_client import REGISTRY
+
+from . import metrics, perf, profiling
+from .async_views import close_pool_connections, gather_queries
+from .changelists import EstimatedCountPaginator
+from enrollment.models import DailyClass, Enrollment, LectureProgress
+from payments.models import Invoice, Order, PaymentTransaction
+from reviews.models import Review
+from users.models import TwoFactorAuth, User
+from .routers import (
+    LAST_WRITE_CACHE_PREFIX, LAST_WRITE_SESSION_KEY, PIN_COOKIE_NAME, PrimaryReplicaRouter, ReplicaRoutingMiddleware,
+    current_state, parse_lsn, record_background_write,
+)
+from .staticfiles import IMMUTABLE_CACHE_CONTROL, compress_file
+
+
+class StaticFilesMiddlewareTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.static_root, 'css'))
+        self.css_path = os.path.join(self.static_root, 'css', 'site.css')
+        with open(self.css_path, 'w') as f:
+            f.write('.card { padding: 1rem; }\n' * 100)
+        compress_file(self.css_path)
+
+        self.settings_override = override_settings(STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.static_root, ignore_errors=True)
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_serves_file_with_validators(self):
+        response = self.client.get('/static/css/site.css')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), open(self.css_path, 'rb').read())
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get('/static/css/site.css')['ETag']
+
+        response = self.client.get('/static/css/site.css', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_precompressed_variant(self):
+        response = self.client.get('/static/css/site.css', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(response.streaming_content), open(self.css_path + '.gz', 'rb').read())
+
+    def test_refused_encoding_is_not_served(self):
+        for header in ('gzip;q=0', 'gzip; q=0.0, identity', '*;q=0', 'br;q=0, *;q=0'):
+            response = self.client.get('/static/css/site.css', HTTP_ACCEPT_ENCODING=header)
+            self.assertNotIn('Content-Encoding', response, header)
+
+        response = self.client.get('/static/css/site.css', HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @override_settings(SERVE_MEDIA_FILES=True)
+    def test_private_media_is_for_staff_only(self):
+        for name in ('courses/thumbnails/python.png', 'invoices/INV-1.pdf'):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(b'data')
+
+        self.assertEqual(self.client.get('/media/courses/thumbnails/python.png').status_code, 200)
+        response = self.client.get('/media/invoices/INV-1.pdf')
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(User.objects.create_user(username='customer', password='x'))
+        self.assertEqual(self.client.get('/media/invoices/INV-1.pdf').status_code, 302)
+
+        self.client.force_login(User.objects.create_user(username='staff', password='x', is_staff=True))
+        response = self.client.get('/media/invoices/INV-1.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+
+    def test_byte_range(self):
+        response = self.client.get('/static/css/site.css', HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'.card { pa')
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{os.path.getsize(self.css_path)}')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get('/static/css/site.css', HTTP_RANGE='bytes=999999-')
+
+        self.assertEqual(response.status_code, 416)
+
+    def test_path_traversal_falls_through(self):
+        response = self.client.get('/static/../settings.py')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_hashed_files_are_immutable(self):
+        source_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(source_dir, 'app.js'), 'w') as f:
+                f.write('console.log("course platform");\n' * 50)
+
+            with override_settings(STATICFILES_DIRS=[source_dir]):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                from django.contrib.staticfiles.storage import staticfiles_storage
+                hashed_name = staticfiles_storage.stored_name('app.js')
+
+                self.assertNotEqual(hashed_name, 'app.js')
+                self.assertTrue(os.path.exists(os.path.join(self.static_root, hashed_name + '.gz')))
+
+                response = self.client.get(f'/static/{hashed_name}')
+                self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+                response = self.client.get('/static/app.js')
+                self.assertNotEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        finally:
+            shutil.rmtree(source_dir, ignore_errors=True)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_PIN_SECONDS=10)
+class RoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def dispatch(self, request, view_name, writes=False):
+        """Run a probe view through the middleware and report where reads went"""
+        def view(request):
+            if writes:
+                # What the execute wrapper reports for an UPDATE that changed a row
+                current_state().observe(
+                    'UPDATE "courses" SET "title" = %s', ['x'], False,
+                    {'connection': connection, 'cursor': SimpleNamespace(rowcount=1)}, 0.0,
+                )
+            return HttpResponse(self.router.db_for_read(Course))
+
+        namespace, _, url_name = view_name.rpartition(':')
+        request.resolver_match = ResolverMatch(view, (), {}, url_name=url_name, namespaces=[namespace] if namespace else [])
+        middleware = ReplicaRoutingMiddleware(
+            lambda req: middleware.process_view(req, view, (), {}) or view(req)
+        )
+        return middleware(request)
+
+
+class ReplicaRoutingTests(RoutingTestCase):
+    def test_catalog_reads_use_replica(self):
+        for view_name in ('home', 'courses:course_list', 'courses:course_detail', 'courses:search'):
+            response = self.dispatch(self.factory.get('/'), view_name)
+            self.assertEqual(response.content, b'replica_1', view_name)
+
+    def test_other_views_read_primary(self):
+        response = self.dispatch(self.factory.get('/'), 'payments:checkout')
+
+        self.assertEqual(response.content, b'default')
+
+    def test_unsafe_methods_read_primary(self):
+        response = self.dispatch(self.factory.post('/'), 'courses:course_detail')
+
+        self.assertEqual(response.content, b'default')
+
+    def test_write_pins_following_reads_to_primary(self):
+        response = self.dispatch(self.factory.post('/'), 'courses:request_callback', writes=True)
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = response.cookies[PIN_COOKIE_NAME].value
+        response = self.dispatch(request, 'courses:course_detail')
+
+        self.assertEqual(response.content, b'default')
+
+    def test_expired_pin_uses_replica(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+
+        response = self.dispatch(request, 'courses:course_list')
+
+        self.assertEqual(response.content, b'replica_1')
+
+    def test_reads_outside_a_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_PIN_SECONDS=10)
+class WriteDetectionTests(TestCase):
+    def dispatch(self, work):
+        """Run ``work`` as a POST view through the middleware; True if the client got pinned to the primary"""
+        def view(request):
+            work()
+            return HttpResponse()
+
+        request = RequestFactory().post('/')
+        request.resolver_match = ResolverMatch(view, (), {}, url_name='request_callback', namespaces=['courses'])
+        middleware = ReplicaRoutingMiddleware(view)
+        return PIN_COOKIE_NAME in middleware(request).cookies
+
+    @skipUnless(connection.vendor == 'postgresql', 'Relies on the rowcount psycopg reports for each statement')
+    def test_only_statements_that_change_rows_are_writes(self):
+        user = User.objects.create_user(username='reader', password='x')
+
+        self.assertFalse(self.dispatch(lambda: User.objects.get_or_create(username='reader')))
+        self.assertFalse(self.dispatch(lambda: User.objects.filter(username='nobody').update(first_name='x')))
+        self.assertFalse(self.dispatch(lambda: list(User.objects.select_for_update().filter(pk=user.pk))))
+        self.assertTrue(self.dispatch(lambda: User.objects.get_or_create(username='writer')))
+        self.assertTrue(self.dispatch(lambda: User.objects.filter(pk=user.pk).update(first_name='x')))
+
+
+class ReadAfterWriteRoutingTests(RoutingTestCase):
+    def authenticated(self, request, last_write=None):
+        request.user = SimpleNamespace(is_authenticated=True, pk=1)
+        request.session = {}
+        if last_write:
+            request.session[LAST_WRITE_SESSION_KEY] = last_write
+        return request
+
+    def test_parse_lsn(self):
+        self.assertEqual(parse_lsn('0/3000060'), 0x3000060)
+        self.assertEqual(parse_lsn('16/B374D848'), (0x16 << 32) + 0xB374D848)
+        self.assertIsNone(parse_lsn(None))
+
+    @mock.patch('config.routers.primary_lsn', return_value=500)
+    def test_write_records_lsn_in_session(self, primary_lsn):
+        request = self.authenticated(self.factory.post('/'))
+
+        response = self.dispatch(request, 'payments:process_payment', writes=True)
+
+        self.assertEqual(request.session[LAST_WRITE_SESSION_KEY]['lsn'], 500)
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    @mock.patch('config.routers.replica_lsn', return_value=400)
+    def test_lagging_replica_falls_back_to_primary(self, replica_lsn):
+        request = self.authenticated(self.factory.get('/'), {'lsn': 500, 'at': time.time()})
+
+        response = self.dispatch(request, 'payments:payment_success')
+
+        self.assertEqual(response.content, b'default')
+
+    @mock.patch('config.routers.replica_lsn', return_value=600)
+    def test_caught_up_replica_is_used(self, replica_lsn):
+        request = self.authenticated(self.factory.get('/'), {'lsn': 500, 'at': time.time()})
+
+        response = self.dispatch(request, 'enrollment:my_learning')
+
+        self.assertEqual(response.content, b'replica_1')
+
+    @mock.patch('config.routers.replica_lsn')
+    def test_old_write_skips_lsn_check(self, replica_lsn):
+        request = self.authenticated(self.factory.get('/'), {'lsn': 500, 'at': time.time() - 60})
+
+        response = self.dispatch(request, 'enrollment:my_learning')
+
+        self.assertEqual(response.content, b'replica_1')
+        replica_lsn.assert_not_called()
+
+    @mock.patch('config.routers.replica_lsn', return_value=400)
+    def test_background_write_for_the_user_is_honoured(self, replica_lsn):
+        request = self.authenticated(self.factory.get('/'))
+        with mock.patch('config.routers.primary_lsn', return_value=500), \
+                mock.patch('config.routers.transaction.on_commit', side_effect=lambda record: record()):
+            record_background_write([1])
+        try:
+            response = self.dispatch(request, 'payments:order_history')
+        finally:
+            cache.delete(f'{LAST_WRITE_CACHE_PREFIX}1')
+
+        self.assertEqual(response.content, b'default')
+
+    def test_recent_write_without_lsn_uses_primary(self):
+        request = self.authenticated(self.factory.get('/'), {'lsn': None, 'at': time.time()})
+
+        response = self.dispatch(request, 'enrollment:my_learning')
+
+        self.assertEqual(response.content, b'default')
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profiling.clear_profiles()
+
+    def test_sampled_request_is_recorded(self):
+        response = self.client.get('/')
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        entry = profiling.recent_profiles()[-1]
+        self.assertEqual(entry['view'], 'home')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['sql_count'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_request_is_untouched(self):
+        response = self.client.get('/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.recent_profiles(), [])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = self.client.get('/')
+
+        self.assertNotIn('Server-Timing', response)
+
+    def test_cache_and_external_calls_are_counted(self):
+        profiling.install_hooks()
+        profile = profiling.RequestProfile(RequestFactory().get('/'))
+        token = profiling._current_profile.set(profile)
+        try:
+            cache.get('profiling-test')
+            cache.set('profiling-test', 1)
+            self.assertEqual(cache.get('profiling-test'), 1)
+            mail.send_mail('Subject', 'Body', None, ['student@example.com'])
+        finally:
+            profiling._current_profile.reset(token)
+            cache.delete('profiling-test')
+
+        self.assertEqual((profile.cache_hits, profile.cache_misses), (1, 1))
+        self.assertIn('email', profile.external)
+
+    # Admin templates use {% static %}, which needs collectstatic with the manifest storage
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_dashboard(self):
+        self.client.get('/')
+        staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/admin/profiling/')
+
+        self.assertContains(response, 'Request profiling')
+        self.assertContains(response, '<td>home</td>', html=True)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.delete(metrics.BACKLOG_CACHE_KEY)
+
+    def scrape(self):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_latency_and_queries(self):
+        before = self.sample('http_request_duration_seconds_count', view='home', method='GET')
+
+        self.client.get('/')
+        response = self.scrape()
+
+        self.assertEqual(self.sample('http_request_duration_seconds_count', view='home', method='GET'), before + 1)
+        self.assertContains(response, 'http_request_db_queries_bucket{le="1.0",view="home"}')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+    def test_business_counters(self):
+        user = User.objects.create_user(username='buyer', password='x')
+        course = Course.objects.create(
+            title='Metrics', slug='metrics', instructor=user, short_description='-', detailed_description='-',
+            price=10, requirements='-', what_you_will_learn='-',
+        )
+        orders_before = self.sample('orders_created_total', payment_method='upi', status='pending')
+        enrollments_before = self.sample('enrollments_created_total')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=user, total_amount=10, final_amount=10, payment_method='upi')
+            PaymentTransaction.objects.create(order=order, transaction_id='UTR-1', payment_method='upi', amount=10)
+            Enrollment.objects.create(user=user, course=course)
+
+        self.assertEqual(self.sample('orders_created_total', payment_method='upi', status='pending'), orders_before + 1)
+        self.assertEqual(self.sample('enrollments_created_total'), enrollments_before + 1)
+        self.assertContains(self.scrape(), 'payment_transactions_pending{payment_method="upi"} 1.0')
+
+        # Later scrapes reuse the backlog for BACKLOG_CACHE_SECONDS
+        PaymentTransaction.objects.filter(order=order).update(status='completed')
+        with self.assertNumQueries(0):
+            self.assertContains(self.scrape(), 'payment_transactions_pending{payment_method="upi"} 1.0')
+
+    def test_two_factor_lockout(self):
+        user = User.objects.create_user(username='locked', password='x')
+        two_factor = TwoFactorAuth.objects.create(user=user, verification_code='123456')
+        lockouts_before = self.sample('two_factor_lockouts_total')
+        invalid_before = self.sample('two_factor_attempts_total', result='invalid')
+
+        for _ in range(5):
+            two_factor.verify_code('000000')
+
+        self.assertEqual(self.sample('two_factor_lockouts_total'), lockouts_before + 1)
+        self.assertEqual(self.sample('two_factor_attempts_total', result='invalid'), invalid_before + 5)
+
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.scrape().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_refused_without_a_token_in_production(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_without_a_token_in_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class AsyncViewTests(TestCase):
+    def test_middleware_stack_is_async_capable(self):
+        # One sync-only middleware would push every async view back onto a thread
+        sync_only = [path for path in settings.MIDDLEWARE if not getattr(import_string(path), 'async_capable', False)]
+        self.assertEqual(sync_only, [])
+
+    async def test_queries_are_counted_across_threads(self):
+        before = REGISTRY.get_sample_value('http_request_db_queries_sum', {'view': 'home'}) or 0
+
+        response = await self.async_client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(REGISTRY.get_sample_value('http_request_db_queries_sum', {'view': 'home'}), before + 2)
+
+    def test_login_required(self):
+        url = reverse('enrollment:daily_classes')
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('users:login')}?next={url}", fetch_redirect_response=False)
+
+    def test_daily_classes_without_enrollments(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='new', password='x'))
+        response = self.client.get(reverse('enrollment:daily_classes'))
+        self.assertRedirects(response, reverse('courses:course_list'), fetch_redirect_response=False)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pg_sleep is PostgreSQL-specific')
+@override_settings(ASYNC_CONCURRENT_QUERIES=True)
+class ConcurrentQueryTests(TransactionTestCase):
+    def tearDown(self):
+        # Pool threads keep their connections; the test database must be droppable
+        close_pool_connections()
+
+    def test_independent_queries_overlap(self):
+        def sleep():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(0.3)')
+            return threading.get_ident()
+
+        start = time.perf_counter()
+        threads = async_to_sync(gather_queries)(sleep, sleep, sleep)
+
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(len(set(threads)), 3)
+
+    def test_connections_outlive_the_event_loop(self):
+        def backend_pid():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid()')
+                return cursor.fetchone()[0]
+
+        # async_to_sync() runs each call on a new loop, as WSGI does for every async view
+        pids = {async_to_sync(gather_queries)(backend_pid)[0] for _ in range(10)}
+
+        self.assertLessEqual(len(pids), settings.ASYNC_QUERY_THREADS)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are PostgreSQL-specific')
+class HotQueryPlanTests(TestCase):
+    """
+    Every hot filter/ordering path in the views must be able to use an index.
+
+    Sequential scans are disabled for the session, so the planner only falls
+    back to one when no usable index exists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.media_root = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=cls.media_root):
+            call_command('seed_courses', courses=12, stdout=open(os.devnull, 'w'))
+
+        cls.student = User.objects.create_user(username='student', password='x')
+        cls.course = Course.objects.filter(is_published=True).first()
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course)
+        for lecture in Course.objects.get(pk=cls.course.pk).sections.first().lectures.all():
+            LectureProgress.objects.create(enrollment=cls.enrollment, lecture=lecture, is_completed=True)
+        Review.objects.create(user=cls.student, course=cls.course, rating=5, comment='Great')
+
+        today = timezone.now().date()
+        for offset in range(-3, 8):
+            DailyClass.objects.create(
+                date=today + timedelta(days=offset), title='Live class', description='Agenda',
+                meet_link='https://meet.google.com/abc-defg-hij', scheduled_time='10:00',
+            )
+        for i in range(5):
+            order = Order.objects.create(user=cls.student, total_amount=10, final_amount=10, payment_method='upi')
+            PaymentTransaction.objects.create(
+                order=order, transaction_id=f'UTR{i}', payment_method='upi', amount=10,
+            )
+            CallbackRequest.objects.create(course=cls.course, name='Lead', email='lead@example.com', phone='123')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def assertUsesIndex(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, f'{queryset.query}\n{plan}')
+
+    def test_catalog_queries(self):
+        published = Course.objects.filter(is_published=True)
+        self.assertUsesIndex(published.order_by('-created_at')[:12])
+        self.assertUsesIndex(published.filter(is_featured=True).order_by('-created_at')[:4])
+        self.assertUsesIndex(published.order_by('-total_enrollments')[:8])
+        self.assertUsesIndex(published.filter(category=self.course.category).order_by('-created_at')[:12])
+
+    def test_course_detail_reviews(self):
+        self.assertUsesIndex(self.course.reviews.filter(is_approved=True).select_related('user')[:10])
+
+    def test_daily_classes_window(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            DailyClass.objects.filter(
+                is_active=True, date__gte=today - timedelta(days=3), date__lte=today + timedelta(days=7)
+            ).order_by('date', 'scheduled_time')
+        )
+        self.assertUsesIndex(
+            DailyClass.objects.filter(
+                is_active=True, course_id__in=[self.course.id], date__range=(today - timedelta(days=3), today + timedelta(days=7))
+            )
+        )
+        self.assertUsesIndex(DailyClass.objects.filter(is_active=True, course=None, date__in=[today]))
+
+    def test_order_history(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.student).order_by('-created_at'))
+
+    def test_pending_transactions(self):
+        self.assertUsesIndex(PaymentTransaction.objects.filter(status='pending').order_by('-created_at'))
+
+    def test_completed_lectures(self):
+        self.assertUsesIndex(
+            LectureProgress.objects.filter(enrollment=self.enrollment, is_completed=True).values_list('lecture_id', flat=True)
+        )
+
+    def test_callback_requests_by_status(self):
+        self.assertUsesIndex(CallbackRequest.objects.filter(status='pending').order_by('-created_at'))
+
+
+class ChangeListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        buyer = User.objects.create_user(username='buyer', password='x')
+        for status in ['completed', 'completed', 'pending']:
+            Order.objects.create(user=buyer, total_amount=100, final_amount=100, payment_status=status)
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self, queryset):
+        return EstimatedCountPaginator(queryset, 100)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Row estimates are read from pg_class')
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_estimated_count_for_unfiltered_large_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE orders')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(Order.objects.all()).count, 3)
+        # The estimate is cached, and never used once the list is filtered
+        with self.assertNumQueries(0):
+            self.assertEqual(self.paginator(Order.objects.all()).count, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(Order.objects.filter(payment_status='pending')).count, 1)
+
+    def test_exact_count_for_small_or_unanalyzed_table(self):
+        with mock.patch('config.changelists.estimated_row_count', return_value=None):
+            self.assertEqual(self.paginator(Order.objects.all()).count, 3)
+        with mock.patch('config.changelists.estimated_row_count', return_value=10):
+            self.assertEqual(self.paginator(Order.objects.all()).count, 3)
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_annotated_columns(self):
+        order = Order.objects.filter(payment_status='completed').first()
+        Invoice.objects.create(order=order, invoice_number='INV-1', subtotal=100, total_amount=100)
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('admin:payments_invoice_changelist'))
+
+        self.assertContains(response, '<td class="field-get_order_user">buyer</td>', html=True)
+        self.assertContains(response, '<td class="field-get_order_payment_status">Completed</td>', html=True)
+
+
+# Admin templates use {% static %}, which needs collectstatic with the manifest storage
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        buyer = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        cls.old = Order.objects.create(user=buyer, total_amount=100, final_amount=100, payment_status='completed')
+        cls.paid = Order.objects.create(user=buyer, total_amount=200, final_amount=200, payment_status='completed')
+        cls.pending = Order.objects.create(user=buyer, total_amount=300, final_amount=300)
+        Order.objects.filter(pk=cls.old.pk).update(created_at=timezone.make_aware(datetime(2026, 1, 15, 12)))
+        Order.objects.filter(pk__in=[cls.paid.pk, cls.pending.pk]).update(
+            created_at=timezone.make_aware(datetime(2026, 2, 10, 12))
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:payments_order_export')
+
+    def test_form(self):
+        response = self.client.get(self.url)
+
+        self.assertContains(response, 'name="start"')
+        self.assertContains(response, '<option value="completed">Completed</option>', html=True)
+        self.assertContains(self.client.get(reverse('admin:payments_order_changelist')), self.url)
+
+    def test_csv_filters_by_date_and_status(self):
+        response = self.client.get(self.url, {
+            'start': '2026-02-01', 'end': '2026-02-28', 'status': 'completed', 'format': 'csv',
+        })
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders-2026-02-01-2026-02-28.csv"')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Order number,Created at,Username,Email'))
+        self.assertTrue(lines[1].startswith(f'{self.paid.order_number},2026-02-10 12:00:00,buyer,buyer@example.com'))
+
+    def test_xlsx(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn(f'<t xml:space="preserve">{self.pending.order_number}</t>', sheet)
+
+    def test_boolean_status(self):
+        response = self.client.get(reverse('admin:enrollment_enrollment_export'), {'status': 'true', 'format': 'csv'})
+
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()[1:], [])
+
+    def test_end_before_start(self):
+        response = self.client.get(self.url, {'start': '2026-02-01', 'end': '2026-01-01', 'format': 'csv'})
+
+        self.assertContains(response, 'The end date must not be before the start date.')
+
+
+# Admin templates use {% static %}, which needs collectstatic with the manifest storage
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ViewPerformanceTests(TestCase):
+    """Query budgets and timings for every app URL; see config/perf.py"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.courses = int(os.environ.get('PERF_COURSES', perf.DEFAULT_COURSES))
+        cls.repeat = int(os.environ.get('PERF_REPEAT', perf.DEFAULT_REPEAT))
+        with override_settings(MEDIA_ROOT=cls.media_root):
+            cls.dataset = perf.seed_dataset(courses=cls.courses)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def test_query_budgets(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            results = perf.run_all(self.dataset, repeat=self.repeat)
+
+        report_path = os.environ.get('PERF_REPORT_PATH')
+        if report_path:
+            perf.write_report(report_path, results, self.courses, self.repeat)
+
+        if self.courses == perf.DEFAULT_COURSES:
+            failures = perf.budget_failures(results)
+            self.assertFalse(failures, 'Views failing their scenario:\n' + '\n'.join(failures))
+
+    def test_each_request_starts_from_the_seeded_state(self):
+        scenario = next(scenario for scenario in perf.SCENARIOS if scenario.name == 'remove_from_wishlist')
+        with override_settings(MEDIA_ROOT=self.media_root):
+            result = perf.run_scenario(scenario, self.dataset, repeat=2)
+
+        self.assertEqual(result['status'], 302)
+        self.assertTrue(self.dataset.student.wishlist.filter(course=self.dataset.wishlist_course).exists())
+
+    def test_budget_failures(self):
+        base = {'budget': 3, 'expected_status': 200, 'status': 200, 'queries': 3}
+        results = {
+            'ok': base,
+            'skipped': {**base, 'skipped': 'broken', 'status': None},
+            'error': {**base, 'status': None, 'error': 'TemplateDoesNotExist: x.html'},
+            'redirected': {**base, 'status': 302},
+            'unbudgeted': {**base, 'budget': None},
+            'over': {**base, 'queries': 4},
+        }
+
+        self.assertEqual(perf.budget_failures(results), [
+            'error: TemplateDoesNotExist: x.html',
+            'over: 4 queries (budget 3)',
+            'redirected: status 302 (expected 200)',
+            'unbudgeted: no query budget (3 queries)',
+        ])
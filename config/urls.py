@@ -2,55 +2,38 @@
 URL configuration for config project.
 """
 from django.contrib import admin
-from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
-from django.shortcuts import render
-from courses.models import Course, Category
+import re
+
+from django.urls import path, include, re_path
+from courses.models import Course
 from django.db.models import Count, Avg
 from django.http import HttpResponse
 from django.core.mail import send_mail
+from config.async_views import arender, gather_queries
+from config.metrics import metrics_view
+from config.profiling import profiling_dashboard
+from config.staticfiles import PRIVATE_MEDIA_PREFIXES, private_media
 
 
-def home(request):
+async def home(request):
     """Homepage view with featured courses"""
-    
-    # Get featured courses
-    featured_courses = Course.objects.filter(
-        is_published=True,
-        is_featured=True
-    ).select_related('instructor', 'category').annotate(
-        student_count=Count('enrollments'),
-        avg_rating=Avg('reviews__rating')
-    )[:4]
-    
-    # Get all active categories
-    categories = Category.objects.filter(is_active=True)[:8]
-    
-    # Get popular courses (by enrollment)
-    popular_courses = Course.objects.filter(
-        is_published=True
-    ).select_related('instructor', 'category').annotate(
+    courses = Course.objects.filter(is_published=True).select_related('instructor', 'category').annotate(
         student_count=Count('enrollments'),
         avg_rating=Avg('reviews__rating')
-    ).order_by('-total_enrollments')[:8]
+    )
     
-    # Get newest courses
-    newest_courses = Course.objects.filter(
-        is_published=True
-    ).select_related('instructor', 'category').annotate(
-        student_count=Count('enrollments'),
-        avg_rating=Avg('reviews__rating')
-    ).order_by('-created_at')[:8]
+    # The sections are independent, so they are fetched concurrently
+    featured_courses, popular_courses = await gather_queries(
+        lambda: list(courses.filter(is_featured=True)[:4]),
+        lambda: list(courses.order_by('-total_enrollments')[:8]),
+    )
     
     context = {
         'featured_courses': featured_courses,
-        'categories': categories,
         'popular_courses': popular_courses,
-        'newest_courses': newest_courses,
     }
     
-    return render(request, 'home/index.html', context)
+    return await arender(request, 'home/index.html', context)
 
 
 def send_test_email(request):
@@ -64,6 +47,7 @@ def send_test_email(request):
     return HttpResponse("Test Email Sent Successfully!")
 
 urlpatterns = [
+    path('admin/profiling/', profiling_dashboard, name='profiling_dashboard'),
     path('admin/', admin.site.urls),
     path('', home, name='home'),  # Updated to use the new home view
     path('users/', include('users.urls')),
@@ -72,8 +56,10 @@ urlpatterns = [
     path('payments/', include('payments.urls')),
     path('reviews/', include('reviews.urls')),
     path('send-test-email/', send_test_email, name='send_test_email'),
+    path('metrics', metrics_view, name='metrics'),
+    re_path(
+        r'^media/(?P<name>(?:%s).+)$' % '|'.join(map(re.escape, PRIVATE_MEDIA_PREFIXES)),
+        private_media, name='private_media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+# Static and media files are served by config.staticfiles.StaticFilesMiddleware
\ No newline at end of file
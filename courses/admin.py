@@ -1,8 +1,10 @@
 from django.contrib import admin
+
+from config.changelists import FastChangeListMixin
 from .models import Category, Course, Section, Lecture, CallbackRequest
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['name', 'slug', 'is_active', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     list_filter = ['is_active']
@@ -16,28 +18,36 @@ class LectureInline(admin.TabularInline):
     extra = 1
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['title', 'instructor', 'category', 'price', 'is_published', 'is_featured', 'created_at']
     list_filter = ['is_published', 'is_featured', 'level', 'category']
+    list_select_related = ['instructor', 'category']
     search_fields = ['title', 'instructor__username']
+    autocomplete_fields = ['instructor']
     prepopulated_fields = {'slug': ('title',)}
     inlines = [SectionInline]
 
 @admin.register(Section)
-class SectionAdmin(admin.ModelAdmin):
+class SectionAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['title', 'course', 'order']
+    list_select_related = ['course']
+    autocomplete_fields = ['course']
     inlines = [LectureInline]
 
 @admin.register(Lecture)
-class LectureAdmin(admin.ModelAdmin):
+class LectureAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['title', 'section', 'duration_minutes', 'is_preview', 'order']
     list_filter = ['is_preview']
+    list_select_related = ['section__course']
+    raw_id_fields = ['section']
 
 @admin.register(CallbackRequest)
-class CallbackRequestAdmin(admin.ModelAdmin):
+class CallbackRequestAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'course', 'status', 'created_at']
     list_filter = ['status', 'created_at', 'course']
+    list_select_related = ['course']
     search_fields = ['name', 'email', 'phone', 'course__title']
+    autocomplete_fields = ['course']
     readonly_fields = ['created_at', 'updated_at']
     
     fieldsets = (
@@ -0,0 +1,70 @@
+# courses/management/commands/generate_thumbnails.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses.models import Course
+from courses.thumbnails import render_derivatives
+
+
+def _render(course_id, source_name):
+    """Process pool worker - only touches storage, never the database"""
+    try:
+        return course_id, source_name, render_derivatives(source_name), None
+    except (OSError, ValueError) as e:
+        return course_id, source_name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generates responsive thumbnail derivatives for existing courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes (defaults to CPU count)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives even if they are up to date'
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.exclude(thumbnail_image='').values_list(
+            'id', 'thumbnail_image', 'thumbnail_variants'
+        )
+        pending = [
+            (course_id, source_name)
+            for course_id, source_name, variants in courses
+            if options['force'] or (variants or {}).get('source') != source_name
+        ]
+
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All course thumbnails are up to date.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Generating thumbnails for {len(pending)} courses...'))
+
+        # Forked workers must not inherit open DB connections
+        connections.close_all()
+
+        generated = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_render, *item) for item in pending]
+            for future in as_completed(futures):
+                course_id, source_name, widths, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'  ✗ Course {course_id}: {error}'))
+                    continue
+
+                Course.objects.filter(pk=course_id, thumbnail_image=source_name).update(
+                    thumbnail_variants={'source': source_name, 'widths': widths}
+                )
+                generated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Generated thumbnails for {generated} courses ({failed} failed).'))
@@ -1,16 +1,91 @@
 # courses/management/commands/seed_courses.py
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from courses.models import Category, Course, Section, Lecture
+from courses.thumbnails import render_derivatives
+from enrollment.models import Enrollment, LectureProgress
+from payments.models import Order, OrderItem, PaymentTransaction
+from reviews.models import Review
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
 from decimal import Decimal
+from itertools import accumulate
+import hashlib
+import posixpath
 import random
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageDraw
 
 User = get_user_model()
 
+THUMBNAIL_COLORS = [
+    (74, 144, 226),   # Blue
+    (52, 168, 83),    # Green
+    (234, 67, 53),    # Red
+    (251, 188, 5),    # Yellow
+    (156, 39, 176),   # Purple
+    (255, 112, 67),   # Orange
+]
+
+# Popularity of the n-th most popular course is proportional to 1 / n**s
+POPULARITY_EXPONENT = 1.1
+
+# Enrollments per student follow a Pareto tail: most take one or two courses
+ENROLLMENTS_PARETO_ALPHA = 1.3
+MAX_ENROLLMENTS_PER_STUDENT = 25
+
+# Share of students who finish a course; the rest drop off early (beta distribution)
+COMPLETION_RATE = 0.08
+REVIEW_RATE = 0.35
+RATING_WEIGHTS = {1: 2, 2: 3, 3: 10, 4: 35, 5: 50}
+
+ORDER_STATUS_WEIGHTS = {'completed': 90, 'pending': 6, 'failed': 4}
+PAYMENT_METHOD_WEIGHTS = {'razorpay': 60, 'upi': 40}
+TRANSACTION_STATUS = {'completed': 'success', 'pending': 'pending', 'failed': 'failed'}
+
+REVIEW_COMMENTS = [
+    'Great course, the projects really helped me understand the material.',
+    'Clear explanations and well paced.',
+    'Good content but some sections could go deeper.',
+    'Exactly what I needed to get started.',
+    'The instructor explains difficult topics very well.',
+    'Decent overview, a bit too basic for me.',
+]
+
+
+def seed_order_number(username):
+    """
+    An order number drawn from the seeded RNG, so ``--seed`` reproduces it.
+
+    Seeded students keep their orders across ``--clear`` and each run adds
+    new students, so mixing in the username keeps a re-run with the same
+    seed from repeating earlier numbers.
+    """
+    digest = hashlib.sha256(f'{username}:{random.getrandbits(64)}'.encode()).hexdigest()
+    return f'ORD-{digest[:10].upper()}'
+
+
+def render_seed_thumbnail(name, color, label):
+    """Process pool worker - writes a thumbnail and its derivatives, never touches the database"""
+    img = Image.new('RGB', (800, 450), color)
+
+    # A darker title band keeps every generated image distinct
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([(0, 340), (800, 450)], fill=tuple(int(c * 0.7) for c in color))
+    draw.text((32, 385), label, fill=(255, 255, 255))
+
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    saved_name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return saved_name, render_derivatives(saved_name)
+
+
 class Command(BaseCommand):
     help = 'Seeds the database with sample course data'
 
@@ -21,15 +96,44 @@ class Command(BaseCommand):
             default=12,
             help='Number of courses to create'
         )
+        parser.add_argument(
+            '--students',
+            type=int,
+            default=0,
+            help='Number of students to create, with enrollments, progress, reviews and orders'
+        )
         parser.add_argument(
             '--clear',
             action='store_true',
             help='Clear existing data before seeding'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for a reproducible dataset'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Thumbnail worker processes (defaults to CPU count, 1 renders in-process)'
+        )
 
     def handle(self, *args, **options):
         num_courses = options['courses']
+        num_students = options['students']
         clear_data = options['clear']
+        batch_size = options['batch_size']
+
+        if options['seed'] is not None:
+            random.seed(options['seed'])
 
         if clear_data:
             self.stdout.write(self.style.WARNING('Clearing existing data...'))
@@ -47,7 +151,16 @@ class Command(BaseCommand):
         instructors = self.create_instructors()
 
         self.stdout.write(self.style.SUCCESS(f'Creating {num_courses} courses...'))
-        courses = self.create_courses(num_courses, categories, instructors)
+        courses, lectures_by_course = self.create_courses(
+            num_courses, categories, instructors, batch_size, options['workers']
+        )
+
+        if num_students:
+            self.stdout.write(self.style.SUCCESS(f'Creating {num_students} students...'))
+            students = self.create_students(num_students, batch_size)
+
+            self.stdout.write(self.style.SUCCESS('Creating enrollments, progress, reviews and orders...'))
+            self.create_activity(students, courses, lectures_by_course, batch_size)
 
         self.stdout.write(self.style.SUCCESS(f'Successfully seeded {len(courses)} courses!'))
 
@@ -133,30 +246,9 @@ class Command(BaseCommand):
 
         return instructors
 
-    def generate_thumbnail(self):
-        """Generate a simple colored thumbnail image"""
-        # Create a simple colored image
-        colors = [
-            (74, 144, 226),   # Blue
-            (52, 168, 83),    # Green
-            (234, 67, 53),    # Red
-            (251, 188, 5),    # Yellow
-            (156, 39, 176),   # Purple
-            (255, 112, 67),   # Orange
-        ]
-        
-        color = random.choice(colors)
-        img = Image.new('RGB', (800, 450), color)
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG')
-        buffer.seek(0)
-        
-        return ContentFile(buffer.read(), name='thumbnail.jpg')
 
-    def create_courses(self, num_courses, categories, instructors):
-        """Create courses with sections and lectures"""
+    def create_courses(self, num_courses, categories, instructors, batch_size, workers):
+        """Bulk create courses with sections and lectures, in batches of batch_size"""
         # Category mapping for exact matches
         category_map = {
             'Web Development': 'Web Development',
@@ -268,27 +360,25 @@ class Command(BaseCommand):
 
         # Use only the courses we need
         courses_to_create = courses_data[:min(num_courses, len(courses_data))]
-        
+
         # If more courses needed, repeat with variations
+        editions = ['Advanced Edition', 'Hands-on Projects', 'Crash Course', 'Masterclass', 'Interview Prep', 'Second Edition']
         while len(courses_to_create) < num_courses:
             base_course = random.choice(courses_data)
             variation = base_course.copy()
-            variation['title'] = f"{base_course['title']} - Advanced Edition"
+            variation['title'] = f"{base_course['title']} - {random.choice(editions)}"
             courses_to_create.append(variation)
 
-        courses = []
-        for i, course_data in enumerate(courses_to_create):
-            # Use exact category name match to avoid duplicates
-            try:
-                category = Category.objects.get(name=course_data['category'])
-            except Category.DoesNotExist:
-                # Fallback to first matching category
-                category = categories[0]
-            instructor = random.choice(instructors)
-            
-            # Detailed description
-            detailed_desc = f"""
-This comprehensive course on {course_data['title']} will take you from beginner to advanced level.
+        categories_by_name = {category.name: category for category in categories}
+
+        # Continue numbering after existing courses so slugs stay unique without --clear
+        offset = Course.objects.count()
+
+        self.stdout.write(f'  Rendering {num_courses} thumbnails...')
+        thumbnails = self.generate_thumbnails(courses_to_create, offset, workers)
+
+        detailed_desc = """
+This comprehensive course on {title} will take you from beginner to advanced level.
 
 You'll learn:
 - Core concepts and fundamentals
@@ -303,14 +393,14 @@ Our hands-on approach ensures you learn by doing, with plenty of exercises, proj
 By the end of this course, you'll have the confidence and skills to build professional-grade applications.
 """
 
-            requirements = """
+        requirements = """
 - Basic computer skills
 - Access to a computer with internet connection
 - Willingness to learn and practice
 - No prior programming experience required (for beginner courses)
 """
 
-            what_you_will_learn = """
+        what_you_will_learn = """
 - Master the core concepts
 - Build real-world projects
 - Write clean, efficient code
@@ -319,58 +409,248 @@ By the end of this course, you'll have the confidence and skills to build profes
 - Debug and troubleshoot
 """
 
-            course = Course.objects.create(
-                title=course_data['title'],
-                slug=slugify(course_data['title'] + str(i)),
-                instructor=instructor,
-                category=category,
-                short_description=course_data['short_description'],
-                detailed_description=detailed_desc.strip(),
-                price=Decimal(str(course_data['price'])),
-                discount_price=Decimal(str(course_data['discount_price'])) if course_data['discount_price'] else None,
-                level=course_data['level'],
-                language='English',
-                duration_hours=random.randint(8, 40),
-                total_lectures=random.randint(50, 200),
-                requirements=requirements.strip(),
-                what_you_will_learn=what_you_will_learn.strip(),
-                is_published=True,
-                is_featured=random.choice([True, False]),
-                average_rating=Decimal(str(round(random.uniform(4.0, 5.0), 1))),
-                total_enrollments=random.randint(100, 5000)
-            )
-
-            # Add thumbnail
-            course.thumbnail_image = self.generate_thumbnail()
-            course.save()
-
-            # Create sections
-            num_sections = random.randint(4, 8)
-            for j in range(num_sections):
-                section = Section.objects.create(
-                    course=course,
-                    title=f"Section {j+1}: {self.get_section_title(course_data['category'])}",
-                    description=f"In this section, you'll learn important concepts and techniques.",
-                    order=j
-                )
+        courses = []
+        lectures_by_course = {}
+        for start in range(0, num_courses, batch_size):
+            end = min(start + batch_size, num_courses)
+            batch = []
+            outlines = []
+            for i in range(start, end):
+                course_data = courses_to_create[i]
+                # Fallback to first category for unknown names
+                category = categories_by_name.get(course_data['category'], categories[0])
+                thumbnail_name, widths = thumbnails[i]
+
+                # Lecture count per section, decided up front so total_lectures is exact
+                outline = [random.randint(5, 12) for _ in range(random.randint(4, 8))]
+                outlines.append(outline)
+
+                batch.append(Course(
+                    title=course_data['title'],
+                    slug=slugify(course_data['title'] + str(offset + i)),
+                    instructor=random.choice(instructors),
+                    category=category,
+                    short_description=course_data['short_description'],
+                    detailed_description=detailed_desc.format(title=course_data['title']).strip(),
+                    thumbnail_image=thumbnail_name,
+                    thumbnail_variants={'source': thumbnail_name, 'widths': widths},
+                    price=Decimal(str(course_data['price'])),
+                    discount_price=Decimal(str(course_data['discount_price'])) if course_data.get('discount_price') else None,
+                    level=course_data['level'],
+                    language='English',
+                    duration_hours=random.randint(8, 40),
+                    total_lectures=sum(outline),
+                    requirements=requirements.strip(),
+                    what_you_will_learn=what_you_will_learn.strip(),
+                    is_published=True,
+                    is_featured=random.choice([True, False]),
+                    average_rating=Decimal(str(round(random.uniform(4.0, 5.0), 1))),
+                    total_enrollments=random.randint(100, 5000)
+                ))
+
+            with transaction.atomic():
+                # bulk_create skips post_save, so no thumbnail jobs are queued twice
+                Course.objects.bulk_create(batch)
+
+                sections = []
+                section_lectures = []
+                for course, outline in zip(batch, outlines):
+                    category_name = course.category.name
+                    for j, num_lectures in enumerate(outline):
+                        sections.append(Section(
+                            course=course,
+                            title=f"Section {j+1}: {self.get_section_title(category_name)}",
+                            description="In this section, you'll learn important concepts and techniques.",
+                            order=j
+                        ))
+                        section_lectures.append(num_lectures)
+                Section.objects.bulk_create(sections, batch_size=batch_size)
+
+                lectures = []
+                for section, num_lectures in zip(sections, section_lectures):
+                    for k in range(num_lectures):
+                        lectures.append(Lecture(
+                            section=section,
+                            title=f"Lecture {k+1}: {self.get_lecture_title()}",
+                            description="Detailed explanation of the topic with examples.",
+                            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                            duration_minutes=random.randint(5, 25),
+                            order=k,
+                            is_preview=(k == 0)  # First lecture is preview
+                        ))
+                Lecture.objects.bulk_create(lectures, batch_size=batch_size)
+
+            for lecture in lectures:
+                lectures_by_course.setdefault(lecture.section.course_id, []).append(lecture.pk)
+
+            courses.extend(batch)
+            self.stdout.write(f'  ✓ Created courses {start + 1}-{end} ({len(sections)} sections, {len(lectures)} lectures)')
+
+        return courses, lectures_by_course
+
+    def generate_thumbnails(self, courses_to_create, offset, workers):
+        """Render every course thumbnail, in a process pool unless workers is 1"""
+        upload_to = Course._meta.get_field('thumbnail_image').upload_to
+        jobs = [
+            (posixpath.join(upload_to, f'seed-{offset + i + 1}.jpg'), random.choice(THUMBNAIL_COLORS), course_data['title'])
+            for i, course_data in enumerate(courses_to_create)
+        ]
 
-                # Create lectures
-                num_lectures = random.randint(5, 12)
-                for k in range(num_lectures):
-                    Lecture.objects.create(
-                        section=section,
-                        title=f"Lecture {k+1}: {self.get_lecture_title()}",
-                        description="Detailed explanation of the topic with examples.",
-                        video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-                        duration_minutes=random.randint(5, 25),
-                        order=k,
-                        is_preview=(k == 0)  # First lecture is preview
+        if workers == 1 or len(jobs) < 2:
+            return [render_seed_thumbnail(*job) for job in jobs]
+
+        # Workers only write files, so the parent's DB connection is never used after fork
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(render_seed_thumbnail, *zip(*jobs), chunksize=16))
+
+    def create_students(self, num_students, batch_size):
+        """Create student accounts in bulk"""
+        first_names = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera']
+        last_names = ['Sharma', 'Patel', 'Reddy', 'Iyer', 'Gupta', 'Singh', 'Nair', 'Das', 'Kumar', 'Joshi']
+
+        # Hashing once instead of per user keeps this fast; every student shares the password
+        password = make_password('password123')
+        offset = User.objects.filter(username__startswith='seed_student_').count()
+
+        students = [
+            User(
+                username=f'seed_student_{offset + i + 1}',
+                email=f'seed_student_{offset + i + 1}@example.com',
+                first_name=random.choice(first_names),
+                last_name=random.choice(last_names),
+                password=password,
+                is_active=True
+            )
+            for i in range(num_students)
+        ]
+        User.objects.bulk_create(students, batch_size=batch_size)
+        self.stdout.write(f'  ✓ Created {len(students)} students')
+        return students
+
+    def create_activity(self, students, courses, lectures_by_course, batch_size):
+        """Enroll students with skewed popularity, progress, ratings and payment outcomes"""
+        now = timezone.now()
+
+        # Rank a shuffled catalog so popularity isn't tied to creation order
+        ranked = random.sample(courses, len(courses))
+        cum_weights = list(accumulate(1 / (rank + 1) ** POPULARITY_EXPONENT for rank in range(len(ranked))))
+
+        enrollment_counts = Counter()
+        rating_sums = Counter()
+        rating_counts = Counter()
+        totals = Counter()
+
+        for start in range(0, len(students), batch_size):
+            orders = []
+            order_items = []
+            transactions = []
+            enrollments = []
+            progress = []
+            reviews = []
+
+            for student in students[start:start + batch_size]:
+                wanted = min(int(random.paretovariate(ENROLLMENTS_PARETO_ALPHA)), MAX_ENROLLMENTS_PER_STUDENT, len(ranked))
+                picked = {}
+                for _ in range(wanted * 10):
+                    if len(picked) == wanted:
+                        break
+                    course = random.choices(ranked, cum_weights=cum_weights)[0]
+                    picked[course.pk] = course
+                picked = list(picked.values())
+
+                paid = [course for course in picked if course.get_actual_price() > 0]
+                if paid:
+                    status = random.choices(list(ORDER_STATUS_WEIGHTS), list(ORDER_STATUS_WEIGHTS.values()))[0]
+                    method = random.choices(list(PAYMENT_METHOD_WEIGHTS), list(PAYMENT_METHOD_WEIGHTS.values()))[0]
+                    total = sum(course.get_actual_price() for course in paid)
+                    order = Order(
+                        user=student,
+                        order_number=seed_order_number(student.username),
+                        total_amount=total,
+                        final_amount=total,
+                        payment_status=status,
+                        payment_method=method,
+                        verified_at=now if status == 'completed' and method == 'upi' else None
+                    )
+                    orders.append(order)
+                    order_items.extend((order, course) for course in paid)
+                    transactions.append(PaymentTransaction(
+                        order=order,
+                        transaction_id=f'SEED-{order.order_number}',
+                        payment_method=method,
+                        amount=total,
+                        status=TRANSACTION_STATUS[status],
+                        upi_transaction_ref=f'{random.randrange(10**11, 10**12)}' if method == 'upi' else ''
+                    ))
+                    # Courses from unpaid orders are not unlocked
+                    if status != 'completed':
+                        picked = [course for course in picked if course not in paid]
+
+                for course in picked:
+                    lecture_ids = lectures_by_course.get(course.pk, [])
+                    fraction = 1.0 if random.random() < COMPLETION_RATE else random.betavariate(0.6, 2.0)
+                    done = round(len(lecture_ids) * fraction)
+                    is_completed = bool(lecture_ids) and done == len(lecture_ids)
+
+                    enrollment = Enrollment(
+                        user=student,
+                        course=course,
+                        is_completed=is_completed,
+                        completion_date=now if is_completed else None,
+                        progress_percentage=Decimal(done * 100 / len(lecture_ids)).quantize(Decimal('0.01')) if lecture_ids else 0
+                    )
+                    enrollments.append(enrollment)
+                    enrollment_counts[course.pk] += 1
+
+                    progress.extend(
+                        LectureProgress(
+                            enrollment=enrollment,
+                            lecture_id=lecture_id,
+                            is_completed=True,
+                            watched_duration=random.randint(300, 1500),
+                            completed_at=now
+                        )
+                        for lecture_id in lecture_ids[:done]
                     )
 
-            courses.append(course)
-            self.stdout.write(f'  ✓ Created course: {course.title}')
+                    # Students who got some way in are the ones who leave reviews
+                    if fraction >= 0.2 and random.random() < REVIEW_RATE:
+                        rating = random.choices(list(RATING_WEIGHTS), list(RATING_WEIGHTS.values()))[0]
+                        reviews.append(Review(
+                            user=student,
+                            course=course,
+                            rating=rating,
+                            comment=random.choice(REVIEW_COMMENTS)
+                        ))
+                        rating_sums[course.pk] += rating
+                        rating_counts[course.pk] += 1
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders, batch_size=batch_size)
+                OrderItem.objects.bulk_create(
+                    [OrderItem(order=order, course=course, price=course.get_actual_price()) for order, course in order_items],
+                    batch_size=batch_size
+                )
+                PaymentTransaction.objects.bulk_create(transactions, batch_size=batch_size)
+                Enrollment.objects.bulk_create(enrollments, batch_size=batch_size)
+                LectureProgress.objects.bulk_create(progress, batch_size=batch_size)
+                Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+            totals.update(orders=len(orders), enrollments=len(enrollments), progress=len(progress), reviews=len(reviews))
+
+        # Replace the placeholder catalog numbers with ones that match the data
+        for course in courses:
+            course.total_enrollments = enrollment_counts[course.pk]
+            course.average_rating = (
+                Decimal(rating_sums[course.pk] / rating_counts[course.pk]).quantize(Decimal('0.01'))
+                if rating_counts[course.pk] else Decimal('0')
+            )
+        Course.objects.bulk_update(courses, ['total_enrollments', 'average_rating'], batch_size=batch_size)
 
-        return courses
+        self.stdout.write(
+            f"  ✓ Created {totals['enrollments']} enrollments, {totals['progress']} lecture progress rows, "
+            f"{totals['reviews']} reviews and {totals['orders']} orders"
+        )
 
     def get_section_title(self, category):
         """Generate section titles based on category"""
@@ -402,4 +682,4 @@ By the end of this course, you'll have the confidence and skills to build profes
             'Testing and Debugging',
             'Optimization Strategies'
         ]
-        return random.choice(topics)
\ No newline at end of file
+        return random.choice(topics)
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='callbackrequest',
+            index=models.Index(fields=['status', '-created_at'], name='callback_status_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at'], name='course_published_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-total_enrollments'], name='course_published_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_featured', True), ('is_published', True)), fields=['-created_at'], name='course_featured_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-created_at'], name='course_category_recent_idx'),
+        ),
+    ]
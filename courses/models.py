@@ -39,6 +39,7 @@ class Course(models.Model):
     short_description = models.CharField(max_length=300)
     detailed_description = models.TextField()
     thumbnail_image = models.ImageField(upload_to='courses/thumbnails/')
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Generated responsive thumbnail widths")
     preview_video_url = models.URLField(blank=True, help_text="YouTube or Vimeo URL")
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0)])
@@ -60,6 +61,13 @@ class Course(models.Model):
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
     
+    def has_current_thumbnail_variants(self):
+        """Whether generated derivatives match the current thumbnail upload"""
+        return bool(
+            self.thumbnail_image
+            and self.thumbnail_variants.get('source') == self.thumbnail_image.name
+        )
+    
     def get_actual_price(self):
         return self.discount_price if self.discount_price else self.price
     
@@ -72,6 +80,13 @@ class Course(models.Model):
     class Meta:
         db_table = 'courses'
         ordering = ['-created_at']
+        indexes = [
+            # Catalog listings only ever show published courses
+            models.Index(fields=['-created_at'], condition=models.Q(is_published=True), name='course_published_recent_idx'),
+            models.Index(fields=['-total_enrollments'], condition=models.Q(is_published=True), name='course_published_popular_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_published=True, is_featured=True), name='course_featured_recent_idx'),
+            models.Index(fields=['category', '-created_at'], condition=models.Q(is_published=True), name='course_category_recent_idx'),
+        ]
 
 
 class Section(models.Model):
@@ -131,5 +146,8 @@ class CallbackRequest(models.Model):
     class Meta:
         db_table = 'callback_requests'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='callback_status_recent_idx'),
+        ]
         verbose_name = 'Callback Request'
         verbose_name_plural = 'Callback Requests'
\ No newline at end of file
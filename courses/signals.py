@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from config.background import enqueue
+from .models import Course
+from .thumbnails import generate_course_thumbnails
+
+
+@receiver(post_save, sender=Course)
+def queue_thumbnail_derivatives(sender, instance, **kwargs):
+    """Queue responsive thumbnail generation when a new image is uploaded"""
+    if instance.thumbnail_image and not instance.has_current_thumbnail_variants():
+        enqueue(generate_course_thumbnails, instance.pk)
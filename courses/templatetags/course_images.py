@@ -0,0 +1,58 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from courses.thumbnails import derivative_name
+
+register = template.Library()
+
+# Bootstrap card grid: full width on phones, 2-3 columns from md upwards
+DEFAULT_SIZES = '(max-width: 767px) 100vw, (max-width: 1199px) 50vw, 33vw'
+
+# Width used for the plain src fallback
+FALLBACK_WIDTH = 480
+
+
+def _srcset(source_name, widths, fmt):
+    return ', '.join(
+        f'{default_storage.url(derivative_name(source_name, width, fmt))} {width}w'
+        for width in widths
+    )
+
+
+@register.simple_tag
+def course_thumbnail(course, sizes=DEFAULT_SIZES, **attrs):
+    """
+    Render a course thumbnail as a responsive <picture>.
+
+    Usage: {% course_thumbnail course class="card-img-top" style="height: 200px" %}
+
+    Falls back to the original upload until derivatives have been generated.
+    """
+    attrs.setdefault('alt', course.title)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    if not course.thumbnail_image:
+        return ''
+
+    if not course.has_current_thumbnail_variants():
+        return format_html('<img src="{}"{} />', course.thumbnail_image.url, flatatt(attrs))
+
+    source_name = course.thumbnail_image.name
+    widths = course.thumbnail_variants['widths']
+    fallback = min(widths, key=lambda w: abs(w - FALLBACK_WIDTH))
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}"{} />'
+        '</picture>',
+        _srcset(source_name, widths, 'webp'),
+        sizes,
+        default_storage.url(derivative_name(source_name, fallback, 'jpeg')),
+        _srcset(source_name, widths, 'jpeg'),
+        sizes,
+        flatatt(attrs),
+    )
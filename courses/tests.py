@@ -1,3 +1,150 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+from io import BytesIO
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from enrollment.models import Enrollment, LectureProgress
+from payments.models import Order
+from users.models import User
+from .models import Category, Course, Lecture
+from .management.commands.seed_courses import seed_order_number
+from .thumbnails import THUMBNAIL_WIDTHS, derivative_name
+
+
+def make_image(width=800, height=450, fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (74, 144, 226)).save(buffer, format=fmt)
+    return ContentFile(buffer.getvalue(), name='thumbnail.jpg')
+
+
+def make_course(instructor, category=None, **kwargs):
+    defaults = {
+        'title': 'Test Course',
+        'short_description': 'Short',
+        'detailed_description': 'Detailed',
+        'price': 10,
+        'requirements': 'None',
+        'what_you_will_learn': 'Things',
+        'is_published': True,
+    }
+    defaults.update(kwargs)
+    return Course.objects.create(instructor=instructor, category=category, **defaults)
+
+
+class CourseThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_TASKS_EAGER=True)
+        self.settings_override.enable()
+        self.instructor = User.objects.create_user(username='instructor', password='x', is_instructor=True)
+        self.category = Category.objects.create(name='Python')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_upload_generates_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course(self.instructor, self.category, thumbnail_image=make_image())
+
+        course.refresh_from_db()
+        self.assertTrue(course.has_current_thumbnail_variants())
+        self.assertEqual(course.thumbnail_variants['widths'], list(THUMBNAIL_WIDTHS))
+        for width in THUMBNAIL_WIDTHS:
+            for fmt in ('jpeg', 'webp'):
+                self.assertTrue(default_storage.exists(derivative_name(course.thumbnail_image.name, width, fmt)))
+
+    def test_small_source_is_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course(self.instructor, self.category, thumbnail_image=make_image(400, 225))
+
+        course.refresh_from_db()
+        self.assertEqual(course.thumbnail_variants['widths'], [320])
+
+    def test_tag_emits_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = make_course(self.instructor, self.category, thumbnail_image=make_image())
+        course.refresh_from_db()
+
+        html = Template(
+            '{% load course_images %}{% course_thumbnail course class="card-img-top" %}'
+        ).render(Context({'course': course}))
+
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-320w.webp 320w', html)
+        self.assertIn('-800w.jpg 800w', html)
+        self.assertIn('class="card-img-top"', html)
+
+    def test_tag_falls_back_to_original(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            course = make_course(self.instructor, self.category, thumbnail_image=make_image())
+
+        html = Template('{% load course_images %}{% course_thumbnail course %}').render(Context({'course': course}))
+
+        self.assertNotIn('srcset', html)
+        self.assertIn(course.thumbnail_image.url, html)
+
+
+class SeedCoursesCommandTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def seed(self, **options):
+        with open(os.devnull, 'w') as devnull:
+            call_command('seed_courses', workers=1, batch_size=2, stdout=devnull, **options)
+
+    def test_bulk_seed_is_consistent(self):
+        self.seed(courses=5, students=40, seed=3)
+
+        self.assertEqual(Course.objects.count(), 5)
+        for course in Course.objects.all():
+            self.assertEqual(course.total_lectures, Lecture.objects.filter(section__course=course).count())
+            self.assertEqual(course.total_enrollments, course.enrollments.count())
+            self.assertTrue(course.has_current_thumbnail_variants())
+
+        self.assertEqual(User.objects.filter(username__startswith='seed_student_').count(), 40)
+        self.assertTrue(Enrollment.objects.exists())
+        for enrollment in Enrollment.objects.all():
+            done = LectureProgress.objects.filter(enrollment=enrollment, is_completed=True).count()
+            self.assertEqual(enrollment.is_completed, done == enrollment.course.total_lectures)
+
+        # Paid courses are only unlocked by completed orders
+        for order in Order.objects.exclude(payment_status='completed'):
+            for item in order.items.all():
+                self.assertFalse(Enrollment.objects.filter(user=order.user, course=item.course).exists())
+
+    def test_seed_is_reproducible(self):
+        def snapshot():
+            return (
+                list(Course.objects.order_by('slug').values_list('slug', 'price', 'total_lectures', 'total_enrollments')),
+                sorted(Enrollment.objects.values_list('course__slug', 'progress_percentage')),
+            )
+
+        self.seed(courses=4, students=15, seed=11)
+        first = snapshot()
+        # --clear drops the courses (and their enrollments), so slugs are reused
+        self.seed(courses=4, students=15, seed=11, clear=True)
+        self.assertEqual(snapshot(), first)
+
+    def test_seed_order_numbers_follow_the_seed(self):
+        numbers = []
+        for _ in range(2):
+            random.seed(7)
+            numbers.append([seed_order_number(f'seed_student_{i}') for i in range(3)])
+
+        self.assertEqual(numbers[0], numbers[1])
+        self.assertEqual(len(set(numbers[0])), 3)
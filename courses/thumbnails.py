@@ -0,0 +1,90 @@
+"""
+Responsive derivatives for course thumbnails.
+
+Every uploaded ``Course.thumbnail_image`` is resized to a few card-sized
+widths and encoded as both JPEG and WebP. The widths that were produced are
+recorded on ``Course.thumbnail_variants`` so templates can build ``srcset``
+attributes without touching storage.
+"""
+
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Course cards render at roughly 350px wide; 800 covers 2x displays
+THUMBNAIL_WIDTHS = (320, 480, 800)
+
+THUMBNAIL_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 75, 'method': 4}),
+}
+
+
+def derivative_name(source_name, width, fmt):
+    """Storage path of the ``fmt`` derivative of ``source_name`` at ``width`` pixels"""
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    extension = THUMBNAIL_FORMATS[fmt][1]
+    return posixpath.join(directory, 'derived', f'{stem}-{width}w.{extension}')
+
+
+def render_derivatives(source_name, storage=None):
+    """
+    Write every width/format derivative of ``source_name`` to storage.
+
+    Returns the list of widths produced. Widths wider than the source are
+    skipped so images are never upscaled.
+    """
+    storage = storage or default_storage
+
+    with storage.open(source_name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    source_width, source_height = image.size
+    widths = [w for w in THUMBNAIL_WIDTHS if w <= source_width] or [source_width]
+
+    for width in widths:
+        height = max(1, round(source_height * width / source_width))
+        resized = image.resize((width, height), Image.LANCZOS)
+
+        for fmt, (pil_format, _, save_options) in THUMBNAIL_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, **save_options)
+
+            name = derivative_name(source_name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+    return widths
+
+
+def generate_course_thumbnails(course_id):
+    """Render derivatives for one course and record them on the row"""
+    from .models import Course
+
+    source_name = (
+        Course.objects.filter(pk=course_id)
+        .values_list('thumbnail_image', flat=True)
+        .first()
+    )
+    if not source_name:
+        return
+
+    try:
+        widths = render_derivatives(source_name)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not generate thumbnails for course {course_id}: {str(e)}")
+        return
+
+    # update() skips save() so this doesn't re-trigger post_save or bump updated_at
+    Course.objects.filter(pk=course_id, thumbnail_image=source_name).update(
+        thumbnail_variants={'source': source_name, 'widths': widths}
+    )
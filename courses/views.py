@@ -4,6 +4,9 @@ from django.contrib import messages
 from django.db.models import Q, Count, Avg
 from django.http import JsonResponse
 from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
+
+from config.async_views import aget_user, arender, gather_queries, run_blocking
 
 from .models import Course, Category, Section, Lecture, CallbackRequest
 from .emails import send_callback_request_email
@@ -108,32 +111,27 @@ def category_courses(request, slug):
     return render(request, 'courses/category_courses.html', context)
 
 
-def course_detail(request, slug):
+async def course_detail(request, slug):
     """Display course detail page"""
-    course = get_object_or_404(
+    course = await sync_to_async(get_object_or_404)(
         Course.objects.select_related('instructor', 'category'),
         slug=slug,
         is_published=True
     )
-    
-    # Get sections and lectures
-    sections = course.sections.prefetch_related('lectures').order_by('order')
-    
-    # Get reviews
-    reviews = course.reviews.filter(is_approved=True).select_related('user')[:10]
-    
-    # Check if user is enrolled
-    is_enrolled = False
-    if request.user.is_authenticated:
-        is_enrolled = Enrollment.objects.filter(user=request.user, course=course).exists()
-    
-    # Get related courses
-    related_courses = Course.objects.filter(
-        category=course.category,
-        is_published=True
-    ).exclude(id=course.id).annotate(
-        student_count=Count('enrollments')
-    )[:4]
+    user = await aget_user(request)
+    
+    # Sections, reviews, enrollment and related courses don't depend on each other
+    sections, reviews, is_enrolled, related_courses = await gather_queries(
+        lambda: list(course.sections.prefetch_related('lectures').order_by('order')),
+        lambda: list(course.reviews.filter(is_approved=True).select_related('user')[:10]),
+        lambda: user.is_authenticated and Enrollment.objects.filter(user=user, course=course).exists(),
+        lambda: list(Course.objects.filter(
+            category=course.category,
+            is_published=True
+        ).exclude(id=course.id).annotate(
+            student_count=Count('enrollments')
+        )[:4]),
+    )
     
     context = {
         'course': course,
@@ -142,7 +140,7 @@ def course_detail(request, slug):
         'is_enrolled': is_enrolled,
         'related_courses': related_courses,
     }
-    return render(request, 'courses/course_detail.html', context)
+    return await arender(request, 'courses/course_detail.html', context)
 
 
 @login_required
@@ -229,6 +227,11 @@ def update_lecture_progress(request):
             ).count()
             
             enrollment.progress_percentage = (completed_lectures / total_lectures) * 100
+            if completed_lectures >= total_lectures and not enrollment.is_completed:
+                # Issues the certificate (see enrollment.signals)
+                from django.utils import timezone
+                enrollment.is_completed = True
+                enrollment.completion_date = timezone.now()
             enrollment.save()
             
             return JsonResponse({
@@ -312,9 +315,9 @@ def manage_lectures(request, slug, section_id):
     return render(request, 'instructor/manage_lectures.html', context)
 
 
-def request_callback(request, slug):
+async def request_callback(request, slug):
     """Handle callback request from course detail page"""
-    course = get_object_or_404(Course, slug=slug, is_published=True)
+    course = await sync_to_async(get_object_or_404)(Course, slug=slug, is_published=True)
     
     if request.method == 'POST':
         name = request.POST.get('callback_name', '').strip()
@@ -337,7 +340,7 @@ def request_callback(request, slug):
         
         try:
             # Create callback request and save to database
-            callback = CallbackRequest.objects.create(
+            callback = await CallbackRequest.objects.acreate(
                 course=course,
                 name=name,
                 email=email,
@@ -355,8 +358,8 @@ def request_callback(request, slug):
             print(f"Created At: {callback.created_at}")
             print(f"{'='*60}\n")
             
-            # Send admin notification email
-            send_callback_request_email(callback)
+            # Send admin notification email without blocking the event loop
+            await run_blocking(send_callback_request_email, callback)
             
             messages.success(request, 'Thank you! We will call you within 24 hours.')
             return redirect('courses:course_detail', slug=slug)
@@ -1,33 +1,61 @@
-from django.contrib import admin
-from .models import Enrollment, LectureProgress, Wishlist, Certificate, DailyClass
+from django import forms
+from django.contrib import admin, messages
+
+from config.changelists import FastChangeListMixin
+from config.exports import ExportMixin
+from .models import (
+    Enrollment, LectureProgress, Wishlist, Certificate, DailyClass, ClassSchedule, ClassScheduleException,
+)
+from .schedules import sync_schedule
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(FastChangeListMixin, ExportMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'enrolled_at', 'progress_percentage', 'is_completed']
     list_filter = ['is_completed', 'enrolled_at']
+    list_select_related = ['user', 'course']
     search_fields = ['user__username', 'course__title']
+    autocomplete_fields = ['user', 'course']
+    export_date_field = 'enrolled_at'
+    export_status_field = 'is_completed'
+    export_columns = [
+        ('Username', 'user__username'),
+        ('Email', 'user__email'),
+        ('Course', 'course__title'),
+        ('Enrolled at', 'enrolled_at'),
+        ('Progress (%)', 'progress_percentage'),
+        ('Completed', 'is_completed'),
+        ('Completion date', 'completion_date'),
+    ]
 
 @admin.register(LectureProgress)
-class LectureProgressAdmin(admin.ModelAdmin):
+class LectureProgressAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['enrollment', 'lecture', 'is_completed']
     list_filter = ['is_completed']
+    list_select_related = ['enrollment__user', 'enrollment__course', 'lecture__section__course']
+    raw_id_fields = ['enrollment', 'lecture']
 
 @admin.register(Wishlist)
-class WishlistAdmin(admin.ModelAdmin):
+class WishlistAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'added_at']
+    list_select_related = ['user', 'course']
     search_fields = ['user__username', 'course__title']
+    autocomplete_fields = ['user', 'course']
 
 @admin.register(Certificate)
-class CertificateAdmin(admin.ModelAdmin):
+class CertificateAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'certificate_number', 'issued_date']
+    list_select_related = ['user', 'course']
     search_fields = ['user__username', 'course__title', 'certificate_number']
+    autocomplete_fields = ['user', 'course']
 
 @admin.register(DailyClass)
-class DailyClassAdmin(admin.ModelAdmin):
-    list_display = ['date', 'scheduled_time', 'title', 'course', 'is_active', 'created_by', 'created_at']
-    list_filter = ['is_active', 'date', 'course', 'created_by']
+class DailyClassAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ['date', 'scheduled_time', 'title', 'course', 'is_active', 'schedule', 'created_by', 'created_at']
+    list_filter = ['is_active', 'date', 'course', ('created_by', admin.RelatedOnlyFieldListFilter)]
+    list_select_related = ['course', 'schedule', 'created_by']
     search_fields = ['title', 'description', 'course__title']
-    readonly_fields = ['created_by', 'created_at', 'updated_at']
+    autocomplete_fields = ['course']
+    readonly_fields = ['created_by', 'schedule', 'edited_by_hand', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Class Information', {
@@ -43,7 +71,7 @@ class DailyClassAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
         ('Metadata', {
-            'fields': ('created_by', 'created_at', 'updated_at'),
+            'fields': ('created_by', 'schedule', 'edited_by_hand', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -52,4 +80,92 @@ class DailyClassAdmin(admin.ModelAdmin):
         """Automatically set created_by to current admin user"""
         if not change:  # Only on creation
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        elif obj.schedule_id and form.has_changed():
+            # Keeps the edit when the schedule is saved again
+            obj.edited_by_hand = True
+        super().save_model(request, obj, form, change)
+
+
+class ClassScheduleForm(forms.ModelForm):
+    weekdays = forms.MultipleChoiceField(
+        choices=ClassSchedule.WEEKDAY_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+        help_text="Weekly schedules only"
+    )
+    
+    class Meta:
+        model = ClassSchedule
+        fields = '__all__'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['weekdays'] = [str(day) for day in self.instance.weekday_numbers()]
+    
+    def clean_weekdays(self):
+        return ','.join(sorted(self.cleaned_data['weekdays']))
+
+
+class ClassScheduleExceptionInline(admin.TabularInline):
+    model = ClassScheduleException
+    extra = 1
+
+
+@admin.register(ClassSchedule)
+class ClassScheduleAdmin(FastChangeListMixin, admin.ModelAdmin):
+    form = ClassScheduleForm
+    list_display = ['title', 'course', 'frequency', 'repeats_on', 'scheduled_time', 'start_date', 'end_date', 'is_active']
+    list_filter = ['is_active', 'frequency', 'course']
+    list_select_related = ['course']
+    search_fields = ['title', 'course__title']
+    autocomplete_fields = ['course']
+    readonly_fields = ['created_by', 'created_at', 'updated_at']
+    inlines = [ClassScheduleExceptionInline]
+    actions = ['sync_selected']
+    
+    fieldsets = (
+        ('Class Information', {
+            'fields': ('title', 'description', 'course', 'meet_link')
+        }),
+        ('Recurrence', {
+            'fields': ('frequency', 'interval', 'weekdays', 'scheduled_time', 'duration_minutes', 'start_date', 'end_date')
+        }),
+        ('Settings', {
+            'fields': ('is_active',)
+        }),
+        ('Metadata', {
+            'fields': ('created_by', 'created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    def repeats_on(self, obj):
+        if obj.frequency == 'daily':
+            return 'Every day' if obj.interval == 1 else f'Every {obj.interval} days'
+        names = dict(ClassSchedule.WEEKDAY_CHOICES)
+        return ', '.join(names[str(day)][:3] for day in obj.weekday_numbers())
+    repeats_on.short_description = 'Repeats'
+    
+    def save_model(self, request, obj, form, change):
+        """Automatically set created_by to current admin user"""
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+    
+    def save_related(self, request, form, formsets, change):
+        # Exceptions are inline, so expand only once they are saved
+        super().save_related(request, form, formsets, change)
+        self.report_sync(request, [sync_schedule(form.instance)])
+    
+    @admin.action(description='Regenerate upcoming classes')
+    def sync_selected(self, request, queryset):
+        self.report_sync(request, [sync_schedule(schedule) for schedule in queryset])
+    
+    def report_sync(self, request, results):
+        created, updated, removed = (sum(column) for column in zip(*results))
+        self.message_user(
+            request,
+            f'Upcoming classes: {created} created, {updated} updated, {removed} cancelled.',
+            messages.SUCCESS
+        )
\ No newline at end of file
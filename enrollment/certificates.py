@@ -0,0 +1,188 @@
+"""
+Certificate PDFs.
+
+Rendering is split so each certificate only pays for what differs:
+
+- ``page_template()`` registers the fonts and builds the static artwork
+  (background image, borders, seal, headings) as a reportlab Drawing, once
+  per process;
+- ``render_certificate(data)`` draws that template and the student's name,
+  course, date and number onto a fresh canvas.
+
+PDFs are rendered in the background when an enrollment is completed (see
+``enrollment.signals``) or for a whole cohort by ``manage.py
+render_certificates``, and stored on ``Certificate.certificate_file`` under a
+name containing a hash of their content. Downloads only read the stored file.
+"""
+
+import functools
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import dateformat
+from reportlab.graphics import renderPDF
+from reportlab.graphics.shapes import Circle, Drawing, Image, Line, Rect, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .models import Certificate
+from .verification import new_certificate_number
+
+PAGE_SIZE = landscape(A4)
+
+# Bitstream Vera ships with reportlab and, unlike the standard PDF fonts,
+# covers names outside Latin-1
+FONTS = {
+    'CertificateSans': 'Vera.ttf',
+    'CertificateSans-Bold': 'VeraBd.ttf',
+    'CertificateSans-Italic': 'VeraIt.ttf',
+}
+
+PRIMARY = colors.HexColor('#1e3a8a')
+ACCENT = colors.HexColor('#c9a227')
+MUTED = colors.HexColor('#4b5563')
+
+NAME_MAX_WIDTH = PAGE_SIZE[0] - 200
+
+# Attempts at a fresh random number before giving up
+ISSUE_ATTEMPTS = 5
+
+
+def issue_certificate(user_id, course_id):
+    """The user's certificate for the course, issued now if needed; returns (certificate, created)"""
+    for attempt in range(ISSUE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Certificate.objects.get_or_create(
+                    user_id=user_id,
+                    course_id=course_id,
+                    defaults={'certificate_number': new_certificate_number()},
+                )
+        except IntegrityError:
+            # Another certificate already has this number
+            if attempt == ISSUE_ATTEMPTS - 1:
+                raise
+
+
+@functools.lru_cache(maxsize=None)
+def page_template():
+    """The artwork every certificate shares; built once per process"""
+    for name, filename in FONTS.items():
+        pdfmetrics.registerFont(TTFont(name, filename))
+
+    width, height = PAGE_SIZE
+    drawing = Drawing(width, height)
+    background = getattr(settings, 'CERTIFICATE_BACKGROUND', '')
+    if background:
+        drawing.add(Image(0, 0, width, height, background))
+    drawing.add(Rect(20, 20, width - 40, height - 40, strokeColor=PRIMARY, strokeWidth=6, fillColor=None))
+    drawing.add(Rect(32, 32, width - 64, height - 64, strokeColor=ACCENT, strokeWidth=1.5, fillColor=None))
+    drawing.add(String(width / 2, height - 110, 'CERTIFICATE OF COMPLETION', fontName='CertificateSans-Bold',
+                       fontSize=30, fillColor=PRIMARY, textAnchor='middle'))
+    drawing.add(Line(width / 2 - 120, height - 128, width / 2 + 120, height - 128, strokeColor=ACCENT, strokeWidth=2))
+    drawing.add(String(width / 2, height - 175, 'This is to certify that', fontName='CertificateSans-Italic',
+                       fontSize=14, fillColor=MUTED, textAnchor='middle'))
+    drawing.add(String(width / 2, height - 285, 'has successfully completed the course', fontName='CertificateSans-Italic',
+                       fontSize=14, fillColor=MUTED, textAnchor='middle'))
+    drawing.add(Line(110, 120, 290, 120, strokeColor=MUTED, strokeWidth=0.75))
+    drawing.add(Line(width - 290, 120, width - 110, 120, strokeColor=MUTED, strokeWidth=0.75))
+    drawing.add(String(200, 104, 'Date of issue', fontName='CertificateSans', fontSize=10,
+                       fillColor=MUTED, textAnchor='middle'))
+    drawing.add(String(width - 200, 104, 'Instructor', fontName='CertificateSans', fontSize=10,
+                       fillColor=MUTED, textAnchor='middle'))
+    drawing.add(Circle(width / 2, 120, 42, strokeColor=ACCENT, strokeWidth=3, fillColor=colors.HexColor('#fdf6e3')))
+    drawing.add(String(width / 2, 115, 'CodeLearn', fontName='CertificateSans-Bold', fontSize=13,
+                       fillColor=PRIMARY, textAnchor='middle'))
+    return drawing
+
+
+def certificate_data(certificate):
+    """Everything a render needs, as plain values a worker process can receive"""
+    instructor = certificate.course.instructor
+    return {
+        'name': certificate.user.get_full_name() or certificate.user.username,
+        'course': certificate.course.title,
+        'instructor': instructor.get_full_name() or instructor.username,
+        'number': certificate.certificate_number,
+        'issued': dateformat.format(certificate.issued_date, 'F j, Y'),
+    }
+
+
+def _draw_fitted(pdf, text, y, font, size, max_width):
+    """Centre ``text`` at ``y``, shrinking the font until it fits"""
+    while size > 10 and pdfmetrics.stringWidth(text, font, size) > max_width:
+        size -= 1
+    pdf.setFont(font, size)
+    pdf.drawCentredString(PAGE_SIZE[0] / 2, y, text)
+
+
+def render_certificate(data):
+    """The certificate PDF as bytes; the same data always renders the same bytes"""
+    width, height = PAGE_SIZE
+    buffer = BytesIO()
+    # invariant drops the creation date and random document id
+    pdf = canvas.Canvas(buffer, pagesize=PAGE_SIZE, invariant=1)
+    pdf.setTitle(f"{data['course']} - Certificate of Completion")
+    pdf.setAuthor('CodeLearn')
+
+    renderPDF.draw(page_template(), pdf, 0, 0)
+
+    pdf.setFillColor(PRIMARY)
+    _draw_fitted(pdf, data['name'], height - 240, 'CertificateSans-Bold', 36, NAME_MAX_WIDTH)
+    pdf.setFillColor(colors.black)
+    _draw_fitted(pdf, data['course'], height - 330, 'CertificateSans-Bold', 22, NAME_MAX_WIDTH)
+
+    pdf.setFillColor(MUTED)
+    pdf.setFont('CertificateSans', 12)
+    pdf.drawCentredString(200, 126, data['issued'])
+    pdf.drawCentredString(width - 200, 126, data['instructor'])
+    pdf.setFont('CertificateSans', 9)
+    pdf.drawCentredString(width / 2, 48, f"Certificate no. {data['number']}")
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def pdf_name(number, content):
+    """Storage name for a certificate PDF; changes whenever its content does"""
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join('certificates', f'{number}-{digest}.pdf')
+
+
+def write_pdf(data, storage=None):
+    """Render and store a certificate, returning its storage name; never touches the database"""
+    storage = storage or Certificate._meta.get_field('certificate_file').storage
+    content = render_certificate(data)
+    name = pdf_name(data['number'], content)
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(content))
+    return name
+
+
+def attach_pdf(certificate, name):
+    """Point ``certificate`` at the stored PDF ``name`` and delete the one it replaces"""
+    previous = certificate.certificate_file.name
+    if previous == name:
+        return
+    Certificate.objects.filter(pk=certificate.pk).update(certificate_file=name)
+    certificate.certificate_file.name = name
+    if previous:
+        certificate.certificate_file.storage.delete(previous)
+
+
+def store_certificate(certificate_id):
+    """Background task: render a certificate's PDF and attach it"""
+    certificate = Certificate.objects.select_related('user', 'course__instructor').get(pk=certificate_id)
+    attach_pdf(certificate, write_pdf(certificate_data(certificate)))
+
+
+def file_etag(name):
+    return f'"{hashlib.md5(name.encode()).hexdigest()}"'
@@ -0,0 +1,189 @@
+"""
+Daily class feeds for clients that poll.
+
+- An iCalendar subscription per user, at a URL carrying a signed token, since
+  calendar apps can't log in. The token signs the user's id and their
+  ``calendar_token_version``; resetting the link bumps the version, which
+  revokes every URL handed out before. Versions are cached until a reset.
+- A JSON list of the classes changed since an ``updated_at`` cursor, polled
+  by the daily classes page. ``updated_at`` is stamped when a class is saved,
+  not when the save commits, so a slow transaction can commit a class older
+  than a cursor already handed out. Every poll therefore sends the last
+  ``CHANGES_OVERLAP`` before the cursor again, and the page ignores versions
+  it has already seen.
+
+Both answer conditional GETs. Their ETag covers the user's enrolled courses
+and the count and latest ``updated_at`` of every class in the window, active
+or not. Editing, hiding or deleting a class changes the ETag, and an
+unchanged poll costs one aggregate query and a 304.
+
+The JSON list has no record of hard deletes. Uncheck ``is_active`` to take a
+class down and polling clients will see that change.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from users.models import User
+from .models import DailyClass
+
+FEED_PAST_DAYS = 14
+FEED_UPCOMING_DAYS = 60
+
+TOKEN_SALT = 'enrollment.daily-class-feed'
+
+# Far longer than any transaction that saves classes
+CHANGES_OVERLAP = timedelta(minutes=2)
+
+TOKEN_VERSION_CACHE_SECONDS = 60 * 60
+
+ICS_LINE_LIMIT = 75
+
+
+def feed_token(user):
+    return signing.dumps([user.pk, user.calendar_token_version], salt=TOKEN_SALT)
+
+
+def _token_version_key(user_id):
+    return f'enrollment:calendar_token_version:{user_id}'
+
+
+def token_version(user_id):
+    """The user's current ``calendar_token_version``, cached; None if there is no such user"""
+    key = _token_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('calendar_token_version', flat=True).first()
+        # -1 caches a missing user
+        version = -1 if version is None else version
+        cache.set(key, version, TOKEN_VERSION_CACHE_SECONDS)
+    return None if version < 0 else version
+
+
+def reset_token(user_id):
+    """Revoke the user's calendar feed URLs"""
+    User.objects.filter(pk=user_id).update(calendar_token_version=F('calendar_token_version') + 1)
+    key = _token_version_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def user_id_for_token(token):
+    """The user id signed into ``token``, or None if it was tampered with or revoked"""
+    try:
+        value = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    # Tokens issued before versioning signed the bare id; they are version 0
+    user_id, version = (value, 0) if isinstance(value, int) else value
+    if token_version(user_id) != version:
+        return None
+    return user_id
+
+
+def changed_since(classes, since):
+    """Classes saved after ``since``, and again those of the ``CHANGES_OVERLAP`` before it"""
+    return classes.filter(updated_at__gt=since - CHANGES_OVERLAP)
+
+
+def window_classes(course_ids, start, end):
+    """Every class, active or not, in [start, end] for all students or for ``course_ids``"""
+    return DailyClass.objects.filter(
+        Q(course=None) | Q(course_id__in=course_ids),
+        date__range=(start, end),
+    )
+
+
+def feed_state(classes, *key):
+    """``(etag, last_modified)`` for a window of classes; last_modified is None when it's empty"""
+    state = classes.aggregate(count=Count('id'), latest=Max('updated_at'))
+    latest = state['latest']
+    fingerprint = f"{key}:{state['count']}:{latest.isoformat() if latest else ''}"
+    return f'"{hashlib.md5(fingerprint.encode()).hexdigest()}"', latest
+
+
+def starts_at(daily_class):
+    """Start of the class as an aware datetime; scheduled times are in TIME_ZONE"""
+    return timezone.make_aware(datetime.combine(daily_class.date, daily_class.scheduled_time))
+
+
+def class_as_dict(daily_class):
+    return {
+        'id': daily_class.id,
+        'title': daily_class.title,
+        'description': daily_class.description,
+        'course': daily_class.course.title if daily_class.course else None,
+        'starts_at': starts_at(daily_class).isoformat(),
+        'duration_minutes': daily_class.duration_minutes,
+        'meet_link': daily_class.meet_link,
+        'is_active': daily_class.is_active,
+        'updated_at': daily_class.updated_at.isoformat(),
+    }
+
+
+def _ics_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ics_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fold(line):
+    """Split a content line into 75-octet pieces, as RFC 5545 requires"""
+    encoded = line.encode()
+    if len(encoded) <= ICS_LINE_LIMIT:
+        return line
+
+    pieces = []
+    limit = ICS_LINE_LIMIT
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = ICS_LINE_LIMIT - 1  # continuation lines start with a space
+    return '\r\n '.join(pieces)
+
+
+def render_ics(classes, name='Daily Classes'):
+    """An iCalendar document with one event per class"""
+    now = _ics_time(timezone.now())
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//CodeLearn//Daily Classes//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ics_text(name)}',
+    ]
+    for daily_class in classes:
+        start = starts_at(daily_class)
+        description = f'{daily_class.description}\n\nJoin: {daily_class.meet_link}'
+        if daily_class.course:
+            description = f'{daily_class.course.title}\n\n{description}'
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:dailyclass-{daily_class.id}@codelearn',
+            f'DTSTAMP:{now}',
+            f'LAST-MODIFIED:{_ics_time(daily_class.updated_at)}',
+            f'DTSTART:{_ics_time(start)}',
+            f'DTEND:{_ics_time(start + timedelta(minutes=daily_class.duration_minutes))}',
+            f'SUMMARY:{_ics_text(daily_class.title)}',
+            f'DESCRIPTION:{_ics_text(description)}',
+            f'LOCATION:{_ics_text(daily_class.meet_link)}',
+            f'URL:{daily_class.meet_link}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(line) + '\r\n' for line in lines)
@@ -0,0 +1,76 @@
+# enrollment/management/commands/render_certificates.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from enrollment.certificates import attach_pdf, certificate_data, write_pdf
+from enrollment.models import Certificate
+
+
+def _render(certificate_id, data):
+    """Process pool worker - only touches storage, never the database"""
+    try:
+        return certificate_id, write_pdf(data), None
+    except (OSError, ValueError) as e:
+        return certificate_id, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Renders certificate PDFs for a course cohort (or every course) in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            help='Slug of the course whose certificates to render (defaults to all courses)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes (defaults to CPU count)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render certificates that already have a PDF'
+        )
+
+    def handle(self, *args, **options):
+        certificates = Certificate.objects.select_related('user', 'course__instructor')
+        if options['course']:
+            certificates = certificates.filter(course__slug=options['course'])
+            if not certificates.exists():
+                raise CommandError(f"No certificates for course '{options['course']}'")
+        if not options['force']:
+            certificates = certificates.filter(Q(certificate_file='') | Q(certificate_file__isnull=True))
+
+        pending = {certificate.id: certificate for certificate in certificates}
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All certificates are rendered.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Rendering {len(pending)} certificates...'))
+
+        # Forked workers must not inherit open DB connections
+        connections.close_all()
+
+        rendered = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [
+                executor.submit(_render, certificate_id, certificate_data(certificate))
+                for certificate_id, certificate in pending.items()
+            ]
+            for future in as_completed(futures):
+                certificate_id, name, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'  ✗ Certificate {certificate_id}: {error}'))
+                    continue
+
+                attach_pdf(pending[certificate_id], name)
+                rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} certificates ({failed} failed).'))
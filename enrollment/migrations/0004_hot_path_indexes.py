@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollment', '0003_dailyclass'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyclass',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['date', 'scheduled_time'], name='dailyclass_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lectureprogress',
+            index=models.Index(fields=['enrollment', 'is_completed'], name='progress_enrollment_done_idx'),
+        ),
+    ]
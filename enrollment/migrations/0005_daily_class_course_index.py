@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollment', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyclass',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['course', 'date'], name='dailyclass_course_date_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('enrollment', '0005_daily_class_course_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(help_text='Title given to every class', max_length=200)),
+                ('description', models.TextField(help_text='Agenda shown on every class')),
+                ('meet_link', models.URLField(help_text='Google Meet link used by every class')),
+                ('scheduled_time', models.TimeField(help_text='Start time of every class')),
+                ('duration_minutes', models.PositiveIntegerField(default=60)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly')], default='weekly', max_length=10)),
+                ('interval', models.PositiveIntegerField(default=1, help_text='Repeat every N days or weeks')),
+                ('weekdays', models.CharField(blank=True, help_text='Comma-separated weekdays (0 = Monday), weekly schedules only', max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('is_active', models.BooleanField(default=True, help_text='Uncheck to hide every upcoming class')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, help_text='Leave blank for classes available to all enrolled students', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='class_schedules', to='courses.course')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='class_schedules', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Class Schedule',
+                'verbose_name_plural': 'Class Schedules',
+                'db_table': 'class_schedules',
+                'ordering': ['-start_date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dailyclass',
+            name='schedule',
+            field=models.ForeignKey(blank=True, help_text='Recurring schedule this class was generated from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='classes', to='enrollment.classschedule'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyclass',
+            unique_together={('schedule', 'date')},
+        ),
+        migrations.CreateModel(
+            name='ClassScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='enrollment.classschedule')),
+            ],
+            options={
+                'db_table': 'class_schedule_exceptions',
+                'unique_together': {('schedule', 'date')},
+            },
+        ),
+    ]
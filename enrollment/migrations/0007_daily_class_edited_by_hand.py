@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollment', '0006_class_schedules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyclass',
+            name='edited_by_hand',
+            field=models.BooleanField(default=False, help_text='Changed in the admin after its schedule generated it; saving the schedule no longer updates it'),
+        ),
+    ]
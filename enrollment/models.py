@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from users.models import User
 from courses.models import Course, Lecture
@@ -33,6 +34,9 @@ class LectureProgress(models.Model):
     class Meta:
         db_table = 'lecture_progress'
         unique_together = ['enrollment', 'lecture']
+        indexes = [
+            models.Index(fields=['enrollment', 'is_completed'], name='progress_enrollment_done_idx'),
+        ]
 
 
 class Wishlist(models.Model):
@@ -81,6 +85,18 @@ class DailyClass(models.Model):
     duration_minutes = models.PositiveIntegerField(default=60, help_text="Expected duration in minutes")
     is_active = models.BooleanField(default=True, help_text="Uncheck to hide this class")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_classes')
+    schedule = models.ForeignKey(
+        'ClassSchedule',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='classes',
+        help_text="Recurring schedule this class was generated from"
+    )
+    edited_by_hand = models.BooleanField(
+        default=False,
+        help_text="Changed in the admin after its schedule generated it; saving the schedule no longer updates it"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -91,5 +107,87 @@ class DailyClass(models.Model):
     class Meta:
         db_table = 'daily_classes'
         ordering = ['-date', '-scheduled_time']
+        indexes = [
+            models.Index(fields=['date', 'scheduled_time'], condition=models.Q(is_active=True), name='dailyclass_active_date_idx'),
+            models.Index(fields=['course', 'date'], condition=models.Q(is_active=True), name='dailyclass_course_date_idx'),
+        ]
+        unique_together = ['schedule', 'date']
         verbose_name = 'Daily Class'
-        verbose_name_plural = 'Daily Classes'
\ No newline at end of file
+        verbose_name_plural = 'Daily Classes'
+
+
+class ClassSchedule(models.Model):
+    """Recurring daily classes, expanded into DailyClass rows by enrollment.schedules"""
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+    WEEKDAY_CHOICES = [
+        ('0', 'Monday'),
+        ('1', 'Tuesday'),
+        ('2', 'Wednesday'),
+        ('3', 'Thursday'),
+        ('4', 'Friday'),
+        ('5', 'Saturday'),
+        ('6', 'Sunday'),
+    ]
+    # Guards against a typo in the end date generating years of classes
+    MAX_DAYS = 400
+    
+    title = models.CharField(max_length=200, help_text="Title given to every class")
+    description = models.TextField(help_text="Agenda shown on every class")
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='class_schedules',
+        help_text="Leave blank for classes available to all enrolled students"
+    )
+    meet_link = models.URLField(help_text="Google Meet link used by every class")
+    scheduled_time = models.TimeField(help_text="Start time of every class")
+    duration_minutes = models.PositiveIntegerField(default=60)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveIntegerField(default=1, help_text="Repeat every N days or weeks")
+    weekdays = models.CharField(max_length=20, blank=True, help_text="Comma-separated weekdays (0 = Monday), weekly schedules only")
+    start_date = models.DateField()
+    end_date = models.DateField()
+    is_active = models.BooleanField(default=True, help_text="Uncheck to hide every upcoming class")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='class_schedules')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.title} ({self.start_date} to {self.end_date})"
+    
+    def weekday_numbers(self):
+        return sorted({int(day) for day in self.weekdays.split(',') if day.strip()})
+    
+    def clean(self):
+        if self.start_date and self.end_date:
+            if self.end_date < self.start_date:
+                raise ValidationError({'end_date': 'The end date must not be before the start date.'})
+            if (self.end_date - self.start_date).days > self.MAX_DAYS:
+                raise ValidationError({'end_date': f'A schedule can span at most {self.MAX_DAYS} days.'})
+        if self.frequency == 'weekly' and not self.weekday_numbers():
+            raise ValidationError({'weekdays': 'Pick at least one weekday for a weekly schedule.'})
+    
+    class Meta:
+        db_table = 'class_schedules'
+        ordering = ['-start_date']
+        verbose_name = 'Class Schedule'
+        verbose_name_plural = 'Class Schedules'
+
+
+class ClassScheduleException(models.Model):
+    """A date on which a recurring schedule has no class"""
+    schedule = models.ForeignKey(ClassSchedule, on_delete=models.CASCADE, related_name='exceptions')
+    date = models.DateField()
+    reason = models.CharField(max_length=200, blank=True)
+    
+    def __str__(self):
+        return f"{self.schedule.title} - no class on {self.date}"
+    
+    class Meta:
+        db_table = 'class_schedule_exceptions'
+        unique_together = ['schedule', 'date']
@@ -0,0 +1,95 @@
+"""
+Recurring class schedules.
+
+A ClassSchedule is a daily or weekly rule between two dates, minus its
+exception dates. ``sync_schedule`` expands it into DailyClass rows so the
+timeline, feeds and admin keep reading one plain, indexed table:
+
+- missing future occurrences are inserted with one ``bulk_create``,
+- future occurrences whose fields drifted from the schedule are updated in
+  one UPDATE,
+- future occurrences that left the rule (exceptions, a shorter term, other
+  weekdays) are deactivated rather than deleted, so polling clients see the
+  change.
+
+Classes that already took place are never touched, and neither are
+occurrences changed by hand in the admin (``edited_by_hand``): a class moved
+or cancelled for one day stays that way when its schedule is saved again.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DailyClass
+from .timeline import invalidate_general_classes
+
+
+def occurrence_dates(schedule):
+    """Every date the schedule's rule produces, exceptions removed, in order"""
+    skipped = set(schedule.exceptions.values_list('date', flat=True)) if schedule.pk else set()
+    interval = max(schedule.interval, 1)
+    weekdays = schedule.weekday_numbers()
+    week_start = schedule.start_date - timedelta(days=schedule.start_date.weekday())
+
+    dates = []
+    day = schedule.start_date
+    while day <= schedule.end_date:
+        if schedule.frequency == 'daily':
+            wanted = (day - schedule.start_date).days % interval == 0
+        else:
+            wanted = day.weekday() in weekdays and ((day - week_start).days // 7) % interval == 0
+        if wanted and day not in skipped:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def class_fields(schedule):
+    """The DailyClass fields every occurrence copies from its schedule"""
+    return {
+        'title': schedule.title,
+        'description': schedule.description,
+        'course_id': schedule.course_id,
+        'meet_link': schedule.meet_link,
+        'scheduled_time': schedule.scheduled_time,
+        'duration_minutes': schedule.duration_minutes,
+        'is_active': schedule.is_active,
+    }
+
+
+@transaction.atomic
+def sync_schedule(schedule, today=None):
+    """Make the schedule's upcoming classes match its rule; returns (created, updated, removed)"""
+    today = today or timezone.now().date()
+    now = timezone.now()
+    fields = class_fields(schedule)
+    wanted = {day for day in occurrence_dates(schedule) if day >= today}
+    upcoming = DailyClass.objects.filter(schedule=schedule, date__gte=today)
+    generated = upcoming.filter(edited_by_hand=False)
+
+    removed = generated.exclude(date__in=wanted).filter(is_active=True).update(is_active=False, updated_at=now)
+    # exclude(**fields) keeps rows where any field differs, so unchanged classes keep their updated_at
+    updated = generated.filter(date__in=wanted).exclude(**fields).update(**fields, updated_at=now)
+
+    existing = set(upcoming.values_list('date', flat=True))
+    attempted = DailyClass.objects.bulk_create(
+        [
+            DailyClass(schedule=schedule, date=day, created_by_id=schedule.created_by_id, **fields)
+            for day in sorted(wanted - existing)
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    # A class inserted concurrently is skipped without an error, so count only
+    # the rows that carry the created_at this insert stamped on them
+    stamped = {daily_class.date: daily_class.created_at for daily_class in attempted}
+    created = sum(
+        stamped[day] == created_at
+        for day, created_at in upcoming.filter(date__in=stamped).values_list('date', 'created_at')
+    ) if stamped else 0
+
+    if created or updated or removed:
+        invalidate_general_classes()
+    return created, updated, removed
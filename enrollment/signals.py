@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from config.background import enqueue
+from config.metrics import record_enrollment_created
+from . import verification
+from .certificates import issue_certificate, store_certificate
+from .models import Certificate, DailyClass, Enrollment
+from .timeline import invalidate_enrolled_course_ids, invalidate_general_classes
+
+
+@receiver(post_save, sender=Enrollment)
+def count_created_enrollment(sender, instance, created, **kwargs):
+    """Feed the enrollments_created metric"""
+    if created:
+        record_enrollment_created()
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def forget_enrolled_courses(sender, instance, created=True, **kwargs):
+    """Drop the user's cached enrolled course ids when an enrollment is created or deleted"""
+    if created:
+        invalidate_enrolled_course_ids(instance.user_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def issue_completion_certificate(sender, instance, **kwargs):
+    """Issue a certificate for a completed course and render its PDF in the background"""
+    if not instance.is_completed:
+        return
+    certificate, created = issue_certificate(instance.user_id, instance.course_id)
+    if created:
+        enqueue(store_certificate, certificate.id)
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def forget_verification(sender, instance, **kwargs):
+    """Drop the cached verification result, including a cached miss for a new number"""
+    verification.forget(instance.certificate_number)
+
+
+@receiver(post_save, sender=DailyClass)
+@receiver(post_delete, sender=DailyClass)
+def forget_general_classes(sender, instance, **kwargs):
+    """A class may have moved into or out of the all-students list, or changed day"""
+    invalidate_general_classes()
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Lecture, Section
+from users.models import User
+from . import certificates, feeds, verification
+from .models import Certificate, ClassSchedule, DailyClass, Enrollment
+from .schedules import occurrence_dates, sync_schedule
+from .timeline import build_timeline, enrolled_course_ids_key
+
+TODAY = date(2026, 3, 10)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='student', password='x')
+        self.enrolled = self.create_course('enrolled')
+        self.other = self.create_course('other')
+        Enrollment.objects.create(user=self.student, course=self.enrolled)
+
+    def create_course(self, slug):
+        return Course.objects.create(
+            title=slug, slug=slug, instructor=self.student, short_description='-', detailed_description='-',
+            price=0, requirements='-', what_you_will_learn='-',
+        )
+
+    def create_class(self, title, offset, course=None, at=time(10), **kwargs):
+        return DailyClass.objects.create(
+            title=title, date=TODAY + timedelta(days=offset), course=course, scheduled_time=at,
+            description='-', meet_link='https://meet.google.com/abc-defg-hij', **kwargs,
+        )
+
+    def titles(self, timeline):
+        return {key: [c.title for c in timeline[key]] for key in ('past_classes', 'todays_classes', 'upcoming_classes')}
+
+    def test_window_is_partitioned(self):
+        self.create_class('general today late', 0, at=time(18))
+        self.create_class('course today', 0, course=self.enrolled)
+        self.create_class('course tomorrow', 1, course=self.enrolled)
+        self.create_class('general last week', -2)
+        self.create_class('general yesterday', -1)
+        self.create_class('other course', 0, course=self.other)
+        self.create_class('too old', -4)
+        self.create_class('too far', 8, course=self.enrolled)
+        self.create_class('hidden', 0, is_active=False)
+
+        timeline = build_timeline(self.student, today=TODAY)
+
+        self.assertEqual(self.titles(timeline), {
+            'past_classes': ['general yesterday', 'general last week'],
+            'todays_classes': ['course today', 'general today late'],
+            'upcoming_classes': ['course tomorrow'],
+        })
+
+    def test_warm_cache_needs_one_query(self):
+        self.create_class('general', 0)
+        build_timeline(self.student, today=TODAY)
+
+        with self.assertNumQueries(1):
+            timeline = build_timeline(self.student, today=TODAY)
+        self.assertEqual(timeline['todays_classes'][0].title, 'general')
+
+    def test_new_enrollment_is_visible(self):
+        self.create_class('other course', 0, course=self.other)
+        build_timeline(self.student, today=TODAY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.student, course=self.other)
+            # Dropped only on commit, so another request can't refill it from the old state
+            self.assertIsNotNone(cache.get(enrolled_course_ids_key(self.student.pk)))
+
+        self.assertIsNone(cache.get(enrolled_course_ids_key(self.student.pk)))
+        self.assertEqual(self.titles(build_timeline(self.student, today=TODAY))['todays_classes'], ['other course'])
+
+    def test_changed_general_class_is_visible(self):
+        general = self.create_class('general', 0)
+        build_timeline(self.student, today=TODAY)
+
+        general.title = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            general.save()
+
+        self.assertEqual(self.titles(build_timeline(self.student, today=TODAY))['todays_classes'], ['renamed'])
+
+    def test_no_enrollments(self):
+        self.assertIsNone(build_timeline(User.objects.create_user(username='new', password='x')))
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='student', password='x')
+        self.course = Course.objects.create(
+            title='Django', slug='django', instructor=self.student, short_description='-', detailed_description='-',
+            price=0, requirements='-', what_you_will_learn='-',
+        )
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.daily_class = DailyClass.objects.create(
+            title='Views, templates; and forms', date=timezone.now().date(), course=self.course,
+            scheduled_time=time(10), description='Agenda ' * 30, meet_link='https://meet.google.com/abc-defg-hij',
+        )
+        self.calendar_url = reverse('enrollment:daily_classes_calendar', args=[feeds.feed_token(self.student)])
+
+    def test_calendar(self):
+        response = self.client.get(self.calendar_url)
+
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('SUMMARY:Views\\, templates\\; and forms\r\n', body)
+        self.assertIn(f'UID:dailyclass-{self.daily_class.id}@codelearn', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+    def test_calendar_conditional_get(self):
+        etag = self.client.get(self.calendar_url)['ETag']
+
+        self.assertEqual(self.client.get(self.calendar_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.daily_class.is_active = False
+        self.daily_class.save()
+        response = self.client.get(self.calendar_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'BEGIN:VEVENT', response.content)
+
+    def test_calendar_rejects_forged_token(self):
+        self.assertEqual(self.client.get(self.calendar_url.replace('.ics', 'x.ics')).status_code, 404)
+
+    def test_reset_link_revokes_the_old_token(self):
+        self.client.force_login(self.student)
+        legacy_url = reverse('enrollment:daily_classes_calendar', args=[signing.dumps(self.student.pk, salt=feeds.TOKEN_SALT)])
+        self.assertEqual(self.client.get(legacy_url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('enrollment:reset_calendar_link'))
+
+        self.assertRedirects(response, reverse('enrollment:daily_classes'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(self.calendar_url).status_code, 404)
+        self.assertEqual(self.client.get(legacy_url).status_code, 404)
+        self.student.refresh_from_db()
+        new_url = reverse('enrollment:daily_classes_calendar', args=[feeds.feed_token(self.student)])
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+
+    def test_changes_since_cursor(self):
+        self.client.force_login(self.student)
+        url = reverse('enrollment:daily_class_changes')
+
+        first = self.client.get(url).json()
+        self.assertEqual([c['id'] for c in first['classes']], [self.daily_class.id])
+
+        # Recent changes are sent again, with the version the page has already seen
+        response = self.client.get(url, {'since': first['cursor']})
+        self.assertEqual(
+            [(c['id'], c['updated_at']) for c in response.json()['classes']],
+            [(c['id'], c['updated_at']) for c in first['classes']],
+        )
+        self.assertEqual(self.client.get(url, {'since': first['cursor']}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.daily_class.meet_link = 'https://meet.google.com/new-link-now'
+        self.daily_class.save()
+        changed = self.client.get(url, {'since': first['cursor']}, HTTP_IF_NONE_MATCH=response['ETag']).json()
+        self.assertEqual([c['meet_link'] for c in changed['classes']], ['https://meet.google.com/new-link-now'])
+        self.assertGreater(changed['cursor'], first['cursor'])
+
+    def test_late_commit_before_the_cursor_is_sent(self):
+        self.client.force_login(self.student)
+        url = reverse('enrollment:daily_class_changes')
+        cursor = timezone.now()
+        # Saved before the cursor was handed out, committed after
+        DailyClass.objects.filter(pk=self.daily_class.pk).update(title='Late', updated_at=cursor - timedelta(seconds=5))
+
+        changed = self.client.get(url, {'since': cursor.isoformat()}).json()
+
+        self.assertEqual([c['title'] for c in changed['classes']], ['Late'])
+
+    def test_page_lists_the_changes_it_already_shows(self):
+        self.client.force_login(self.student)
+
+        response = self.client.get(reverse('enrollment:daily_classes'))
+
+        self.assertEqual(response.context['changes_seen'], {
+            str(self.daily_class.id): self.daily_class.updated_at.isoformat(),
+        })
+
+    def test_changes_rejects_bad_cursor(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('enrollment:daily_class_changes'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ScheduleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+
+    def create_schedule(self, start=TODAY, days=13, **kwargs):
+        # TODAY is a Tuesday
+        fields = {
+            'title': 'Standup', 'description': '-', 'meet_link': 'https://meet.google.com/abc-defg-hij',
+            'scheduled_time': time(10), 'frequency': 'weekly', 'weekdays': '0,2',
+            'start_date': start, 'end_date': start + timedelta(days=days), 'created_by': self.admin_user,
+            **kwargs,
+        }
+        return ClassSchedule.objects.create(**fields)
+
+    def dates(self, schedule):
+        return [d.day for d in schedule.classes.filter(is_active=True).order_by('date').values_list('date', flat=True)]
+
+    def test_weekly_rule_with_exceptions_and_interval(self):
+        schedule = self.create_schedule()
+        schedule.exceptions.create(date=date(2026, 3, 18), reason='Holiday')
+        fortnightly = self.create_schedule(title='Review', interval=2)
+
+        self.assertEqual([d.day for d in occurrence_dates(schedule)], [11, 16, 23])
+        self.assertEqual([d.day for d in occurrence_dates(fortnightly)], [11, 23])
+
+    def test_sync_creates_classes_once(self):
+        schedule = self.create_schedule()
+
+        self.assertEqual(sync_schedule(schedule, today=TODAY), (4, 0, 0))
+        self.assertEqual(sync_schedule(schedule, today=TODAY), (0, 0, 0))
+        self.assertEqual(self.dates(schedule), [11, 16, 18, 23])
+        self.assertEqual(schedule.classes.first().created_by, self.admin_user)
+
+    def test_edits_only_touch_upcoming_classes(self):
+        schedule = self.create_schedule(start=TODAY - timedelta(days=7), days=20)
+        sync_schedule(schedule, today=TODAY - timedelta(days=7))
+
+        schedule.scheduled_time = time(18)
+        schedule.weekdays = '0'
+        schedule.save()
+        created, updated, removed = sync_schedule(schedule, today=TODAY)
+
+        self.assertEqual((created, updated, removed), (0, 2, 2))
+        self.assertEqual(self.dates(schedule), [4, 9, 16, 23])
+        times = dict(schedule.classes.values_list('date__day', 'scheduled_time'))
+        self.assertEqual(times[4], time(10))
+        self.assertEqual(times[16], time(18))
+
+    def test_classes_edited_in_the_admin_keep_their_changes(self):
+        schedule = self.create_schedule()
+        sync_schedule(schedule, today=TODAY)
+        moved = schedule.classes.get(date=date(2026, 3, 16))
+        self.client.force_login(self.admin_user)
+
+        response = self.client.post(f'/admin/enrollment/dailyclass/{moved.pk}/change/', {
+            'title': 'Standup', 'description': '-', 'date': '2026-03-16', 'scheduled_time': '15:00',
+            'duration_minutes': 60, 'meet_link': 'https://meet.google.com/abc-defg-hij',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        schedule.title = 'Daily standup'
+        schedule.save()
+        self.assertEqual(sync_schedule(schedule, today=TODAY), (0, 3, 0))
+        moved.refresh_from_db()
+        self.assertTrue(moved.edited_by_hand)
+        self.assertEqual((moved.title, moved.scheduled_time, moved.is_active), ('Standup', time(15), False))
+
+    def test_validation(self):
+        with self.assertRaises(ValidationError):
+            self.create_schedule(weekdays='').full_clean()
+        with self.assertRaises(ValidationError):
+            self.create_schedule(days=ClassSchedule.MAX_DAYS + 1).full_clean()
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_schedules_a_term_in_one_save(self):
+        self.client.force_login(self.admin_user)
+        start = timezone.now().date()
+        skipped = start + timedelta(days=7)
+
+        response = self.client.post('/admin/enrollment/classschedule/add/', {
+            'title': 'Evening class', 'description': '-', 'meet_link': 'https://meet.google.com/abc-defg-hij',
+            'scheduled_time': '18:00', 'duration_minutes': 60, 'frequency': 'daily', 'interval': 1,
+            'start_date': start, 'end_date': start + timedelta(days=89), 'is_active': 'on',
+            'exceptions-TOTAL_FORMS': 1, 'exceptions-INITIAL_FORMS': 0,
+            'exceptions-0-date': skipped, 'exceptions-0-reason': 'Holiday',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        schedule = ClassSchedule.objects.get()
+        self.assertEqual(schedule.classes.count(), 89)
+        self.assertFalse(schedule.classes.filter(date=skipped).exists())
+
+
+class CertificateTestMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.student = User.objects.create_user(username='student', password='x', first_name='Zoë', last_name='Ångström')
+        self.course = Course.objects.create(
+            title='Django', slug='django', instructor=self.student, short_description='-', detailed_description='-',
+            price=0, requirements='-', what_you_will_learn='-',
+        )
+        self.enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+
+
+class CertificateTests(CertificateTestMixin, TestCase):
+    def test_completing_the_course_issues_and_renders_a_certificate(self):
+        section = Section.objects.create(course=self.course, title='Intro')
+        lecture = Lecture.objects.create(section=section, title='Welcome', video_url='https://example.com/v')
+        self.client.force_login(self.student)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('courses:update_lecture_progress'), {'lecture_id': lecture.id, 'is_completed': 'true'})
+
+        certificate = Certificate.objects.get(user=self.student, course=self.course)
+        self.assertTrue(certificate.certificate_file.name.startswith(f'certificates/{certificate.certificate_number}-'))
+        with certificate.certificate_file.open('rb') as pdf:
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+    def test_rendering_is_deterministic(self):
+        certificate = Certificate.objects.create(user=self.student, course=self.course, certificate_number='CERT-1')
+        data = certificates.certificate_data(certificate)
+
+        self.assertEqual(data['name'], 'Zoë Ångström')
+        self.assertEqual(certificates.render_certificate(data), certificates.render_certificate(data))
+
+    def test_download_serves_the_stored_file(self):
+        certificate = Certificate.objects.create(user=self.student, course=self.course, certificate_number='CERT-1')
+        url = reverse('enrollment:download_certificate', args=[certificate.id])
+        self.client.force_login(self.student)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url)
+        self.assertRedirects(response, reverse('enrollment:view_certificate', args=[certificate.id]))
+
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('certificate-CERT-1.pdf', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class RenderCertificatesCommandTests(CertificateTestMixin, TransactionTestCase):
+    # The command closes DB connections before forking its workers
+    def test_renders_a_cohort(self):
+        Certificate.objects.create(user=self.student, course=self.course, certificate_number='CERT-1')
+
+        call_command('render_certificates', course='django', workers=1, stdout=StringIO())
+
+        certificate = Certificate.objects.get()
+        self.assertTrue(certificate.certificate_file.storage.exists(certificate.certificate_file.name))
+
+
+class VerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='student', password='x', first_name='Asha', last_name='Rao')
+        self.course = Course.objects.create(
+            title='Django', slug='django', instructor=self.student, short_description='-', detailed_description='-',
+            price=0, requirements='-', what_you_will_learn='-',
+        )
+        self.certificate, _ = certificates.issue_certificate(self.student.id, self.course.id)
+        self.number = self.certificate.certificate_number
+
+    def test_numbers_are_checksummed(self):
+        self.assertRegex(self.number, r'^CL-[0-9A-Z]{4}-[0-9A-Z]{4}-[0-9A-Z]$')
+        self.assertEqual(verification.parse_number(self.number.lower().replace('-', ' ')), self.number)
+        self.assertEqual(verification.parse_number('cl-1i0o-0000-' + verification.format_number('11000000')[-1]),
+                         verification.format_number('11000000'))
+
+        payload = self.number[3:7] + self.number[8:12]
+        for position in range(len(payload)):
+            for char in verification.ALPHABET:
+                if char != payload[position]:
+                    typo = payload[:position] + char + payload[position + 1:]
+                    self.assertIsNone(verification.parse_number(f'CL{typo}{self.number[-1]}'))
+
+    def test_issuing_retries_a_number_collision(self):
+        other = Course.objects.create(
+            title='Flask', slug='flask', instructor=self.student, short_description='-', detailed_description='-',
+            price=0, requirements='-', what_you_will_learn='-',
+        )
+        fresh = verification.format_number('ABCDEFGH')
+        with mock.patch('enrollment.certificates.new_certificate_number', side_effect=[self.number, fresh]):
+            certificate, created = certificates.issue_certificate(self.student.id, other.id)
+
+        self.assertTrue(created)
+        self.assertEqual(certificate.certificate_number, fresh)
+
+    def test_page_caches_hits_and_misses(self):
+        url = reverse('enrollment:verify_certificate')
+        unknown = verification.format_number('00000000')
+
+        self.assertContains(self.client.get(url, {'number': self.number}), 'Asha Rao')
+        self.assertContains(self.client.get(url, {'number': unknown}), 'No certificate')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url, {'number': self.number}), 'Asha Rao')
+            self.client.get(url, {'number': unknown})
+            self.assertContains(self.client.get(url, {'number': 'CL-0000-0000-Z'}), 'No certificate')
+
+        # Issuing the unknown number replaces its cached miss
+        self.certificate.delete()
+        Certificate.objects.create(user=self.student, course=self.course, certificate_number=unknown)
+        self.assertContains(self.client.get(url, {'number': unknown}), 'Asha Rao')
+        self.assertContains(self.client.get(url, {'number': self.number}), 'No certificate')
+
+    def test_bulk_api_uses_one_query(self):
+        numbers = [self.number, verification.format_number('00000000'), 'not a number', 'CL-0000-0000-Z']
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse('enrollment:verify_certificates'), json.dumps({'numbers': numbers}), content_type='application/json'
+            )
+
+        results = response.json()['results']
+        self.assertEqual([result['valid'] for result in results], [True, False, False, False])
+        self.assertEqual(results[0]['certificate']['course'], 'Django')
+        self.assertEqual(self.client.post(
+            reverse('enrollment:verify_certificates'), '{"numbers": 1}', content_type='application/json'
+        ).status_code, 400)
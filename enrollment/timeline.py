@@ -0,0 +1,123 @@
+"""
+Daily classes timeline: the classes a student can see from PAST_DAYS ago to
+UPCOMING_DAYS ahead, split into past, today and upcoming.
+
+Classes for all students are cached per day, and each user's enrolled course
+ids are cached until their enrollments change. A warm page therefore needs a
+single query: the user's course-specific classes in the window, read through
+``dailyclass_course_date_idx``.
+
+The page polls ``daily_class_changes``, which resends the changes of the last
+few minutes (see ``enrollment.feeds``). ``changes_seen`` lists the version of
+every class on the page, so the poll can skip versions the page already shows
+and hidden classes it never showed.
+
+Cached entries are dropped by the signal handlers in ``enrollment.signals``.
+Code that changes classes without saving model instances (``bulk_create``,
+``QuerySet.update``) must call ``invalidate_general_classes()`` itself.
+
+Entries are dropped when the change commits, not when it is made: a request
+that refilled the cache in between would otherwise store the state from
+before the change. They are always refilled from the primary, even on
+replica-read pages, because a lagging replica could store the same stale
+state for an hour.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .models import DailyClass, Enrollment
+
+PAST_DAYS = 3
+UPCOMING_DAYS = 7
+CACHE_TIMEOUT = 60 * 60
+
+GENERAL_VERSION_KEY = 'daily_classes:general:version'
+
+
+def enrolled_course_ids_key(user_id):
+    return f'enrollment:course_ids:{user_id}'
+
+
+def enrolled_course_ids(user_id):
+    """The ids of the courses the user is enrolled in, cached"""
+    key = enrolled_course_ids_key(user_id)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = list(
+            Enrollment.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('course_id', flat=True)
+        )
+        cache.set(key, course_ids, CACHE_TIMEOUT)
+    return course_ids
+
+
+def invalidate_enrolled_course_ids(user_id):
+    """Forget the user's enrolled course ids once the current transaction commits"""
+    key = enrolled_course_ids_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _general_version():
+    version = cache.get(GENERAL_VERSION_KEY)
+    if version is None:
+        # add() so concurrent first requests agree on one version
+        cache.add(GENERAL_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(GENERAL_VERSION_KEY)
+    return version
+
+
+def invalidate_general_classes():
+    """Forget every cached day of all-students classes once the current transaction commits"""
+    transaction.on_commit(lambda: cache.set(GENERAL_VERSION_KEY, time.time_ns(), None))
+
+
+def general_classes(dates):
+    """Active classes for all students on each of ``dates``, as {date: [classes]}; cached per day"""
+    version = _general_version()
+    keys = {f'daily_classes:general:{version}:{day.isoformat()}': day for day in dates}
+    cached = cache.get_many(keys)
+    by_date = {keys[key]: classes for key, classes in cached.items()}
+
+    missing = [day for day in dates if day not in by_date]
+    if missing:
+        for day in missing:
+            by_date[day] = []
+        for daily_class in DailyClass.objects.using(DEFAULT_DB_ALIAS).filter(
+            is_active=True, course=None, date__in=missing
+        ).select_related('created_by'):
+            by_date[daily_class.date].append(daily_class)
+        cache.set_many(
+            {key: by_date[day] for key, day in keys.items() if day in missing}, CACHE_TIMEOUT
+        )
+    return by_date
+
+
+def build_timeline(user, today=None):
+    """Template context for the daily classes page, or None if ``user`` has no enrollments"""
+    course_ids = enrolled_course_ids(user.pk)
+    if not course_ids:
+        return None
+
+    today = today or timezone.now().date()
+    start = today - timedelta(days=PAST_DAYS)
+    end = today + timedelta(days=UPCOMING_DAYS)
+
+    classes = list(DailyClass.objects.filter(
+        is_active=True, course_id__in=course_ids, date__range=(start, end)
+    ).select_related('course', 'created_by'))
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    for day_classes in general_classes(dates).values():
+        classes.extend(day_classes)
+
+    classes.sort(key=lambda daily_class: (daily_class.date, daily_class.scheduled_time))
+    return {
+        'todays_classes': [c for c in classes if c.date == today],
+        'upcoming_classes': [c for c in classes if c.date > today],
+        'past_classes': [c for c in reversed(classes) if c.date < today],
+        'today': today,
+        'changes_seen': {str(c.id): c.updated_at.isoformat() for c in classes},
+    }
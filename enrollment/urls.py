@@ -7,6 +7,9 @@ urlpatterns = [
     # Learning URLs
     path('my-learning/', views.my_learning, name='my_learning'),
     path('daily-classes/', views.daily_classes, name='daily_classes'),
+    path('daily-classes/changes/', views.daily_class_changes, name='daily_class_changes'),
+    path('daily-classes/calendar/<str:token>.ics', views.daily_classes_calendar, name='daily_classes_calendar'),
+    path('daily-classes/calendar/reset/', views.reset_calendar_link, name='reset_calendar_link'),
     
     # Wishlist URLs
     path('wishlist/', views.wishlist, name='wishlist'),
@@ -16,6 +19,8 @@ urlpatterns = [
     # Certificate URLs
     path('certificate/<int:certificate_id>/', views.view_certificate, name='view_certificate'),
     path('certificate/<int:certificate_id>/download/', views.download_certificate, name='download_certificate'),
+    path('certificates/verify/', views.verify_certificate, name='verify_certificate'),
+    path('api/certificates/verify/', views.verify_certificates, name='verify_certificates'),
     
     # Free enrollment (for free courses)
     path('enroll-free/<int:course_id>/', views.enroll_free_course, name='enroll_free'),
@@ -0,0 +1,110 @@
+"""
+Certificate numbers and public verification.
+
+New numbers look like ``CL-7K3M-Q9XA-R``: 40 random bits written as eight
+Crockford base32 digits, then a Luhn mod 32 check digit. The check digit
+catches every single-character typo and most swapped neighbours, so a
+mistyped number is rejected before it reaches the cache or the database.
+Readers may use any case, drop the dashes, and type I/L for 1 or O for 0.
+The unique constraint on ``certificate_number`` turns the rare random
+collision into a retry (see ``enrollment.certificates.issue_certificate``).
+Numbers in other formats, such as ones typed into the admin, are looked up
+verbatim.
+
+Lookups are cached per number, including misses. A miss is cached for a
+shorter time, so repeated checks of a bogus number don't reach the database
+either. Saving or deleting a certificate drops its entry (see
+``enrollment.signals``).
+"""
+
+import hashlib
+import re
+import secrets
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Certificate
+
+PREFIX = 'CL'
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+PAYLOAD_LENGTH = 8
+
+CACHE_TIMEOUT = 60 * 60
+NEGATIVE_CACHE_TIMEOUT = 5 * 60
+NOT_FOUND = 'not-found'
+
+# Crockford's reading of ambiguous characters
+_READ_AS = str.maketrans({'I': '1', 'L': '1', 'O': '0'})
+_SEPARATORS = re.compile(r'[\s-]+')
+
+
+def _luhn_check_digit(payload):
+    base = len(ALPHABET)
+    total = 0
+    for position, char in enumerate(reversed(payload)):
+        addend = ALPHABET.index(char) * (2 if position % 2 == 0 else 1)
+        total += addend // base + addend % base
+    return ALPHABET[-total % base]
+
+
+def format_number(payload):
+    return f'{PREFIX}-{payload[:4]}-{payload[4:]}-{_luhn_check_digit(payload)}'
+
+
+def new_certificate_number():
+    payload = ''.join(secrets.choice(ALPHABET) for _ in range(PAYLOAD_LENGTH))
+    return format_number(payload)
+
+
+def parse_number(raw):
+    """The canonical form of a typed certificate number, or None if it can't be one"""
+    raw = (raw or '').strip()
+    compact = _SEPARATORS.sub('', raw).upper()
+    if not compact.startswith(PREFIX):
+        return raw or None
+
+    digits = compact[len(PREFIX):].translate(_READ_AS)
+    if len(digits) != PAYLOAD_LENGTH + 1 or any(char not in ALPHABET for char in digits):
+        return None
+    payload, check = digits[:PAYLOAD_LENGTH], digits[PAYLOAD_LENGTH]
+    if _luhn_check_digit(payload) != check:
+        return None
+    return format_number(payload)
+
+
+def cache_key(number):
+    # Hashed so hand-typed numbers with spaces are still valid cache keys
+    return f'certificate:verify:{hashlib.sha256(number.encode()).hexdigest()}'
+
+
+def forget(number):
+    cache.delete(cache_key(number))
+
+
+def lookup(numbers):
+    """``{number: details or None}`` for canonical ``numbers``, with at most one query"""
+    keys = {cache_key(number): number for number in set(numbers)}
+    results = {
+        keys[key]: None if details == NOT_FOUND else details
+        for key, details in cache.get_many(keys).items()
+    }
+
+    missing = [number for number in keys.values() if number not in results]
+    if missing:
+        found = {}
+        for row in Certificate.objects.filter(certificate_number__in=missing).values(
+            'certificate_number', 'issued_date', 'user__first_name', 'user__last_name', 'user__username', 'course__title'
+        ):
+            found[row['certificate_number']] = {
+                'number': row['certificate_number'],
+                'holder': f"{row['user__first_name']} {row['user__last_name']}".strip() or row['user__username'],
+                'course': row['course__title'],
+                'issued': timezone.localdate(row['issued_date']).isoformat(),
+            }
+        cache.set_many({cache_key(number): details for number, details in found.items()}, CACHE_TIMEOUT)
+        cache.set_many(
+            {cache_key(number): NOT_FOUND for number in missing if number not in found}, NEGATIVE_CACHE_TIMEOUT
+        )
+        results.update({number: found.get(number) for number in missing})
+    return results
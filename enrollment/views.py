@@ -1,9 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from django.db import models
-from .models import Wishlist, Certificate, Enrollment, DailyClass
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+import json
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+
+from config import async_views
+from config.background import enqueue
+from . import certificates, feeds, verification
+from .models import Wishlist, Certificate, Enrollment
+from .timeline import PAST_DAYS, UPCOMING_DAYS, build_timeline, enrolled_course_ids
 from courses.models import Course
 
 
@@ -99,7 +113,7 @@ def enroll_free_course(request, course_id):
 def view_certificate(request, certificate_id):
     """View certificate"""
     certificate = get_object_or_404(
-        Certificate,
+        Certificate.objects.select_related('user', 'course'),
         id=certificate_id,
         user=request.user
     )
@@ -110,6 +124,22 @@ def view_certificate(request, certificate_id):
     return render(request, 'enrollment/certificate.html', context)
 
 
+def _certificate_file_response(request, certificate):
+    """The stored PDF (or a 304), or None if it hasn't been rendered yet"""
+    if not certificate.certificate_file:
+        return None
+    etag = certificates.file_etag(certificate.certificate_file.name)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            pdf = certificate.certificate_file.open('rb')
+        except FileNotFoundError:
+            return None
+        # FileResponse streams the file; WSGI servers hand it to sendfile()
+        response = FileResponse(pdf, as_attachment=True, filename=f'certificate-{certificate.certificate_number}.pdf')
+    return _with_validators(response, etag, None)
+
+
 @login_required
 def download_certificate(request, certificate_id):
     """Download certificate as PDF"""
@@ -119,12 +149,54 @@ def download_certificate(request, certificate_id):
         user=request.user
     )
     
-    # TODO: Implement PDF generation with reportlab
-    # For now, just redirect to view
-    messages.info(request, 'PDF download feature coming soon!')
+    # PDFs are rendered in the background; a download only reads the stored file
+    response = _certificate_file_response(request, certificate)
+    if response is not None:
+        return response
+    
+    enqueue(certificates.store_certificate, certificate.id)
+    messages.info(request, 'Your certificate PDF is being prepared. Please try again in a minute.')
     return redirect('enrollment:view_certificate', certificate_id=certificate_id)
 
 
+def verify_certificate(request):
+    """Public page confirming a certificate number"""
+    raw_number = request.GET.get('number', '').strip()
+    context = {'number': raw_number}
+    if raw_number:
+        number = verification.parse_number(raw_number)
+        context['checked'] = True
+        context['certificate'] = number and verification.lookup([number])[number]
+    return render(request, 'enrollment/verify_certificate.html', context)
+
+
+# Largest batch one bulk verification request may contain
+MAX_BULK_VERIFICATIONS = 500
+
+
+@csrf_exempt
+@require_POST
+def verify_certificates(request):
+    """Bulk certificate verification API; POST {"numbers": [...]} as JSON"""
+    try:
+        numbers = json.loads(request.body)['numbers']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Send a JSON object with a "numbers" list'}, status=400)
+    if not isinstance(numbers, list) or not all(isinstance(number, str) for number in numbers):
+        return JsonResponse({'error': '"numbers" must be a list of strings'}, status=400)
+    if len(numbers) > MAX_BULK_VERIFICATIONS:
+        return JsonResponse({'error': f'At most {MAX_BULK_VERIFICATIONS} numbers per request'}, status=400)
+    
+    parsed = [verification.parse_number(number) for number in numbers]
+    found = verification.lookup([number for number in parsed if number])
+    return JsonResponse({
+        'results': [
+            {'number': raw_number, 'valid': bool(number and found[number]), 'certificate': number and found[number]}
+            for raw_number, number in zip(numbers, parsed)
+        ]
+    })
+
+
 @login_required
 def my_learning(request):
     """Display user's enrolled courses"""
@@ -144,59 +216,97 @@ def my_learning(request):
     return render(request, 'enrollment/my_learning.html', context)
 
 
-@login_required
-def daily_classes(request):
+@async_views.login_required
+async def daily_classes(request):
     """Display daily classes for enrolled students"""
-    from django.utils import timezone
-    from datetime import timedelta
+    # One query once the enrolled courses and all-students classes are cached
+    context = await sync_to_async(build_timeline)(request.user)
     
-    # Check if user has any enrollments
-    has_enrollments = Enrollment.objects.filter(user=request.user).exists()
-    
-    if not has_enrollments:
+    if context is None:
         messages.warning(request, 'You need to enroll in at least one course to access daily classes.')
         return redirect('courses:course_list')
     
-    # Get user's enrolled courses
-    enrolled_course_ids = Enrollment.objects.filter(
-        user=request.user
-    ).values_list('course_id', flat=True)
+    # The page polls for changes made after it was rendered
+    context['changes_cursor'] = timezone.now().isoformat()
+    context['calendar_url'] = request.build_absolute_uri(
+        reverse('enrollment:daily_classes_calendar', args=[feeds.feed_token(request.user)])
+    )
+    return await async_views.arender(request, 'enrollment/daily_classes.html', context)
+
+
+@login_required
+@require_POST
+def reset_calendar_link(request):
+    """Give the student a new calendar feed URL; the old one stops working"""
+    feeds.reset_token(request.user.pk)
+    messages.success(request, 'Your calendar link was reset. Subscribe again with the new link.')
+    return redirect('enrollment:daily_classes')
+
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients keep the copy but must revalidate it on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def daily_classes_calendar(request, token):
+    """iCalendar subscription with a student's daily classes"""
+    user_id = feeds.user_id_for_token(token)
+    if user_id is None:
+        raise Http404
     
+    course_ids = enrolled_course_ids(user_id)
     today = timezone.now().date()
+    classes = feeds.window_classes(
+        course_ids,
+        today - timedelta(days=feeds.FEED_PAST_DAYS),
+        today + timedelta(days=feeds.FEED_UPCOMING_DAYS)
+    )
     
-    # Today's classes
-    todays_classes = DailyClass.objects.filter(
-        is_active=True,
-        date=today
-    ).filter(
-        models.Q(course=None) |  # General classes for all students
-        models.Q(course_id__in=enrolled_course_ids)  # Course-specific classes
-    ).select_related('course', 'created_by').order_by('scheduled_time')
-    
-    # Upcoming classes (next 7 days)
-    upcoming_classes = DailyClass.objects.filter(
-        is_active=True,
-        date__gt=today,
-        date__lte=today + timedelta(days=7)
-    ).filter(
-        models.Q(course=None) |
-        models.Q(course_id__in=enrolled_course_ids)
-    ).select_related('course', 'created_by').order_by('date', 'scheduled_time')
-    
-    # Past classes (last 3 days for reference)
-    past_classes = DailyClass.objects.filter(
-        is_active=True,
-        date__lt=today,
-        date__gte=today - timedelta(days=3)
-    ).filter(
-        models.Q(course=None) |
-        models.Q(course_id__in=enrolled_course_ids)
-    ).select_related('course', 'created_by').order_by('-date', '-scheduled_time')
+    etag, last_modified = feeds.feed_state(classes, sorted(course_ids), today)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp())
+    )
+    if response is None:
+        active_classes = classes.filter(is_active=True).select_related('course').order_by('date', 'scheduled_time')
+        response = HttpResponse(feeds.render_ics(active_classes), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="daily-classes.ics"'
+    return _with_validators(response, etag, last_modified)
+
+
+@login_required
+def daily_class_changes(request):
+    """Daily classes changed since the ``since`` cursor, as JSON"""
+    since = request.GET.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
     
-    context = {
-        'todays_classes': todays_classes,
-        'upcoming_classes': upcoming_classes,
-        'past_classes': past_classes,
-        'today': today,
-    }
-    return render(request, 'enrollment/daily_classes.html', context)
\ No newline at end of file
+    course_ids = enrolled_course_ids(request.user.pk)
+    today = timezone.now().date()
+    classes = feeds.window_classes(
+        course_ids,
+        today - timedelta(days=PAST_DAYS),
+        today + timedelta(days=UPCOMING_DAYS)
+    )
+    
+    etag, last_modified = feeds.feed_state(classes, sorted(course_ids), today)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp())
+    )
+    if response is None:
+        changed = classes.select_related('course').order_by('updated_at', 'id')
+        if since:
+            changed = feeds.changed_since(changed, since)
+        cursor = max(filter(None, [since, last_modified]), default=timezone.now())
+        response = JsonResponse({
+            'cursor': cursor.isoformat(),
+            'classes': [feeds.class_as_dict(daily_class) for daily_class in changed],
+        })
+    return _with_validators(response, etag, last_modified)
@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for production.
+
+WSGI (threaded workers, the default):
+    gunicorn config.wsgi:application
+
+ASGI (event-loop workers, for the async views):
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn config.asgi:application
+
+Every setting below can be overridden with the matching environment variable.
+Send SIGHUP to the master process for a graceful reload: new workers boot with
+the current code and old workers finish their in-flight requests before exiting.
+"""
+
+import glob
+import multiprocessing
+import os
+
+# Aliased: gunicorn treats a module-level ``config`` as its own setting
+from decouple import config as env
+
+bind = f"0.0.0.0:{env('PORT', default='8000')}"
+
+# Workers: the classic (2 x CPU) + 1, capped so large hosts don't run out of memory
+workers = env(
+    'GUNICORN_WORKERS',
+    default=min(multiprocessing.cpu_count() * 2 + 1, env('GUNICORN_MAX_WORKERS', default=8, cast=int)),
+    cast=int,
+)
+worker_class = env('GUNICORN_WORKER_CLASS', default='gthread')
+
+# Threads per worker (gthread only); DB-bound views spend most time waiting on I/O
+threads = env('GUNICORN_THREADS', default=4, cast=int)
+
+# Connection handling
+keepalive = env('GUNICORN_KEEPALIVE', default=5, cast=int)
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+# Recycle workers periodically to contain slow memory growth; jitter avoids
+# every worker restarting at the same moment
+max_requests = env('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+
+# Don't preload: SIGHUP reloads must re-import application code in new workers
+preload_app = False
+
+# Heartbeat files on tmpfs so a slow disk can't get workers killed
+worker_tmp_dir = '/dev/shm'
+
+# Trust X-Forwarded-* from the platform load balancer
+forwarded_allow_ips = env('FORWARDED_ALLOW_IPS', default='*')
+
+accesslog = '-'
+errorlog = '-'
+loglevel = env('GUNICORN_LOG_LEVEL', default='info')
+
+# Prometheus multi-process mode (see config/metrics.py): start from an empty
+# metrics directory and drop the live gauges of workers that exit
+prometheus_multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    if prometheus_multiproc_dir:
+        os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(prometheus_multiproc_dir, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if prometheus_multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
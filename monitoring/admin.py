@@ -0,0 +1,53 @@
+from django.contrib import admin, messages
+from django.utils.html import format_html
+
+from .models import SlowQuery
+from .slow_queries import explain
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['short_sql', 'calls', 'total_ms', 'avg_ms', 'max_ms', 'last_view', 'last_seen', 'explained_at']
+    search_fields = ['sql', 'last_view']
+    list_filter = ['last_view']
+    readonly_fields = [
+        'fingerprint', 'sql', 'sample_sql', 'calls', 'total_time', 'max_time', 'avg_ms',
+        'last_view', 'first_seen', 'last_seen', 'explained_at', 'plan',
+    ]
+    exclude = ['explain_plan']
+    actions = ['capture_plans']
+
+    def short_sql(self, obj):
+        return obj.sql[:120] + ('…' if len(obj.sql) > 120 else '')
+    short_sql.short_description = 'Statement'
+
+    def total_ms(self, obj):
+        return f"{obj.total_time:,.0f}"
+    total_ms.short_description = 'Total ms'
+    total_ms.admin_order_field = 'total_time'
+
+    def avg_ms(self, obj):
+        return f"{obj.avg_time:,.1f}"
+    avg_ms.short_description = 'Avg ms'
+
+    def max_ms(self, obj):
+        return f"{obj.max_time:,.1f}"
+    max_ms.short_description = 'Max ms'
+    max_ms.admin_order_field = 'max_time'
+
+    def plan(self, obj):
+        if not obj.explain_plan:
+            return '-'
+        return format_html('<pre style="white-space: pre-wrap;">{}</pre>', obj.explain_plan)
+    plan.short_description = 'EXPLAIN plan'
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Capture EXPLAIN plan now')
+    def capture_plans(self, request, queryset):
+        explained = sum(explain(slow_query) for slow_query in queryset)
+        skipped = queryset.count() - explained
+        self.message_user(request, f'Captured {explained} plan(s).', messages.SUCCESS)
+        if skipped:
+            self.message_user(request, f'{skipped} statement(s) skipped: only SELECTs on PostgreSQL are explained.', messages.WARNING)
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .queries import add_global_observer, install_wrapper
+        from .slow_queries import record_slow_query
+
+        connection_created.connect(install_wrapper, dispatch_uid='monitoring.queries')
+        add_global_observer(record_slow_query)
@@ -0,0 +1,25 @@
+# monitoring/management/commands/explain_slow_queries.py
+from django.core.management.base import BaseCommand
+
+from monitoring.slow_queries import explain_top_offenders
+
+
+class Command(BaseCommand):
+    help = 'Captures EXPLAIN (ANALYZE, BUFFERS) plans for the slowest logged queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=None,
+            help='Number of statements to explain (defaults to SLOW_QUERY_EXPLAIN_TOP)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-explain statements whose plan is still fresh'
+        )
+
+    def handle(self, *args, **options):
+        explained = explain_top_offenders(limit=options['top'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Captured {explained} query plan(s).'))
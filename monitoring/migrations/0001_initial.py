@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('sql', models.TextField(help_text='Statement with literals and IN lists normalized')),
+                ('sample_sql', models.TextField(blank=True, help_text='Slowest captured execution, with parameters')),
+                ('calls', models.PositiveBigIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0, help_text='Milliseconds')),
+                ('max_time', models.FloatField(default=0, help_text='Milliseconds')),
+                ('last_view', models.CharField(blank=True, max_length=200)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField()),
+                ('explain_plan', models.TextField(blank=True)),
+                ('explained_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Slow queries',
+                'db_table': 'slow_queries',
+                'ordering': ['-total_time'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+def forget_inlined_samples(apps, schema_editor):
+    # Samples used to be stored with their parameters inlined
+    apps.get_model('monitoring', 'SlowQuery').objects.update(sample_sql='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='slowquery',
+            name='sample_sql',
+            field=models.TextField(blank=True, help_text='Slowest captured execution, parameterised; values are never stored'),
+        ),
+        migrations.RunPython(forget_inlined_samples, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """Aggregated statistics for one normalized slow SQL statement"""
+    fingerprint = models.CharField(max_length=40, unique=True)
+    sql = models.TextField(help_text="Statement with literals and IN lists normalized")
+    sample_sql = models.TextField(blank=True, help_text="Slowest captured execution, parameterised; values are never stored")
+    calls = models.PositiveBigIntegerField(default=0)
+    total_time = models.FloatField(default=0, help_text="Milliseconds")
+    max_time = models.FloatField(default=0, help_text="Milliseconds")
+    last_view = models.CharField(max_length=200, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField()
+    explain_plan = models.TextField(blank=True)
+    explained_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.fingerprint[:12]} ({self.calls} calls)"
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.calls if self.calls else 0
+
+    class Meta:
+        db_table = 'slow_queries'
+        ordering = ['-total_time']
+        verbose_name_plural = 'Slow queries'
@@ -0,0 +1,66 @@
+"""
+One execute wrapper on every database connection, shared by all query instrumentation.
+
+Observers are plain callables ``observer(sql, params, many, context, elapsed)``
+with ``elapsed`` in seconds. Global observers (the slow query log) see every
+statement. Observers registered with ``observe_queries()`` only see statements
+run in the current context, which follows a request into ``sync_to_async``
+threads, so per-request counters stay correct for async views too.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_global_observers = []
+_context_observers = ContextVar('query_observers', default=())
+
+
+def add_global_observer(observer):
+    if observer not in _global_observers:
+        _global_observers.append(observer)
+
+
+@contextmanager
+def observe_queries(observer):
+    """Report statements executed in the current context to ``observer``"""
+    token = _context_observers.set(_context_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _context_observers.reset(token)
+
+
+class QueryCounter:
+    """Observer totalling statements and their time; async views may feed it from several threads"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, sql, params, many, context, elapsed):
+        with self._lock:
+            self.count += 1
+            self.time += elapsed
+
+
+def query_wrapper(execute, sql, params, many, context):
+    observers = _context_observers.get()
+    if not observers and not _global_observers:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        for observer in (*_global_observers, *observers):
+            observer(sql, params, many, context, elapsed)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """``connection_created`` receiver"""
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
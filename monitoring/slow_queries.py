@@ -0,0 +1,272 @@
+"""
+Slow query log.
+
+``record_slow_query`` observes every statement run through the shared execute
+wrapper in ``monitoring.queries``. Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are fingerprinted (literals
+and IN lists normalized) and aggregated in memory with the view that ran them.
+
+``SlowQueryMiddleware`` hands the aggregates to a background thread every
+``SLOW_QUERY_FLUSH_SECONDS``, which merges them into the ``SlowQuery`` table
+shared by all workers. Every ``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds the
+``SLOW_QUERY_EXPLAIN_TOP`` worst statements by total time also get a fresh
+``EXPLAIN (ANALYZE, BUFFERS)`` plan (PostgreSQL, SELECT statements only).
+
+Parameter values can be personal data, so the table only ever holds the
+parameterised SQL. The parameters of each statement's slowest execution
+stay in the memory of the worker that saw it, which uses them for
+``EXPLAIN ANALYZE``. Only the ``SLOW_QUERY_SAMPLE_PARAMS`` most recently
+flushed or explained statements keep theirs. Without them, and for
+locking reads (``FOR UPDATE`` and friends, which ANALYZE would really run
+and hold locks for), the plan is PostgreSQL's ``EXPLAIN (GENERIC_PLAN)``,
+which runs nothing. An ANALYZE plan can still quote the values its
+filters matched, which is why plans are shown only in the admin.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Case, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from config.async_views import HybridMiddleware
+from config.background import enqueue
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_LOCKING_RE = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b', re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r'%[s%]')
+
+_current_view = ContextVar('slow_query_view', default='')
+# Set while flushing or explaining, so the log doesn't record itself
+_suppressed = ContextVar('slow_query_suppressed', default=False)
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+_last_explain = 0.0
+# Fingerprint -> parameters of the slowest execution flushed by this process,
+# least recently used first
+_sample_params = OrderedDict()
+_sample_params_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """Return ``(normalized_sql, digest)``; statements differing only in values share a digest"""
+    normalized = _STRING_RE.sub('?', sql)
+    normalized = _NUMBER_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('IN (...)', normalized)
+    normalized = _WHITESPACE_RE.sub(' ', normalized).strip()
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def record_slow_query(sql, params, many, context, elapsed):
+    """Global query observer"""
+    elapsed *= 1000
+    if settings.SLOW_QUERY_ENABLED and elapsed >= settings.SLOW_QUERY_THRESHOLD_MS and not _suppressed.get():
+        _record(sql, params, many, elapsed)
+
+
+def _record(sql, params, many, elapsed):
+    normalized, key = fingerprint(sql)
+    with _pending_lock:
+        stats = _pending.get(key)
+        if stats is None:
+            stats = _pending[key] = {
+                'sql': normalized, 'calls': 0, 'total': 0.0, 'max': 0.0, 'sample': '', 'params': None, 'view': '',
+            }
+        stats['calls'] += 1
+        stats['total'] += elapsed
+        stats['view'] = _current_view.get()
+        if elapsed > stats['max']:
+            stats['max'] = elapsed
+            stats['sample'] = sql
+            stats['params'] = None if many else params
+
+
+def take_pending():
+    """Remove and return this process's unflushed aggregates"""
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    return pending
+
+
+def _remember_params(key, params):
+    with _sample_params_lock:
+        _sample_params[key] = params
+        _sample_params.move_to_end(key)
+        while len(_sample_params) > settings.SLOW_QUERY_SAMPLE_PARAMS:
+            _sample_params.popitem(last=False)
+
+
+def _recall_params(key):
+    with _sample_params_lock:
+        if key not in _sample_params:
+            return None
+        _sample_params.move_to_end(key)
+        return _sample_params[key]
+
+
+def _merge(key, stats, now):
+    from .models import SlowQuery
+
+    # UPDATE reads the old row, so the sample is replaced only by a slower one
+    return SlowQuery.objects.filter(fingerprint=key).update(
+        calls=F('calls') + stats['calls'],
+        total_time=F('total_time') + stats['total'],
+        sample_sql=Case(
+            When(Q(max_time__lt=stats['max']) | Q(sample_sql=''), then=Value(stats['sample'])),
+            default=F('sample_sql'),
+            output_field=TextField(),
+        ),
+        max_time=Greatest('max_time', Value(stats['max'], output_field=FloatField())),
+        last_view=stats['view'],
+        last_seen=now,
+    )
+
+
+def flush(pending):
+    """Merge in-memory aggregates into the SlowQuery table"""
+    from .models import SlowQuery
+
+    token = _suppressed.set(True)
+    try:
+        now = timezone.now()
+        for key, stats in pending.items():
+            if stats['params'] is not None:
+                _remember_params(key, stats['params'])
+            if _merge(key, stats, now):
+                continue
+            try:
+                with transaction.atomic():
+                    SlowQuery.objects.create(
+                        fingerprint=key,
+                        sql=stats['sql'],
+                        sample_sql=stats['sample'],
+                        calls=stats['calls'],
+                        total_time=stats['total'],
+                        max_time=stats['max'],
+                        last_view=stats['view'],
+                        last_seen=now,
+                    )
+            except IntegrityError:
+                # Another worker inserted it first
+                _merge(key, stats, now)
+    finally:
+        _suppressed.reset(token)
+
+
+def _generic(sql):
+    """``sql`` with Django's ``%s`` placeholders numbered as ``$1, $2, ...`` for GENERIC_PLAN"""
+    numbers = iter(range(1, sql.count('%s') + 1))
+    return _PLACEHOLDER_RE.sub(lambda match: '%' if match.group() == '%%' else f'${next(numbers)}', sql)
+
+
+def explain(slow_query, using='default'):
+    """Capture ``EXPLAIN (ANALYZE, BUFFERS)`` for the slowest recorded execution"""
+    connection = connections[using]
+    sample = slow_query.sample_sql
+    if connection.vendor != 'postgresql' or not sample.lstrip().upper().startswith('SELECT'):
+        return False
+
+    params = _recall_params(slow_query.fingerprint)
+    if params is not None and not _LOCKING_RE.search(sample):
+        statement = ('EXPLAIN (ANALYZE, BUFFERS) ' + sample, params)
+    elif connection.pg_version >= 160000:
+        statement = ('EXPLAIN (GENERIC_PLAN) ' + _generic(sample), None)
+    else:
+        return False
+
+    token = _suppressed.set(True)
+    try:
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(f'SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}')
+                cursor.execute(*statement)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            # ANALYZE really runs the statement; never keep anything it did
+            transaction.set_rollback(True, using=using)
+    except DatabaseError as e:
+        plan = f'EXPLAIN failed: {e}'
+    finally:
+        _suppressed.reset(token)
+
+    slow_query.explain_plan = plan
+    slow_query.explained_at = timezone.now()
+    slow_query.save(update_fields=['explain_plan', 'explained_at'])
+    return True
+
+
+def explain_top_offenders(limit=None, force=False):
+    """Explain the worst statements by total time whose plan is missing or stale"""
+    from .models import SlowQuery
+
+    queryset = SlowQuery.objects.order_by('-total_time')
+    if not force:
+        stale = timezone.now() - timedelta(seconds=settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+        queryset = queryset.filter(Q(explained_at__isnull=True) | Q(explained_at__lt=stale))
+    limit = limit or settings.SLOW_QUERY_EXPLAIN_TOP
+    return sum(explain(slow_query) for slow_query in queryset[:limit])
+
+
+def _flush_and_explain(pending, explain_due):
+    flush(pending)
+    if explain_due:
+        explain_top_offenders()
+
+
+def maybe_flush():
+    """Queue a flush (and a periodic EXPLAIN pass) when they are due"""
+    global _last_flush, _last_explain
+
+    now = time.monotonic()
+    if now - _last_flush < settings.SLOW_QUERY_FLUSH_SECONDS:
+        return
+    _last_flush = now
+
+    explain_due = now - _last_explain >= settings.SLOW_QUERY_EXPLAIN_INTERVAL
+    if explain_due:
+        _last_explain = now
+
+    pending = take_pending()
+    if pending or explain_due:
+        enqueue(_flush_and_explain, pending, explain_due)
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """Attribute slow queries to the view that ran them and flush the log periodically"""
+
+    def handle(self, request):
+        token = _current_view.set(request.path)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_view.reset(token)
+        maybe_flush()
+        return response
+
+    async def ahandle(self, request):
+        token = _current_view.set(request.path)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_view.reset(token)
+        if time.monotonic() - _last_flush >= settings.SLOW_QUERY_FLUSH_SECONDS:
+            # enqueue() goes through transaction.on_commit(), which touches the connection
+            await sync_to_async(maybe_flush)()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current_view.set(request.resolver_match.view_name)
+        return None
@@ -0,0 +1,119 @@
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+
+from courses.models import Category
+from users.models import User
+from . import slow_queries
+from .models import SlowQuery
+
+
+class FingerprintTests(TestCase):
+    def test_values_are_normalized(self):
+        first, key = slow_queries.fingerprint("SELECT * FROM t WHERE a = 'x' AND b = 10 AND c IN (%s, %s)")
+        second, other_key = slow_queries.fingerprint("SELECT  *\nFROM t WHERE a = 'y' AND b = 11 AND c IN (%s)")
+
+        self.assertEqual(first, "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)")
+        self.assertEqual(key, other_key)
+
+    def test_identifiers_are_kept(self):
+        normalized, _ = slow_queries.fingerprint('SELECT "T3"."id" FROM "courses" T3 LIMIT 21')
+        self.assertEqual(normalized, 'SELECT "T3"."id" FROM "courses" T3 LIMIT ?')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slow_queries.take_pending()
+
+    def tearDown(self):
+        slow_queries.take_pending()
+
+    def test_queries_are_attributed_to_views(self):
+        self.client.get('/')
+
+        pending = slow_queries.take_pending()
+        views = {stats['view'] for stats in pending.values()}
+        self.assertIn('home', views)
+
+    def test_flush_merges_aggregates(self):
+        list(Category.objects.filter(name='Python'))
+        slow_queries.flush(slow_queries.take_pending())
+        list(Category.objects.filter(name='Data Science'))
+        slow_queries.flush(slow_queries.take_pending())
+
+        slow_query = SlowQuery.objects.get(sql__contains='FROM "categories"')
+        self.assertEqual(slow_query.calls, 2)
+        self.assertIn('"categories"."name" = %s', slow_query.sample_sql)
+        self.assertNotIn('Python', slow_query.sample_sql)
+        self.assertGreaterEqual(slow_query.max_time * 2, slow_query.total_time)
+
+    @override_settings(SLOW_QUERY_SAMPLE_PARAMS=2)
+    def test_sample_params_are_bounded(self):
+        slow_queries._sample_params.clear()
+        self.addCleanup(slow_queries._sample_params.clear)
+        list(Category.objects.filter(name='Python'))
+        list(Category.objects.filter(slug='python'))
+        slow_queries.flush(slow_queries.take_pending())
+        by_name = SlowQuery.objects.get(sql__contains='"categories"."name" = %s')
+        # Explaining a statement counts as using its parameters
+        self.assertEqual(slow_queries._recall_params(by_name.fingerprint), ('Python',))
+
+        # The least recently used statement makes way for a new one
+        slow_queries.take_pending()
+        list(Category.objects.filter(is_active=True))
+        slow_queries.flush(slow_queries.take_pending())
+        self.assertEqual(len(slow_queries._sample_params), 2)
+        self.assertIn(by_name.fingerprint, slow_queries._sample_params)
+
+    def test_flush_does_not_record_itself(self):
+        list(Category.objects.all())
+        slow_queries.flush(slow_queries.take_pending())
+
+        self.assertFalse(any('slow_queries' in stats['sql'] for stats in slow_queries.take_pending().values()))
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN (ANALYZE, BUFFERS) is PostgreSQL-specific')
+    def test_explain_top_offenders(self):
+        list(Category.objects.filter(name='Python'))
+        slow_queries.flush(slow_queries.take_pending())
+
+        self.assertGreaterEqual(slow_queries.explain_top_offenders(limit=10), 1)
+        slow_query = SlowQuery.objects.filter(sql__contains='FROM "categories"').get()
+        self.assertIn('Execution Time', slow_query.explain_plan)
+
+        # Fresh plans are not recaptured
+        self.assertEqual(slow_queries.explain_top_offenders(limit=10), 0)
+
+    @skipUnless(connection.vendor == 'postgresql' and connection.pg_version >= 160000, 'GENERIC_PLAN needs PostgreSQL 16')
+    def test_locking_reads_are_not_analyzed(self):
+        with transaction.atomic():
+            list(Category.objects.select_for_update().filter(name='Python'))
+        slow_queries.flush(slow_queries.take_pending())
+
+        slow_query = SlowQuery.objects.get(sql__contains='FOR UPDATE')
+        self.assertTrue(slow_queries.explain(slow_query))
+        slow_query.refresh_from_db()
+        self.assertIn('$1', slow_query.explain_plan)
+        self.assertNotIn('Execution Time', slow_query.explain_plan)
+
+    def test_writes_are_never_explained(self):
+        slow_query = SlowQuery.objects.create(
+            fingerprint='x', sql='DELETE FROM categories', sample_sql='DELETE FROM categories', last_seen='2026-01-01T00:00Z'
+        )
+
+        self.assertFalse(slow_queries.explain(slow_query))
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_changelist(self):
+        list(Category.objects.all())
+        slow_queries.flush(slow_queries.take_pending())
+        admin_user = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        self.client.force_login(admin_user)
+
+        response = self.client.get('/admin/monitoring/slowquery/')
+
+        self.assertContains(response, 'SELECT &quot;categories&quot;.&quot;id&quot;')
@@ -1,16 +1,33 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import F
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.html import format_html
+
+from config.changelists import FastChangeListMixin
+from config.exports import ExportMixin, streaming_response
 from .models import (
     Cart, CartItem, Order, OrderItem, Coupon, 
-    Announcement, PaymentConfig, PaymentTransaction, Invoice
+    Announcement, PaymentConfig, PaymentTransaction, Invoice, PaymentWebhookEvent
 )
+from . import verification
+from .screenshots import THUMBNAIL_SIZE, reused_screenshot
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'created_at', 'updated_at']
+    list_select_related = ['user']
+    search_fields = ['user__username', 'user__email']
+    autocomplete_fields = ['user']
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['cart', 'course', 'added_at']
+    list_select_related = ['cart__user', 'course']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['course']
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -19,12 +36,30 @@ class OrderItemInline(admin.TabularInline):
     can_delete = False
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FastChangeListMixin, ExportMixin, admin.ModelAdmin):
     list_display = ['order_number', 'user', 'final_amount', 'payment_status', 'payment_method', 'verified_by', 'created_at']
-    list_filter = ['payment_status', 'payment_method', 'verified_by', 'created_at']
+    list_filter = ['payment_status', 'payment_method', ('verified_by', admin.RelatedOnlyFieldListFilter), 'created_at']
+    list_select_related = ['user', 'verified_by']
     search_fields = ['order_number', 'user__username', 'user__email', 'transaction_id']
+    autocomplete_fields = ['user']
     readonly_fields = ['order_number', 'verified_by', 'verified_at', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
+    export_status_field = 'payment_status'
+    export_columns = [
+        ('Order number', 'order_number'),
+        ('Created at', 'created_at'),
+        ('Username', 'user__username'),
+        ('Email', 'user__email'),
+        ('Total', 'total_amount'),
+        ('Discount', 'discount_amount'),
+        ('Final amount', 'final_amount'),
+        ('Payment status', 'payment_status'),
+        ('Payment method', 'payment_method'),
+        ('Transaction ID', 'transaction_id'),
+        ('Razorpay payment ID', 'razorpay_payment_id'),
+        ('Verified by', 'verified_by__username'),
+        ('Verified at', 'verified_at'),
+    ]
     
     fieldsets = (
         ('Order Information', {
@@ -43,18 +78,23 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['order', 'course', 'price']
+    list_select_related = ['order__user', 'course']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['course']
 
 @admin.register(Coupon)
-class CouponAdmin(admin.ModelAdmin):
+class CouponAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['code', 'discount_type', 'discount_value', 'is_active', 'used_count', 'usage_limit']
     list_filter = ['discount_type', 'is_active']
 
 @admin.register(Announcement)
-class AnnouncementAdmin(admin.ModelAdmin):
+class AnnouncementAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['course', 'instructor', 'title', 'created_at']
+    list_select_related = ['course', 'instructor']
     search_fields = ['course__title', 'title']
+    autocomplete_fields = ['course', 'instructor']
 
 @admin.register(PaymentConfig)
 class PaymentConfigAdmin(admin.ModelAdmin):
@@ -74,7 +114,7 @@ class PaymentConfigAdmin(admin.ModelAdmin):
         return not PaymentConfig.objects.exists()
 
 @admin.register(PaymentTransaction)
-class PaymentTransactionAdmin(admin.ModelAdmin):
+class PaymentTransactionAdmin(FastChangeListMixin, ExportMixin, admin.ModelAdmin):
     list_display = [
         'transaction_id',
         'get_order_user',
@@ -83,9 +123,11 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
         'amount', 
         'status',
         'screenshot_thumbnail',
+        'get_screenshot_reused',
         'created_at'
     ]
     list_filter = ['status', 'payment_method', 'created_at']
+    list_annotations = {'screenshot_reused': reused_screenshot()}
     search_fields = [
         'transaction_id', 
         'razorpay_order_id', 
@@ -94,7 +136,26 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
         'order__user__username',
         'order__user__email'
     ]
-    readonly_fields = ['created_at', 'updated_at', 'screenshot_preview']
+    list_select_related = ['order__user']
+    raw_id_fields = ['order']
+    readonly_fields = [
+        'created_at', 'updated_at', 'screenshot_preview', 'payment_screenshot_thumbnail', 'screenshot_hash',
+        'claimed_by', 'claimed_until',
+    ]
+    change_list_template = 'admin/payments/paymenttransaction/change_list.html'
+    export_status_field = 'status'
+    export_columns = [
+        ('Transaction ID', 'transaction_id'),
+        ('Created at', 'created_at'),
+        ('Order number', 'order__order_number'),
+        ('Username', 'order__user__username'),
+        ('Email', 'order__user__email'),
+        ('Payment method', 'payment_method'),
+        ('Amount', 'amount'),
+        ('Status', 'status'),
+        ('Razorpay payment ID', 'razorpay_payment_id'),
+        ('UPI reference', 'upi_transaction_ref'),
+    ]
     
     fieldsets = (
         ('Basic Information', {
@@ -105,7 +166,14 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('UPI Details', {
-            'fields': ('upi_transaction_ref', 'payment_screenshot', 'screenshot_preview'),
+            'fields': (
+                'upi_transaction_ref', 'payment_screenshot', 'screenshot_preview', 'payment_screenshot_thumbnail',
+                'screenshot_hash',
+            ),
+        }),
+        ('Verification Queue', {
+            'fields': ('claimed_by', 'claimed_until'),
+            'classes': ('collapse',)
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -116,181 +184,69 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     actions = ['approve_payment', 'reject_payment']
     
     def save_model(self, request, obj, form, change):
-        """Override save to handle status changes and trigger email/invoice"""
-        from django.db import transaction
+        """Settle the payment through the verification queue when its status is changed here"""
+        new_status = obj.status
+        old_status = form.initial.get('status')
+        # Reopening a rejected payment for review is a plain edit
+        if not change or new_status == old_status or (old_status, new_status) == ('failed', 'pending'):
+            super().save_model(request, obj, form, change)
+            return
         
-        # Only for existing objects (change=True)
-        should_process_approval = False
-        should_process_rejection = False
-        transaction_id = None
-        
-        if change:
-            try:
-                # Get the old instance from database
-                old_obj = PaymentTransaction.objects.get(pk=obj.pk)
-                old_status = old_obj.status
-                new_status = obj.status
-                transaction_id = obj.pk
-                
-                # Check if status changed
-                if old_status != new_status:
-                    if new_status == 'success' and obj.order.payment_status != 'completed':
-                        should_process_approval = True
-                    elif new_status == 'failed' and obj.order.payment_status != 'failed':
-                        should_process_rejection = True
-            except PaymentTransaction.DoesNotExist:
-                pass
-        
-        # Save the model (within atomic transaction)
+        # Save the other edits, then let the queue change the status and fulfil, fail or refund the order
+        obj.status = old_status
         super().save_model(request, obj, form, change)
-        
-        # Process approval/rejection in a NEW transaction after admin's atomic block completes
-        # Use on_commit to ensure it runs after the admin transaction commits
-        if should_process_approval:
-            transaction.on_commit(
-                lambda: self._process_payment_approval_async(request, transaction_id)
+        if old_status == 'pending':
+            settle = verification.approve if new_status == 'success' else verification.reject
+        elif (old_status, new_status) == ('success', 'failed'):
+            settle = verification.refund
+        else:
+            self.message_user(
+                request,
+                'An approved payment can only be refunded, by setting it to Failed. '
+                'A rejected one must be set back to Pending and reviewed again.',
+                messages.WARNING,
             )
-        elif should_process_rejection:
-            transaction.on_commit(
-                lambda: self._process_payment_rejection_async(request, transaction_id)
+            return
+        if settle(request.user, [obj.pk]):
+            obj.status = new_status
+        else:
+            self.message_user(
+                request, 'Another reviewer has this payment in their verification batch; its status was not changed.',
+                messages.WARNING,
             )
     
-    def _process_payment_approval_async(self, request, transaction_id):
-        """Async payment approval - runs after transaction commits"""
-        from django.db import transaction as db_transaction
-        
-        # This runs in a completely new transaction, safe to do all queries
-        with db_transaction.atomic():
-            try:
-                transaction_obj = PaymentTransaction.objects.get(pk=transaction_id)
-                self._process_payment_approval(request, transaction_obj)
-            except PaymentTransaction.DoesNotExist:
-                print(f"❌ Transaction {transaction_id} not found")
-    
-    def _process_payment_rejection_async(self, request, transaction_id):
-        """Async payment rejection - runs after transaction commits"""
-        from django.db import transaction as db_transaction
-        
-        # This runs in a completely new transaction, safe to do all queries
-        with db_transaction.atomic():
-            try:
-                transaction_obj = PaymentTransaction.objects.get(pk=transaction_id)
-                self._process_payment_rejection(request, transaction_obj)
-            except PaymentTransaction.DoesNotExist:
-                print(f"❌ Transaction {transaction_id} not found")
-    
-    def _process_payment_approval(self, request, transaction):
-        """Process payment approval - create enrollments, invoice, and send email"""
-        from django.utils import timezone
-        from .emails import send_payment_approved_email
-        from enrollment.models import Enrollment
-        import logging
-        
-        logger = logging.getLogger(__name__)
-        
-        order = transaction.order
-        
-        print(f"\n{'='*60}")
-        print(f"🔍 DEBUG: Starting payment approval process")
-        print(f"Order: {order.order_number}")
-        print(f"User: {order.user.username} ({order.user.email})")
-        print(f"{'='*60}\n")
-        
-        logger.info(f"Starting approval for order {order.order_number}")
-        
-        # Update order
-        print(f"📝 Step 1: Updating order status...")
-        order.payment_status = 'completed'
-        order.verified_by = request.user
-        order.verified_at = timezone.now()
-        order.save()
-        print(f"✅ Order status updated: {order.payment_status}")
-        logger.info(f"Order {order.order_number} status updated to completed")
-        
-        # Create enrollments
-        print(f"\n📝 Step 2: Creating enrollments...")
-        for item in order.items.all():
-            enrollment, created = Enrollment.objects.get_or_create(
-                user=order.user,
-                course=item.course
-            )
-            
-            if created:
-                item.course.total_enrollments += 1
-                item.course.save()
-                print(f"  ✅ New enrollment created: {item.course.title}")
-                logger.info(f"Enrollment created for {order.user.username} in {item.course.title}")
-            else:
-                print(f"  ℹ️  Enrollment already exists: {item.course.title}")
-                logger.info(f"Enrollment already exists for {order.user.username} in {item.course.title}")
-        
-        # Generate invoice if not exists
-        print(f"\n📝 Step 3: Creating invoice...")
-        if not hasattr(order, 'invoice'):
-            try:
-                invoice = Invoice.objects.create(
-                    order=order,
-                    invoice_number=Invoice.generate_invoice_number(),
-                    subtotal=order.total_amount,
-                    discount_amount=order.discount_amount,
-                    tax_amount=0,
-                    total_amount=order.final_amount,
-                    notes=f"Payment verified by {request.user.get_full_name() or request.user.username}"
-                )
-                print(f"✅ Invoice created: {invoice.invoice_number}")
-                logger.info(f"Invoice {invoice.invoice_number} created for order {order.order_number}")
-            except Exception as e:
-                print(f"❌ Error creating invoice: {str(e)}")
-                logger.error(f"Error creating invoice for order {order.order_number}: {str(e)}")
-        else:
-            print(f"ℹ️  Invoice already exists")
-            logger.info(f"Invoice already exists for order {order.order_number}")
-        
-        # Send email with invoice
-        print(f"\n📝 Step 4: Sending email notification...")
-        try:
-            # Refresh order from database to get latest invoice
-            order.refresh_from_db()
-            
-            print(f"📧 Email to: {order.user.email}")
-            print(f"📧 User: {order.user.get_full_name() or order.user.username}")
-            
-            email_sent = send_payment_approved_email(order)
-            
-            if email_sent:
-                print(f"✅ Email sent successfully!")
-                logger.info(f"Email sent to {order.user.email} for order {order.order_number}")
-            else:
-                print(f"⚠️  Email sending returned False - check SMTP settings")
-                logger.warning(f"Email sending returned False for order {order.order_number}")
-                
-        except Exception as e:
-            print(f"❌ Error sending email: {str(e)}")
-            print(f"Exception type: {type(e).__name__}")
-            logger.error(f"Error sending email for order {order.order_number}: {str(e)}", exc_info=True)
-        
-        print(f"\n{'='*60}")
-        print(f"✅ Payment approval process completed for {order.order_number}")
-        print(f"{'='*60}\n")
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('verify/', self.admin_site.admin_view(self.verification_view), name='%s_%s_verify' % info),
+        ] + super().get_urls()
     
-    def _process_payment_rejection(self, request, transaction):
-        """Process payment rejection - update order and send rejection email"""
-        from django.utils import timezone
-        from .emails import send_payment_rejected_email
+    def verification_view(self, request):
+        """Work through pending UPI payments a batch at a time"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
         
-        order = transaction.order
+        if request.method == 'POST':
+            ids = request.POST.getlist('ids')
+            action = request.POST.get('action')
+            if action == 'approve':
+                self.message_user(request, f'{verification.approve(request.user, ids)} payment(s) approved.')
+            elif action == 'reject':
+                count = verification.reject(request.user, ids, request.POST.get('reason', '').strip())
+                self.message_user(request, f'{count} payment(s) rejected.')
+            elif action == 'release':
+                verification.release(request.user, ids)
+            return redirect(request.path)
         
-        # Update order
-        order.payment_status = 'failed'
-        order.verified_by = request.user
-        order.verified_at = timezone.now()
-        order.save()
-        
-        # Send rejection email
-        send_payment_rejected_email(order, order.rejection_reason)
-        
-        print(f"✅ Payment rejection processed for order {order.order_number}")
-        print(f"✅ Rejection email sent to {order.user.email}")
+        batch = verification.claim(request.user)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Verify UPI payments',
+            'opts': self.model._meta,
+            'batch': batch,
+            'lease_until': batch[0].claimed_until if batch else None,
+        }
+        return TemplateResponse(request, 'admin/payments/verification_queue.html', context)
     
     def get_order_user(self, obj):
         """Display the user who made the order"""
@@ -299,21 +255,30 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     get_order_user.admin_order_field = 'order__user__username'
     
     def screenshot_thumbnail(self, obj):
-        """Display thumbnail of payment screenshot in list view"""
+        """Display the small thumbnail of the payment screenshot in list view"""
         if obj.payment_screenshot:
-            from django.utils.html import format_html
+            # Screenshots uploaded before the pipeline have no thumbnail yet
+            thumbnail = obj.payment_screenshot_thumbnail or obj.payment_screenshot
             return format_html(
-                '<a href="{}" target="_blank"><img src="{}" width="50" height="50" style="object-fit: cover;" /></a>',
+                '<a href="{}" target="_blank"><img src="{}" width="{}" height="{}" loading="lazy" '
+                'style="width: 50px; height: 50px; object-fit: cover;" /></a>',
                 obj.payment_screenshot.url,
-                obj.payment_screenshot.url
+                thumbnail.url,
+                *THUMBNAIL_SIZE
             )
         return '-'
     screenshot_thumbnail.short_description = 'Screenshot'
     
+    def get_screenshot_reused(self, obj):
+        """Whether the same screenshot was sent with another payment"""
+        return obj.screenshot_reused
+    get_screenshot_reused.short_description = 'Reused screenshot'
+    get_screenshot_reused.boolean = True
+    get_screenshot_reused.admin_order_field = 'screenshot_reused'
+    
     def screenshot_preview(self, obj):
-        """Display full-size payment screenshot in detail view"""
+        """Display the review-size payment screenshot in detail view"""
         if obj.payment_screenshot:
-            from django.utils.html import format_html
             return format_html(
                 '<a href="{}" target="_blank"><img src="{}" style="max-width: 500px; max-height: 500px;" /></a>',
                 obj.payment_screenshot.url,
@@ -324,92 +289,27 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     
     def approve_payment(self, request, queryset):
         """Approve pending UPI payments"""
-        from django.utils import timezone
-        from .emails import send_payment_approved_email
-        
-        approved_count = 0
-        for transaction in queryset.filter(status='pending'):
-            transaction.status = 'success'
-            transaction.save()
-            
-            # Update order
-            order = transaction.order
-            
-            # Only proceed if order was not already completed
-            if order.payment_status != 'completed':
-                order.payment_status = 'completed'
-                order.verified_by = request.user
-                order.verified_at = timezone.now()
-                order.save()
-                
-                # Create enrollments and invoices
-                from enrollment.models import Enrollment
-                total_enrollment_increase = 0
-                
-                for item in order.items.all():
-                    # Check if enrollment already exists
-                    enrollment, created = Enrollment.objects.get_or_create(
-                        user=order.user,
-                        course=item.course
-                    )
-                    
-                    # Only increment course enrollments if this is a new enrollment
-                    if created:
-                        item.course.total_enrollments += 1
-                        item.course.save()
-                        total_enrollment_increase += 1
-                
-                # Generate invoice if not already exists
-                if not hasattr(order, 'invoice'):
-                    Invoice.objects.create(
-                        order=order,
-                        invoice_number=Invoice.generate_invoice_number(),
-                        subtotal=order.total_amount,
-                        discount_amount=order.discount_amount,
-                        tax_amount=0,  # Set tax if needed
-                        total_amount=order.final_amount,
-                        notes=f"Payment verified by {request.user.get_full_name() or request.user.username}"
-                    )
-                
-                # Send approval email with invoice
-                send_payment_approved_email(order)
-                approved_count += 1
-        
+        approved_count = verification.approve(request.user, list(queryset.filter(status='pending').values_list('pk', flat=True)))
         self.message_user(request, f'{approved_count} payment(s) approved successfully. Notification emails sent.')
     approve_payment.short_description = 'Approve selected payments'
     
     def reject_payment(self, request, queryset):
         """Reject pending payments"""
-        from django.utils import timezone
-        from .emails import send_payment_rejected_email
-        
-        rejected_count = 0
-        for transaction in queryset.filter(status='pending'):
-            transaction.status = 'failed'
-            transaction.save()
-            
-            # Update order
-            order = transaction.order
-            order.payment_status = 'failed'
-            order.verified_by = request.user
-            order.verified_at = timezone.now()
-            # You can add a rejection reason interface here if needed
-            order.save()
-            
-            # Send rejection email
-            send_payment_rejected_email(order, order.rejection_reason)
-            rejected_count += 1
-        
+        rejected_count = verification.reject(request.user, list(queryset.filter(status='pending').values_list('pk', flat=True)))
         self.message_user(request, f'{rejected_count} payment(s) rejected. Notification emails sent.')
     reject_payment.short_description = 'Reject selected payments'
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['invoice_number', 'get_order_user', 'total_amount', 'invoice_date', 'get_order_payment_status']
     list_filter = ['invoice_date', 'order__payment_status']
+    list_annotations = {'order_username': F('order__user__username'), 'order_payment_status': F('order__payment_status')}
     search_fields = ['invoice_number', 'order__user__username', 'order__user__email', 'order__order_number']
-    readonly_fields = ['invoice_number', 'invoice_date', 'created_at', 'updated_at']
+    raw_id_fields = ['order']
+    readonly_fields = ['invoice_number', 'invoice_date', 'pdf_file', 'pdf_sha256', 'created_at', 'updated_at']
+    date_hierarchy = 'invoice_date'
+    actions = ['export_pdfs']
     
     fieldsets = (
         ('Invoice Information', {
@@ -422,20 +322,56 @@ class InvoiceAdmin(admin.ModelAdmin):
             'fields': ('notes',),
             'classes': ('collapse',)
         }),
+        ('Document', {
+            'fields': ('pdf_file', 'pdf_sha256'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
+    def export_pdfs(self, request, queryset):
+        """Stream the selected invoices' PDFs as one ZIP (pick a month in the date bar, then select all)"""
+        from .invoices import zip_stream
+        
+        return streaming_response(
+            request, zip_stream(queryset.order_by('invoice_date', 'id')), 'application/zip', 'invoices.zip'
+        )
+    export_pdfs.short_description = 'Download selected invoices as ZIP'
+    
     def get_order_user(self, obj):
         """Display the user who made the order"""
-        return obj.order.user.username
+        return obj.order_username
     get_order_user.short_description = 'User'
     get_order_user.admin_order_field = 'order__user__username'
     
     def get_order_payment_status(self, obj):
         """Display the order payment status"""
-        return obj.order.get_payment_status_display()
+        return dict(Order.PAYMENT_STATUS_CHOICES).get(obj.order_payment_status, obj.order_payment_status)
     get_order_payment_status.short_description = 'Payment Status'
-    get_order_payment_status.admin_order_field = 'order__payment_status'
\ No newline at end of file
+    get_order_payment_status.admin_order_field = 'order__payment_status'
+
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(FastChangeListMixin, admin.ModelAdmin):
+    """The webhook log is append-only; replay events with manage.py replay_payment_webhooks"""
+    list_display = ['event_id', 'event', 'received_at', 'processed_at', 'attempts', 'next_attempt_at', 'applied']
+    list_filter = ['event', 'received_at', 'processed_at']
+    search_fields = ['event_id', 'payload']
+    readonly_fields = ['event_id', 'event', 'payload', 'received_at', 'processed_at', 'attempts', 'next_attempt_at', 'error']
+    
+    def applied(self, obj):
+        """Whether the event was applied without an error"""
+        return obj.processed_at is not None and not obj.error
+    applied.boolean = True
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
@@ -120,7 +120,7 @@ def send_payment_approved_email(order):
             <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
             
             <p style="font-size: 12px; color: #666;">
-                <strong>Invoice Details:</strong> Please keep this email for your records. Your invoice has been generated and can be downloaded from your order history.<br>
+                <strong>Invoice Details:</strong> Please keep this email for your records. Your invoice is attached to this email and can also be downloaded from your order history.<br>
                 If you have any questions, please contact our support team.<br>
                 This is an automated email, please do not reply directly.
             </p>
@@ -131,6 +131,21 @@ def send_payment_approved_email(order):
     
     plain_message = strip_tags(html_message)
     
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.user.email],
+    )
+    email.attach_alternative(html_message, 'text/html')
+    if invoice:
+        # Usually rendered in the background already; see payments/invoices.py
+        from .invoices import invoice_pdf
+        try:
+            email.attach(f'{invoice.invoice_number}.pdf', invoice_pdf(invoice), 'application/pdf')
+        except Exception as e:
+            logger.error(f"Could not attach invoice {invoice.invoice_number}: {str(e)}", exc_info=True)
+    
     print(f"\n📝 Email Configuration:")
     print(f"  FROM: {settings.DEFAULT_FROM_EMAIL}")
     print(f"  TO: {order.user.email}")
@@ -142,14 +157,7 @@ def send_payment_approved_email(order):
     
     try:
         print(f"\n📤 Attempting to send email...")
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        email.send(fail_silently=False)
         print(f"✅ Email sent successfully!")
         logger.info(f"Email sent successfully to {order.user.email} for order {order.order_number}")
         return True
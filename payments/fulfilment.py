@@ -0,0 +1,123 @@
+"""
+Razorpay checkout orders and their fulfilment.
+
+``open_order()`` creates a pending ``Order`` for the cart as soon as the
+gateway order exists. The order is then fulfilled by whichever arrives
+first: the browser's call to ``verify_razorpay_payment``, or the
+``payment.captured`` / ``order.paid`` webhook (see ``payments.webhooks``).
+Either way ``fulfil()`` runs under a row lock on the order, and only
+once, so a customer who closes the tab after paying is still enrolled.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from config.routers import record_background_write
+from courses.models import Course
+from enrollment.models import Enrollment
+from .models import CartItem, Coupon, Invoice, Order, OrderItem, PaymentTransaction
+
+
+class CheckoutError(Exception):
+    """The payment doesn't match an order that can be fulfilled"""
+
+
+def to_paise(amount):
+    return int(amount * 100)
+
+
+def open_order(user, cart_items, subtotal, discount, coupon, razorpay_order_id):
+    """The pending order for a cart that is about to be paid through ``razorpay_order_id``"""
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user,
+            total_amount=subtotal,
+            discount_amount=discount,
+            final_amount=subtotal - discount,
+            payment_method='razorpay',
+            payment_status='pending',
+            razorpay_order_id=razorpay_order_id,
+            coupon=coupon if discount else None,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, course=item.course, price=item.course.get_actual_price())
+            for item in cart_items
+        ])
+    return order
+
+
+def _locked_order(razorpay_order_id):
+    order = Order.objects.select_for_update().filter(razorpay_order_id=razorpay_order_id).order_by('pk').first()
+    if order is None:
+        raise CheckoutError(f'No order for Razorpay order {razorpay_order_id}')
+    return order
+
+
+def _record_payment(order, payment_id, status):
+    txn, created = PaymentTransaction.objects.get_or_create(
+        transaction_id=payment_id,
+        defaults={
+            'order': order,
+            'payment_method': 'razorpay',
+            'amount': order.final_amount,
+            'status': status,
+            'razorpay_order_id': order.razorpay_order_id,
+            'razorpay_payment_id': payment_id,
+        },
+    )
+    # A captured payment stays captured, whatever arrives after it
+    if not created and txn.status not in (status, 'success'):
+        PaymentTransaction.objects.filter(pk=txn.pk).update(status=status, updated_at=timezone.now())
+
+
+def fulfil(razorpay_order_id, payment_id, amount=None):
+    """
+    Mark the order paid, enroll its owner and issue the invoice, once.
+
+    Returns ``(order, fulfilled)``. ``fulfilled`` is False when an earlier
+    call already completed the order, including one whose state a webhook
+    replay has since rebuilt. ``amount`` is what the gateway
+    captured, in paise; if it isn't the order's total, CheckoutError is
+    raised.
+    """
+    with transaction.atomic():
+        order = _locked_order(razorpay_order_id)
+        if amount is not None and amount != to_paise(order.final_amount):
+            raise CheckoutError(f'Captured {amount} paise for order {order.order_number} of {order.final_amount}')
+        _record_payment(order, payment_id, 'success')
+        if order.payment_status == 'completed':
+            return order, False
+
+        order.payment_status = 'completed'
+        order.razorpay_payment_id = payment_id
+        order.save(update_fields=['payment_status', 'razorpay_payment_id', 'updated_at'])
+
+        course_ids = list(order.items.values_list('course_id', flat=True))
+        for course_id in course_ids:
+            enrollment, created = Enrollment.objects.get_or_create(user_id=order.user_id, course_id=course_id)
+            if created:
+                Course.objects.filter(pk=course_id).update(total_enrollments=F('total_enrollments') + 1)
+
+        # A replay rebuilding state completes orders that were invoiced before;
+        # their coupon use and approval email were counted the first time
+        _, invoiced = Invoice.objects.get_or_create(order=order, defaults={
+            'invoice_number': Invoice.generate_invoice_number(),
+            'subtotal': order.total_amount,
+            'discount_amount': order.discount_amount,
+            'tax_amount': 0,
+            'total_amount': order.final_amount,
+            'notes': "Razorpay payment verified automatically",
+        })
+        if invoiced and order.coupon_id:
+            Coupon.objects.filter(pk=order.coupon_id).update(used_count=F('used_count') + 1)
+        CartItem.objects.filter(cart__user_id=order.user_id, course__in=course_ids).delete()
+        # Usually fulfilled from a webhook, outside the student's requests
+        record_background_write([order.user_id])
+    return order, invoiced
+
+
+def record_failure(razorpay_order_id, payment_id):
+    """Record a failed payment attempt; the order stays open, since the customer may pay again"""
+    with transaction.atomic():
+        _record_payment(_locked_order(razorpay_order_id), payment_id, 'failed')
@@ -0,0 +1,104 @@
+"""
+Razorpay client for the async checkout views.
+
+Orders are created over the REST API with one ``httpx.AsyncClient`` per event
+loop, so a request waiting on the gateway holds neither a worker thread nor a
+new TLS handshake. Each client is closed when its loop shuts down. Under ASGI
+that is the server's loop, at exit. Under WSGI every async view runs on a
+loop of its own, so the client lasts for one request. Checkout signatures are verified locally with HMAC-SHA256,
+the same check ``razorpay.Client.utility.verify_payment_signature`` performs.
+Webhook deliveries are signed over the raw body with the webhook secret.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import weakref
+
+import httpx
+from django.conf import settings
+
+from config.profiling import external_call
+
+_clients = weakref.WeakKeyDictionary()
+
+
+class GatewayError(Exception):
+    """Razorpay rejected the request or could not be reached"""
+
+
+class SignatureVerificationError(GatewayError):
+    """The checkout callback's signature doesn't match the order and payment ids"""
+
+
+def is_configured():
+    return bool(settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET)
+
+
+async def _close_with_loop(client):
+    # asyncio.run(), used by uvicorn and by asgiref's async_to_sync(), cancels
+    # the tasks still pending when it finishes, while the loop still runs
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+def get_client():
+    """The shared client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client, _ = _clients.get(loop, (None, None))
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=settings.RAZORPAY_API_URL,
+            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+            timeout=settings.RAZORPAY_TIMEOUT,
+        )
+        # The loop only holds weak references to its tasks
+        _clients[loop] = (client, loop.create_task(_close_with_loop(client)))
+    return client
+
+
+async def create_order(amount, currency='INR', notes=None):
+    """Create a gateway order for ``amount`` in the smallest currency unit (paise)"""
+    with external_call('razorpay'):
+        try:
+            response = await get_client().post('/orders', json={
+                'amount': amount,
+                'currency': currency,
+                'notes': notes or {},
+            })
+        except httpx.HTTPError as e:
+            raise GatewayError(f'Payment gateway unreachable: {e}') from e
+
+    if response.is_error:
+        try:
+            description = response.json()['error']['description']
+        except (ValueError, KeyError, TypeError):
+            description = f'HTTP {response.status_code}'
+        raise GatewayError(description)
+    return response.json()
+
+
+def payment_signature(order_id, payment_id):
+    message = f'{order_id}|{payment_id}'.encode()
+    return hmac.new(settings.RAZORPAY_KEY_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_payment_signature(order_id, payment_id, signature):
+    """Raise SignatureVerificationError unless ``signature`` came from Razorpay for this payment"""
+    expected = payment_signature(order_id, payment_id).encode()
+    if not hmac.compare_digest(expected, str(signature or '').encode()):
+        raise SignatureVerificationError('Invalid payment details')
+
+
+def webhook_signature(body):
+    return hmac.new(settings.RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_webhook_signature(body, signature):
+    """Raise SignatureVerificationError unless the raw ``body`` was signed with the webhook secret"""
+    if not settings.RAZORPAY_WEBHOOK_SECRET:
+        raise SignatureVerificationError('Razorpay webhooks are not configured')
+    if not hmac.compare_digest(webhook_signature(body).encode(), str(signature or '').encode()):
+        raise SignatureVerificationError('Invalid webhook signature')
@@ -0,0 +1,101 @@
+"""
+Idempotent payment requests.
+
+A client that retries, or a customer who double-clicks, must get the first
+attempt's answer, not a second order. A request is identified by one or more
+keys, such as the Razorpay order id and the client's ``Idempotency-Key``
+header. It also has a fingerprint of the parameters that must not change
+between retries.
+
+- ``lookup()`` returns the stored response for any of the keys. It reads the
+  cache, then the ``IdempotencyKey`` table. A key reused by another user or
+  with different parameters raises ``IdempotencyConflict``.
+- ``claim()`` inserts the keys in the caller's transaction, before any side
+  effects. The unique index makes a concurrent duplicate wait for that
+  transaction. If the transaction commits, the duplicate gets the stored
+  response. If it rolls back, the duplicate goes ahead as if it were first.
+- ``complete()`` records the response on the claimed keys and caches it once
+  the transaction commits.
+
+A request that fails rolls back together with its keys, so a retry runs
+it again.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+CACHE_PREFIX = 'idempotency:'
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used by another user or for different parameters"""
+
+
+def fingerprint(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _check(entry, user, request_fingerprint):
+    if entry['user_id'] != user.pk or entry['fingerprint'] != request_fingerprint:
+        raise IdempotencyConflict('This request was already made with different details')
+    return entry
+
+
+def _stored(keys):
+    row = IdempotencyKey.objects.filter(key__in=keys, response_status__isnull=False).first()
+    if row is None:
+        return None
+    return {
+        'user_id': row.user_id, 'fingerprint': row.fingerprint,
+        'status': row.response_status, 'body': row.response_body,
+    }
+
+
+def lookup(keys, user, request_fingerprint):
+    """The stored response for any of ``keys`` as ``{'status', 'body', ...}``, or None"""
+    for entry in cache.get_many([CACHE_PREFIX + key for key in keys]).values():
+        return _check(entry, user, request_fingerprint)
+
+    entry = _stored(keys)
+    if entry is None:
+        return None
+    cache.set_many({CACHE_PREFIX + key: entry for key in keys}, settings.IDEMPOTENCY_CACHE_SECONDS)
+    return _check(entry, user, request_fingerprint)
+
+
+def claim(keys, user, request_fingerprint):
+    """
+    Reserve ``keys`` inside the caller's transaction.
+
+    Returns None when the caller should go ahead. If another request has
+    already completed with these keys, returns its stored response instead;
+    the caller then must not do the work.
+    """
+    try:
+        # Sorted, so two requests sharing some keys lock them in the same order
+        with transaction.atomic():
+            for key in sorted(keys):
+                IdempotencyKey.objects.create(key=key, user=user, fingerprint=request_fingerprint)
+    except IntegrityError:
+        entry = _stored(keys)
+        if entry is None:
+            raise IdempotencyConflict('This request is already being processed')
+        return _check(entry, user, request_fingerprint)
+    return None
+
+
+def complete(keys, user, request_fingerprint, status, body):
+    """Record the response for the claimed ``keys``; it is cached when the transaction commits"""
+    IdempotencyKey.objects.filter(key__in=keys).update(
+        response_status=status, response_body=body, completed_at=timezone.now(),
+    )
+    entry = {'user_id': user.pk, 'fingerprint': request_fingerprint, 'status': status, 'body': body}
+    transaction.on_commit(
+        lambda: cache.set_many({CACHE_PREFIX + key: entry for key in keys}, settings.IDEMPOTENCY_CACHE_SECONDS)
+    )
@@ -0,0 +1,222 @@
+"""
+Invoice PDFs.
+
+Every invoice is rendered once, by a background task queued when the
+invoice is created (see ``payments.signals``). PDFs are stored by content
+at ``invoices/<ab>/<sha256>.pdf``, so identical output is written once and
+the hash doubles as the download's ETag. Rendering is deterministic, so
+re-rendering an unchanged invoice lands on the same file.
+
+``invoice_pdf()`` is the one way to get an invoice's bytes. It reads the
+stored file, or renders and stores it under a row lock if the background
+task hasn't run yet. The approval email and the month-end export both go
+through it, so neither renders an invoice that already has a PDF.
+
+``zip_stream()`` yields a ZIP of many invoices chunk by chunk, holding one
+PDF in memory at a time.
+"""
+
+import csv
+import functools
+import hashlib
+import io
+import posixpath
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from config.exports import ChunkWriter
+from .models import Invoice
+
+PRIMARY = colors.HexColor('#0052cc')
+MUTED = colors.HexColor('#666666')
+
+ZIP_CHUNK_INVOICES = 200
+
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    """Fonts and paragraph styles, set up once per process"""
+    # Bitstream Vera ships with reportlab and covers names outside Latin-1
+    pdfmetrics.registerFont(TTFont('InvoiceSans', 'Vera.ttf'))
+    pdfmetrics.registerFont(TTFont('InvoiceSans-Bold', 'VeraBd.ttf'))
+    return {
+        'brand': ParagraphStyle('brand', fontName='InvoiceSans-Bold', fontSize=22, leading=26, textColor=PRIMARY),
+        'title': ParagraphStyle('title', fontName='InvoiceSans-Bold', fontSize=16, leading=20, spaceBefore=6),
+        'body': ParagraphStyle('body', fontName='InvoiceSans', fontSize=10, leading=14),
+        'muted': ParagraphStyle('muted', fontName='InvoiceSans', fontSize=9, leading=12, textColor=MUTED),
+    }
+
+
+def _money(amount):
+    # Vera has no rupee sign
+    return f'INR {amount:,.2f}'
+
+
+def invoice_data(invoice):
+    """Everything a render needs, as plain values"""
+    order = invoice.order
+    return {
+        'number': invoice.invoice_number,
+        'date': timezone.localdate(invoice.invoice_date).strftime('%d %B %Y'),
+        'order_number': order.order_number,
+        'payment_method': (order.payment_method or 'N/A').upper(),
+        'transaction_id': order.transaction_id or order.razorpay_payment_id,
+        'customer': order.user.get_full_name() or order.user.username,
+        'email': order.user.email,
+        'items': [(item.course.title, item.price) for item in order.items.select_related('course')],
+        'subtotal': invoice.subtotal,
+        'discount': invoice.discount_amount,
+        'tax': invoice.tax_amount,
+        'total': invoice.total_amount,
+        'notes': invoice.notes,
+    }
+
+
+def render_invoice(data):
+    """The invoice PDF as bytes; the same data always renders the same bytes"""
+    # Paragraphs parse their text as markup, so every value from the database is escaped
+    styles = _styles()
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"Invoice {data['number']}", author='CodeLearn', invariant=1, pageCompression=1,
+    )
+
+    details = [
+        [Paragraph(f"<b>Invoice number:</b> {escape(data['number'])}", styles['body']),
+         Paragraph(f"<b>Bill to:</b> {escape(data['customer'])}", styles['body'])],
+        [Paragraph(f"<b>Invoice date:</b> {escape(data['date'])}", styles['body']),
+         Paragraph(escape(data['email']), styles['body'])],
+        [Paragraph(f"<b>Order number:</b> {escape(data['order_number'])}", styles['body']), ''],
+        [Paragraph(f"<b>Payment method:</b> {escape(data['payment_method'])}", styles['body']), ''],
+    ]
+    if data['transaction_id']:
+        details.append([Paragraph(f"<b>Transaction ID:</b> {escape(data['transaction_id'])}", styles['body']), ''])
+
+    rows = [['#', 'Course', 'Price']]
+    rows += [[str(index), Paragraph(escape(title), styles['body']), _money(price)]
+             for index, (title, price) in enumerate(data['items'], 1)]
+    totals = [('Subtotal', data['subtotal'])]
+    if data['discount']:
+        totals.append(('Discount', -data['discount']))
+    if data['tax']:
+        totals.append(('Tax', data['tax']))
+    totals.append(('Total paid', data['total']))
+    rows += [['', label, _money(amount)] for label, amount in totals]
+
+    items = Table(rows, colWidths=[12 * mm, None, 40 * mm], repeatRows=1)
+    items.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'InvoiceSans', 10),
+        ('FONT', (0, 0), (-1, 0), 'InvoiceSans-Bold', 10),
+        ('FONT', (1, -1), (-1, -1), 'InvoiceSans-Bold', 11),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f5f5f5')),
+        ('LINEBELOW', (0, 0), (-1, 0), 1.5, PRIMARY),
+        ('LINEBELOW', (0, 1), (-1, -len(totals) - 1), 0.5, colors.HexColor('#eeeeee')),
+        ('LINEABOVE', (1, -1), (-1, -1), 1.5, PRIMARY),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+        ('ALIGN', (1, -len(totals)), (1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+
+    story = [
+        Paragraph('CodeLearn', styles['brand']),
+        Paragraph('Online Learning Platform', styles['muted']),
+        Spacer(1, 8 * mm),
+        Paragraph('INVOICE', styles['title']),
+        Spacer(1, 4 * mm),
+        Table(details, colWidths=['55%', '45%']),
+        Spacer(1, 8 * mm),
+        items,
+        Spacer(1, 10 * mm),
+    ]
+    if data['notes']:
+        story.append(Paragraph(escape(data['notes']), styles['muted']))
+    story.append(Paragraph('Thank you for your purchase! For support, contact support@codelearn.com', styles['muted']))
+
+    document.build(story)
+    return buffer.getvalue()
+
+
+def content_name(digest):
+    return posixpath.join('invoices', digest[:2], f'{digest}.pdf')
+
+
+def _read(field):
+    try:
+        with field.open('rb') as pdf:
+            return pdf.read()
+    except FileNotFoundError:
+        return None
+
+
+def invoice_pdf(invoice):
+    """The invoice's PDF bytes, rendering and storing them first if that hasn't happened yet"""
+    if invoice.pdf_file:
+        content = _read(invoice.pdf_file)
+        if content is not None:
+            return content
+
+    with transaction.atomic():
+        locked = Invoice.objects.select_for_update(of=('self',)).select_related('order__user').get(pk=invoice.pk)
+        # Whoever held the lock before us may have just stored it
+        content = _read(locked.pdf_file) if locked.pdf_file else None
+        if content is None:
+            content = render_invoice(invoice_data(locked))
+            digest = hashlib.sha256(content).hexdigest()
+            storage = locked.pdf_file.storage
+            name = content_name(digest)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            Invoice.objects.filter(pk=invoice.pk).update(pdf_file=name, pdf_sha256=digest)
+            locked.pdf_file.name, locked.pdf_sha256 = name, digest
+
+    invoice.pdf_file.name, invoice.pdf_sha256 = locked.pdf_file.name, locked.pdf_sha256
+    return content
+
+
+def store_invoice_pdf(invoice_id):
+    """Background task: render the invoice's PDF unless it already has one"""
+    invoice = Invoice.objects.get(pk=invoice_id)
+    if not invoice.pdf_sha256:
+        invoice_pdf(invoice)
+
+
+def invoices_for_month(year, month):
+    """Invoices dated in the given month of the site's time zone, oldest first"""
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+    return Invoice.objects.filter(invoice_date__gte=start, invoice_date__lt=end).order_by('invoice_date', 'id')
+
+
+def zip_stream(invoices):
+    """Yield a ZIP of the invoices' PDFs and an invoices.csv summary, one invoice at a time"""
+    output = ChunkWriter()
+    summary = io.StringIO()
+    writer = csv.writer(summary)
+    writer.writerow(['invoice_number', 'invoice_date', 'order_number', 'email', 'subtotal', 'discount', 'tax', 'total', 'sha256'])
+
+    # PDFs are already compressed, so store them as they are
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for invoice in invoices.select_related('order__user').iterator(chunk_size=ZIP_CHUNK_INVOICES):
+            archive.writestr(f'{invoice.invoice_number}.pdf', invoice_pdf(invoice))
+            writer.writerow([
+                invoice.invoice_number, invoice.invoice_date.isoformat(), invoice.order.order_number,
+                invoice.order.user.email, invoice.subtotal, invoice.discount_amount, invoice.tax_amount,
+                invoice.total_amount, invoice.pdf_sha256,
+            ])
+            yield output.take()
+        archive.writestr('invoices.csv', summary.getvalue())
+    yield output.take()
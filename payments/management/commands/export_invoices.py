@@ -0,0 +1,42 @@
+# payments/management/commands/export_invoices.py
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.invoices import invoices_for_month, zip_stream
+
+
+class Command(BaseCommand):
+    help = 'Writes a ZIP of one month\'s invoice PDFs plus an invoices.csv summary'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            help='Month to export as YYYY-MM (defaults to last month)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Path of the ZIP file (defaults to invoices-YYYY-MM.zip)'
+        )
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must look like 2026-03')
+        else:
+            first_of_this_month = timezone.localdate().replace(day=1)
+            month = (first_of_this_month - timedelta(days=1)).replace(day=1)
+
+        invoices = invoices_for_month(month.year, month.month)
+        output = options['output'] or f'invoices-{month:%Y-%m}.zip'
+        count = invoices.count()
+
+        # The archive is written as it is produced; only one PDF is in memory at a time
+        with open(output, 'wb') as archive:
+            for chunk in zip_stream(invoices):
+                archive.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} invoices for {month:%B %Y} to {output}'))
@@ -0,0 +1,47 @@
+# payments/management/commands/process_payment_screenshots.py
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from payments.models import PaymentTransaction
+from payments.screenshots import is_review_copy, process_screenshot, review_hash
+
+
+class Command(BaseCommand):
+    help = 'Adds thumbnails and hashes to payment screenshots that have no hash yet'
+
+    def handle(self, *args, **options):
+        # Originals are kept as they are; they are the customer's proof of payment
+        pending = (
+            PaymentTransaction.objects.exclude(payment_screenshot='').exclude(payment_screenshot__isnull=True)
+            .filter(screenshot_hash='')
+            .only('pk', 'payment_screenshot', 'payment_screenshot_thumbnail')
+        )
+
+        processed = 0
+        failed = 0
+        for txn in pending.iterator(chunk_size=200):
+            try:
+                with txn.payment_screenshot.open('rb') as source:
+                    data = source.read()
+                # Uploads since the pipeline store their review copy, which is what gets hashed
+                if txn.payment_screenshot_thumbnail and is_review_copy(data):
+                    screenshot = {'hash': review_hash(data)}
+                else:
+                    screenshot = process_screenshot(ContentFile(data, name=txn.payment_screenshot.name))
+            except (OSError, ValidationError) as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'  ✗ Payment {txn.pk}: {e}'))
+                continue
+
+            thumbnail = txn.payment_screenshot_thumbnail.name
+            if not thumbnail:
+                thumbnail = txn.payment_screenshot_thumbnail.field.generate_filename(txn, screenshot['thumbnail'].name)
+                thumbnail = txn.payment_screenshot.storage.save(thumbnail, screenshot['thumbnail'])
+            # update() skips save() so this doesn't bump updated_at
+            PaymentTransaction.objects.filter(pk=txn.pk).update(
+                payment_screenshot_thumbnail=thumbnail, screenshot_hash=screenshot['hash'],
+            )
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} payment screenshots ({failed} failed).'))
@@ -0,0 +1,64 @@
+# payments/management/commands/reconcile_upi.py
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconciliation import StatementError, read_statement, reconcile
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Approves pending UPI payments whose UTR and amount appear in a bank statement CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path of the bank statement CSV')
+        parser.add_argument(
+            '--reviewer',
+            required=True,
+            help='Username recorded as the verifier of approved orders'
+        )
+        parser.add_argument(
+            '--utr-column',
+            help='Header of the UTR column (detected if omitted; UTRs can also be read from a narration column)'
+        )
+        parser.add_argument(
+            '--amount-column',
+            help='Header of the credited amount column (detected if omitted)'
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help='Text encoding of the statement (defaults to UTF-8)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report matches without approving anything'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            reviewer = User.objects.get(username=options['reviewer'], is_staff=True)
+        except User.DoesNotExist:
+            raise CommandError(f"No staff user named {options['reviewer']}")
+
+        try:
+            # The statement is read a row at a time, so its size doesn't matter
+            with open(options['statement'], newline='', encoding=options['encoding']) as statement:
+                rows = read_statement(statement, options['utr_column'], options['amount_column'])
+                result = reconcile(rows, reviewer, dry_run=options['dry_run'])
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        for reference, amount, credited in result['mismatched']:
+            self.stdout.write(self.style.WARNING(f'{reference}: payment of {amount} but statement credit of {credited}'))
+        if result['ambiguous']:
+            self.stdout.write(self.style.WARNING(f"UTRs listed more than once, skipped: {', '.join(result['ambiguous'])}"))
+
+        if options['dry_run']:
+            outcome = f"would approve {result['matched']}"
+        else:
+            outcome = f"approved {result['approved']}"
+            if result['matched'] > result['approved']:
+                outcome += f" ({result['matched'] - result['approved']} were held by a reviewer or already settled)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['credits']} statement credits, {result['matched']} matching payments; {outcome}"
+        ))
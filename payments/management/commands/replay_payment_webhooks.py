@@ -0,0 +1,37 @@
+# payments/management/commands/replay_payment_webhooks.py
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.models import PaymentWebhookEvent
+from payments.webhooks import replay
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Razorpay payment state by applying the stored webhook events again, in the order they arrived'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only replay events received on or after this date (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--errors',
+            action='store_true',
+            help='Only replay events that could not be applied'
+        )
+
+    def handle(self, *args, **options):
+        events = PaymentWebhookEvent.objects.all()
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since must look like 2026-03-01')
+            events = events.filter(received_at__gte=timezone.make_aware(since))
+        if options['errors']:
+            events = events.exclude(error='')
+
+        count, failed = replay(events)
+        self.stdout.write(self.style.SUCCESS(f'Replayed {count} webhook events ({failed} could not be applied).'))
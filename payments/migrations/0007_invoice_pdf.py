@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_file',
+            field=models.FileField(blank=True, help_text='Rendered PDF, named by its SHA-256', upload_to='invoices/'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_verification_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='payment_screenshot_thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='payment/screenshots/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='screenshot_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_razorpay_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(help_text='YYYYMM', max_length=6, unique=True)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'invoice_sequences',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:44
+
+import re
+
+from django.db import migrations, models
+
+# A copy of payments.reconciliation.normalize_utr as it was when this ran
+_UTR_SEPARATORS = re.compile(r'[\s-]+')
+
+
+def normalize_utr(value):
+    return _UTR_SEPARATORS.sub('', value or '').upper()
+
+
+def normalize_upi_references(apps, schema_editor):
+    # References stored before upi_payment normalized them, e.g. "4123 4567 8901"
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+    legacy = PaymentTransaction.objects.filter(payment_method='upi').filter(
+        models.Q(transaction_id__regex=r'[\s\-a-z]') | models.Q(upi_transaction_ref__regex=r'[\s\-a-z]')
+    ).order_by('pk').only('pk', 'transaction_id', 'status', 'upi_transaction_ref')
+    for txn in legacy.iterator(chunk_size=500):
+        transaction_id = normalize_utr(txn.transaction_id)
+        live = PaymentTransaction.objects.filter(transaction_id=transaction_id).exclude(
+            payment_method='upi', status='failed'
+        ).exclude(pk=txn.pk)
+        # Two live payments that turn out to share a UTR keep theirs as typed for a reviewer to sort out
+        if txn.status != 'failed' and live.exists():
+            transaction_id = txn.transaction_id
+        PaymentTransaction.objects.filter(pk=txn.pk).update(
+            transaction_id=transaction_id, upi_transaction_ref=normalize_utr(txn.upi_transaction_ref),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_invoice_sequences'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AddConstraint(
+            model_name='paymenttransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method', 'upi'), ('status', 'failed'), _negated=True), fields=('transaction_id',), name='payment_txn_live_transaction_id_uniq'),
+        ),
+        migrations.RunPython(normalize_upi_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:47
+
+from django.db import migrations, models
+
+
+def forget_perceptual_hashes(apps, schema_editor):
+    # Recomputed as content hashes by manage.py process_payment_screenshots
+    apps.get_model('payments', 'PaymentTransaction').objects.exclude(screenshot_hash='').update(screenshot_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_resubmittable_upi_references'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='screenshot_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(forget_perceptual_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+def forget_content_hashes(apps, schema_editor):
+    # Recomputed as difference hashes by manage.py process_payment_screenshots
+    apps.get_model('payments', 'PaymentTransaction').objects.exclude(screenshot_hash='').update(screenshot_hash='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0015_webhook_retries'),
+    ]
+
+    operations = [
+        migrations.RunPython(forget_content_hashes, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import User
 from courses.models import Course
 import uuid
@@ -49,6 +49,7 @@ class Order(models.Model):
     transaction_id = models.CharField(max_length=100, blank=True)
     razorpay_payment_id = models.CharField(max_length=200, blank=True)
     razorpay_order_id = models.CharField(max_length=200, blank=True)
+    coupon = models.ForeignKey('Coupon', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_orders')
     verified_at = models.DateTimeField(null=True, blank=True)
     rejection_reason = models.TextField(blank=True)
@@ -66,6 +67,11 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_recent_idx'),
+            # Razorpay webhooks find their order by the gateway's order id
+            models.Index(fields=['razorpay_order_id'], condition=~models.Q(razorpay_order_id=''), name='order_razorpay_order_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -157,7 +163,9 @@ class PaymentTransaction(models.Model):
     ]
     
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='transactions')
-    transaction_id = models.CharField(max_length=200, unique=True)
+    # Unique except among rejected UPI payments, so a customer can resubmit a
+    # genuine UTR after a reviewer turned down a mistyped submission
+    transaction_id = models.CharField(max_length=200, db_index=True)
     payment_method = models.CharField(max_length=50)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=TRANSACTION_STATUS, default='pending')
@@ -166,12 +174,28 @@ class PaymentTransaction(models.Model):
     razorpay_signature = models.CharField(max_length=200, blank=True)
     upi_transaction_ref = models.CharField(max_length=200, blank=True)
     payment_screenshot = models.ImageField(upload_to='payment/screenshots/', blank=True, null=True)
+    # Review-size copy, thumbnail and review copy hash of the upload (see payments/screenshots.py)
+    payment_screenshot_thumbnail = models.ImageField(upload_to='payment/screenshots/thumbnails/', blank=True, null=True)
+    screenshot_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Verification queue lease (see payments/verification.py)
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_payments')
+    claimed_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'payment_transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='payment_txn_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['transaction_id'],
+                condition=~models.Q(payment_method='upi', status='failed'),
+                name='payment_txn_live_transaction_id_uniq',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.transaction_id} - {self.status}"
@@ -188,6 +212,8 @@ class Invoice(models.Model):
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True)
+    pdf_file = models.FileField(upload_to='invoices/', blank=True, help_text="Rendered PDF, named by its SHA-256")
+    pdf_sha256 = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -201,14 +227,89 @@ class Invoice(models.Model):
     @classmethod
     def generate_invoice_number(cls):
         """Generate unique invoice number with sequence"""
+        return cls.generate_invoice_numbers(1)[0]
+    
+    @classmethod
+    def generate_invoice_numbers(cls, count):
+        """The next ``count`` invoice numbers in this month's sequence"""
         from django.utils import timezone
-        year = timezone.now().year
-        month = timezone.now().month
-        
-        # Get count of invoices for this month
-        count = cls.objects.filter(
-            invoice_date__year=year,
-            invoice_date__month=month
-        ).count() + 1
-        
-        return f"INV-{year}{month:02d}-{count:05d}"
\ No newline at end of file
+        period = timezone.now().strftime('%Y%m')
+        start = InvoiceSequence.take(period, count)
+        return [f"INV-{period}-{number:05d}" for number in range(start, start + count)]
+
+
+class InvoiceSequence(models.Model):
+    """The last invoice number handed out in a month, one locked row per month"""
+    period = models.CharField(max_length=6, unique=True, help_text="YYYYMM")
+    last_number = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'invoice_sequences'
+    
+    def __str__(self):
+        return f"{self.period}: {self.last_number}"
+    
+    @classmethod
+    def take(cls, period, count):
+        """
+        Reserve ``count`` consecutive numbers in ``period``; returns the first.
+
+        The row stays locked until the caller's transaction ends, so
+        concurrent invoices wait for each other instead of sharing a number.
+        """
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(
+                period=period, defaults={'last_number': cls._highest_issued(period)},
+            )
+            start = sequence.last_number + 1
+            sequence.last_number += count
+            sequence.save(update_fields=['last_number'])
+        return start
+    
+    @staticmethod
+    def _highest_issued(period):
+        # Invoices numbered before the sequence existed; zero-padded, so the largest sorts last
+        last = (
+            Invoice.objects.filter(invoice_number__startswith=f"INV-{period}-")
+            .order_by('-invoice_number').values_list('invoice_number', flat=True).first()
+        )
+        return int(last.rsplit('-', 1)[1]) if last else 0
+
+
+class IdempotencyKey(models.Model):
+    """The stored response of a request that must not run twice (see payments/idempotency.py)"""
+    key = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request's parameters")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+    
+    def __str__(self):
+        return self.key
+
+
+class PaymentWebhookEvent(models.Model):
+    """A Razorpay webhook delivery, stored as received (see payments/webhooks.py)"""
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.TextField(help_text="The request body exactly as Razorpay signed it")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="When a failed event is retried")
+    
+    class Meta:
+        db_table = 'payment_webhook_events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='webhook_event_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} ({self.event_id})"
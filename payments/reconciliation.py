@@ -0,0 +1,134 @@
+"""
+UPI reference handling and bank-statement reconciliation.
+
+Customers type the UTR (the bank's reference for a UPI transfer) when they
+pay by UPI. ``normalize_utr()`` gives the one form that is stored and
+compared, so "1234 5678 9012" and "123456789012" count as the same
+payment.
+
+``reconcile()`` matches a bank statement against the verification queue:
+
+1. The statement CSV is read row by row into a dict of UTR -> credited
+   amount. A UTR listed more than once is left out of the dict, because it
+   can't be matched safely.
+2. Pending UPI payments are streamed from the database and looked up in
+   that dict. A payment matches when its UTR is there with exactly its
+   amount.
+3. Matches are approved in batches through
+   ``payments.verification.approve``, the same path reviewers use.
+
+Both passes are linear, and memory holds one entry per statement credit.
+Run it with ``manage.py reconcile_upi``.
+"""
+
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+
+from . import verification
+
+# Payments approved per transaction
+RECONCILE_BATCH_SIZE = 200
+
+# Header names banks use, most specific first; compared after normalize_header()
+UTR_COLUMNS = ('utr', 'utr no', 'utr number', 'rrn', 'upi ref no', 'transaction reference', 'reference no', 'ref no', 'reference')
+AMOUNT_COLUMNS = ('credit', 'credit amount', 'deposit', 'deposit amount', 'cr amount', 'amount')
+NARRATION_COLUMNS = ('narration', 'description', 'remarks', 'particulars', 'transaction details')
+
+# UPI UTRs (RRNs) are 12 digits; narrations embed them as e.g. "UPI/412345678901/..."
+_UTR_IN_TEXT = re.compile(r'(?<!\d)(\d{12})(?!\d)')
+_UTR_SEPARATORS = re.compile(r'[\s-]+')
+_HEADER_JUNK = re.compile(r'[^a-z0-9]+')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def normalize_utr(value):
+    return _UTR_SEPARATORS.sub('', value or '').upper()
+
+
+def normalize_header(name):
+    return _HEADER_JUNK.sub(' ', (name or '').lower()).strip()
+
+
+def _find_column(headers, wanted, candidates):
+    by_name = {normalize_header(header): header for header in headers}
+    if wanted:
+        if normalize_header(wanted) not in by_name:
+            raise StatementError(f'The statement has no "{wanted}" column')
+        return by_name[normalize_header(wanted)]
+    return next((by_name[name] for name in candidates if name in by_name), None)
+
+
+def _amount(text):
+    text = (text or '').replace(',', '').replace('₹', '').upper().replace('INR', '').replace('CR', '').strip()
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() and amount > 0 else None
+
+
+def read_statement(lines, utr_column=None, amount_column=None):
+    """Yield ``(utr, amount)`` for each credit in a statement CSV, one row at a time"""
+    reader = csv.DictReader(lines)
+    headers = reader.fieldnames or []
+    amount_key = _find_column(headers, amount_column, AMOUNT_COLUMNS)
+    utr_key = _find_column(headers, utr_column, UTR_COLUMNS)
+    narration_key = None if utr_key else _find_column(headers, None, NARRATION_COLUMNS)
+    if not amount_key or not (utr_key or narration_key):
+        raise StatementError('Could not find the UTR and amount columns; name them with --utr-column and --amount-column')
+
+    for row in reader:
+        amount = _amount(row.get(amount_key))
+        if amount is None:
+            continue
+        if utr_key:
+            utr = normalize_utr(row.get(utr_key))
+        else:
+            found = _UTR_IN_TEXT.search(row.get(narration_key) or '')
+            utr = found.group(1) if found else ''
+        if utr:
+            yield utr, amount
+
+
+def build_index(rows):
+    """``(index, ambiguous)``: UTR -> amount for UTRs seen once, and the set of UTRs seen more often"""
+    index, ambiguous = {}, set()
+    for utr, amount in rows:
+        if utr in ambiguous:
+            continue
+        if utr in index:
+            del index[utr]
+            ambiguous.add(utr)
+        else:
+            index[utr] = amount
+    return index, ambiguous
+
+
+def reconcile(rows, reviewer, dry_run=False):
+    """Approve pending UPI payments whose UTR and amount appear in the statement ``rows``"""
+    index, ambiguous = build_index(rows)
+    matched, mismatched = [], []
+    for pk, reference, amount in verification.queue().values_list('pk', 'upi_transaction_ref', 'amount').iterator(chunk_size=2000):
+        credited = index.get(normalize_utr(reference))
+        if credited is None:
+            continue
+        if credited == amount:
+            matched.append(pk)
+        else:
+            mismatched.append((reference, amount, credited))
+
+    approved = 0
+    if not dry_run:
+        for start in range(0, len(matched), RECONCILE_BATCH_SIZE):
+            approved += verification.approve(reviewer, matched[start:start + RECONCILE_BATCH_SIZE])
+    return {
+        'credits': len(index) + len(ambiguous),
+        'ambiguous': sorted(ambiguous),
+        'matched': len(matched),
+        'approved': approved,
+        'mismatched': mismatched,
+    }
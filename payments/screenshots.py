@@ -0,0 +1,156 @@
+"""
+UPI payment screenshots.
+
+An uploaded screenshot is checked and decoded once, in ``process_screenshot()``.
+That one decode produces everything reviewers need:
+
+- a review copy, downsampled to fit ``REVIEW_SIZE``. It is stored as
+  ``payment_screenshot`` in place of the raw upload. The UTR and amount
+  stay readable, but pages no longer load phone-camera megabytes;
+- a ``THUMBNAIL_SIZE`` thumbnail for the admin lists;
+- a 256-bit difference hash (dHash) of the review copy, decoded back
+  from its WebP bytes so the backfill hashes stored copies the same way.
+  Re-saving, recompressing or rescaling a screenshot moves only a few
+  of its bits.
+  ``reused_screenshot()`` flags rows whose hash is within ``HASH_DISTANCE``
+  bits of another payment's, in the admin and in the verification queue.
+  UPI receipts are mostly the same blank template. At 64 bits, different
+  receipts hashed alike; at 256 bits, the amount and UTR lines move
+  enough of them.
+
+The Hamming distance is computed by Postgres, comparing each flagged row
+against every other hashed payment. That is one pass over 64-character
+strings per row on the page or in the batch. Other databases flag only
+identical hashes.
+
+Existing rows are processed with ``manage.py process_payment_screenshots``.
+"""
+
+import posixpath
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db.models import BooleanField, Exists, ExpressionWrapper, Func, IntegerField, OuterRef, Q
+from PIL import Image, ImageOps
+
+from .models import PaymentTransaction
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Far beyond any phone screen, far below a decompression bomb
+MAX_PIXELS = 40_000_000
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+REVIEW_SIZE = (900, 1800)
+THUMBNAIL_SIZE = (120, 120)
+REVIEW_OPTIONS = {'format': 'WEBP', 'quality': 80, 'method': 4}
+THUMBNAIL_OPTIONS = {'format': 'WEBP', 'quality': 70, 'method': 4}
+HASH_SIZE = 16
+# Re-encodes of one screenshot stay within 3 bits; different receipts are 4+ apart
+HASH_DISTANCE = 3
+
+INVALID_MESSAGE = 'Upload the payment screenshot as a PNG, JPEG or WebP image.'
+
+
+def _decode(source):
+    try:
+        image = Image.open(source)
+        if image.format not in ALLOWED_FORMATS:
+            raise ValidationError(INVALID_MESSAGE)
+        if image.width * image.height > MAX_PIXELS:
+            raise ValidationError('The screenshot is too large. Please upload a smaller image.')
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError(INVALID_MESSAGE)
+    return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def _encode(image, size, options):
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def dhash(image):
+    """256-bit difference hash as 64 hex digits: is each pixel brighter than its right neighbour?"""
+    # Box filtering averages every source pixel, so the grid barely moves when the image is rescaled
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX)
+    pixels = small.load()
+    bits = 0
+    for y in range(HASH_SIZE):
+        for x in range(HASH_SIZE):
+            bits = bits << 1 | (pixels[x, y] > pixels[x + 1, y])
+    return f'{bits:0{HASH_SIZE * HASH_SIZE // 4}x}'
+
+
+def review_hash(data):
+    """dHash of a stored review copy's bytes"""
+    with Image.open(BytesIO(data)) as image:
+        return dhash(image)
+
+
+def hash_distance(a, b):
+    """Number of bits that differ between two hashes"""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def is_review_copy(data):
+    """Whether stored screenshot bytes are already a review copy: a WebP that fits ``REVIEW_SIZE``"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.format == 'WEBP' and image.width <= REVIEW_SIZE[0] and image.height <= REVIEW_SIZE[1]
+    except (OSError, SyntaxError):
+        return False
+
+
+def process_screenshot(upload):
+    """
+    Validate, decode and downsample an uploaded screenshot.
+
+    Returns ``{'review': ContentFile, 'thumbnail': ContentFile, 'hash': str}``;
+    raises ValidationError if the upload isn't a usable image.
+    """
+    if upload.size > MAX_UPLOAD_BYTES:
+        raise ValidationError('The screenshot must be smaller than 10 MB.')
+    image = _decode(upload)
+    stem = posixpath.splitext(posixpath.basename(upload.name or 'screenshot'))[0] or 'screenshot'
+    review = _encode(image, REVIEW_SIZE, REVIEW_OPTIONS)
+    return {
+        'review': ContentFile(review, name=f'{stem}.webp'),
+        'thumbnail': ContentFile(_encode(image, THUMBNAIL_SIZE, THUMBNAIL_OPTIONS), name=f'{stem}-thumb.webp'),
+        'hash': review_hash(review),
+    }
+
+
+class HashDistance(Func):
+    """Hamming distance between two hex hash columns"""
+    output_field = IntegerField()
+    arity = 2
+    # Without bit strings, only identical hashes are near each other
+    template = 'CASE WHEN %(expressions)s THEN 0 ELSE %(bits)s END'
+    arg_joiner = ' = '
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, bits=HASH_SIZE * HASH_SIZE, **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        bits = HASH_SIZE * HASH_SIZE
+        return super().as_sql(
+            compiler, connection, template=f"bit_count(('x' || %(expressions)s)::bit({bits}))",
+            arg_joiner=f")::bit({bits}) # ('x' || ", **extra_context,
+        )
+
+
+def reused_screenshot():
+    """Annotation: another payment has a screenshot within ``HASH_DISTANCE`` bits"""
+    nearby = Exists(
+        PaymentTransaction.objects
+        .exclude(screenshot_hash='')
+        .exclude(pk=OuterRef('pk'))
+        .alias(distance=HashDistance('screenshot_hash', OuterRef('screenshot_hash')))
+        .filter(distance__lte=HASH_DISTANCE)
+    )
+    # An empty hash would cast to all zero bits
+    return ExpressionWrapper(~Q(screenshot_hash='') & Q(nearby), output_field=BooleanField())
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from config.background import enqueue
+from config.metrics import record_order_created
+from .invoices import store_invoice_pdf
+from .models import Invoice, Order
+
+
+@receiver(post_save, sender=Order)
+def count_created_order(sender, instance, created, **kwargs):
+    """Feed the orders_created metric"""
+    if created:
+        record_order_created(instance)
+
+
+@receiver(post_save, sender=Invoice)
+def render_invoice_pdf(sender, instance, created, **kwargs):
+    """Render a new invoice's PDF in the background once it is committed"""
+    if created:
+        enqueue(store_invoice_pdf, instance.id)
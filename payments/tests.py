@@ -1,3 +1,932 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+from courses.models import Course
+from enrollment.models import Enrollment
+from users.models import User
+from . import fulfilment, gateway, idempotency, invoices, reconciliation, screenshots, verification, webhooks
+from .emails import send_payment_approved_email
+from .models import Cart, CartItem, Invoice, Order, OrderItem, PaymentTransaction, PaymentWebhookEvent
+
+
+def make_screenshot(size=(1080, 2400), fmt='PNG', name='screenshot.png', utr='', **options):
+    """A phone-sized image shaped like a UPI receipt, optionally showing a UTR"""
+    image = Image.new('RGB', size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    draw.rectangle([0, 0, width, height // 8], fill=(40, 90, 200))
+    draw.ellipse([width // 3, height // 4, width * 2 // 3, height // 2], fill=(30, 160, 90))
+    draw.rectangle([width // 10, height * 3 // 5, width * 9 // 10, height * 2 // 3], fill=(20, 20, 20))
+    draw.text((width // 10, height * 3 // 4), utr, fill=(20, 20, 20), font=ImageFont.load_default(width // 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def signed_event(razorpay_order_id, amount, event='payment.captured', payment_id='pay_1'):
+    """A Razorpay webhook delivery as ``(body, headers)``, signed with the test webhook secret"""
+    body = json.dumps({
+        'entity': 'event',
+        'event': event,
+        'payload': {'payment': {'entity': {'id': payment_id, 'order_id': razorpay_order_id, 'amount': amount}}},
+    }).encode()
+    headers = {
+        'X-Razorpay-Signature': gateway.webhook_signature(body),
+        'X-Razorpay-Event-Id': f'evt_{hashlib.sha256(body).hexdigest()[:14]}',
+    }
+    return body, headers
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+@override_settings(RAZORPAY_KEY_ID='rzp_test_key', RAZORPAY_KEY_SECRET='rzp_test_secret')
+class RazorpayCheckoutTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        self.course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.user, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, course=self.course)
+        self.client.force_login(self.user)
+
+    def mock_gateway(self, handler):
+        client = httpx.AsyncClient(base_url='https://gateway.test/v1', transport=httpx.MockTransport(handler))
+        return mock.patch.object(gateway, 'get_client', return_value=client)
+
+    def test_gateway_client_is_shared_and_closed_with_its_loop(self):
+        async def open_clients():
+            return gateway.get_client(), gateway.get_client()
+
+        # A new loop per call, as async views get under WSGI
+        first, again = async_to_sync(open_clients)()
+
+        self.assertIs(first, again)
+        self.assertTrue(first.is_closed)
+
+    def post_json(self, name, data=None):
+        return self.client.post(reverse(name), json.dumps(data or {}), content_type='application/json')
+
+    def test_create_order(self):
+        def handler(request):
+            self.assertEqual(json.loads(request.content)['amount'], 49900)
+            return httpx.Response(200, json={'id': 'order_1', 'amount': 49900})
+
+        with self.mock_gateway(handler):
+            response = self.post_json('payments:create_razorpay_order')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['order_id'], 'order_1')
+        self.assertEqual(response.json()['razorpay_key'], 'rzp_test_key')
+
+    def test_gateway_error(self):
+        def handler(request):
+            return httpx.Response(400, json={'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Authentication failed'}})
+
+        with self.mock_gateway(handler):
+            response = self.post_json('payments:create_razorpay_order')
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.json()['error'], 'Authentication failed')
+
+    def test_verify_payment(self):
+        signature = gateway.payment_signature('order_1', 'pay_1')
+
+        response = self.post_json('payments:verify_razorpay_payment', {
+            'razorpay_order_id': 'order_1', 'razorpay_payment_id': 'pay_1', 'razorpay_signature': signature,
+        })
+
+        self.assertTrue(response.json()['success'])
+        order = Order.objects.get(razorpay_payment_id='pay_1')
+        self.assertEqual(order.payment_status, 'completed')
+        self.assertTrue(Enrollment.objects.filter(user=self.user, course=self.course).exists())
+        self.assertFalse(self.cart.items.exists())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][0], f'{order.invoice.invoice_number}.pdf')
+
+    def test_verify_payment_retry_is_replayed(self):
+        payment = {
+            'razorpay_order_id': 'order_1', 'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': gateway.payment_signature('order_1', 'pay_1'),
+        }
+        self.addCleanup(cache.clear)
+        first = self.post_json('payments:verify_razorpay_payment', payment)
+
+        with mock.patch.object(gateway, 'verify_payment_signature') as verify:
+            retry = self.post_json('payments:verify_razorpay_payment', payment)
+            # Past the cache, the table still answers
+            cache.clear()
+            late_retry = self.post_json('payments:verify_razorpay_payment', payment)
+        verify.assert_not_called()
+
+        for response in (retry, late_retry):
+            self.assertEqual(response.json(), first.json())
+            self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # A request that got past the lookup still doesn't run the order pipeline twice
+        keys = ['razorpay:order_1']
+        fingerprint = idempotency.fingerprint('order_1', 'pay_1', payment['razorpay_signature'])
+        with transaction.atomic():
+            self.assertEqual(idempotency.claim(keys, self.user, fingerprint)['body'], first.json())
+
+    def test_idempotency_key_reuse_conflicts(self):
+        self.addCleanup(cache.clear)
+        for order_id in ('order_1', 'order_2'):
+            response = self.client.post(
+                reverse('payments:verify_razorpay_payment'),
+                json.dumps({
+                    'razorpay_order_id': order_id, 'razorpay_payment_id': 'pay_1',
+                    'razorpay_signature': gateway.payment_signature(order_id, 'pay_1'),
+                }),
+                content_type='application/json', headers={'Idempotency-Key': 'checkout-1'},
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_invalid_signature(self):
+        response = self.post_json('payments:verify_razorpay_payment', {
+            'razorpay_order_id': 'order_1', 'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'forged',
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_post_only(self):
+        self.assertEqual(self.client.get(reverse('payments:create_razorpay_order')).status_code, 405)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class InvoicePdfTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer', password='x', email='buyer@example.com', first_name='Asha')
+        course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.user, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+        self.order = Order.objects.create(
+            user=self.user, total_amount=499, final_amount=499, payment_method='upi', payment_status='completed',
+        )
+        OrderItem.objects.create(order=self.order, course=course, price=499)
+
+    def create_invoice(self, number='INV-202603-00001'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Invoice.objects.create(order=self.order, invoice_number=number, subtotal=499, total_amount=499)
+
+    def test_rendered_in_background_and_stored_by_content(self):
+        invoice = self.create_invoice()
+
+        invoice.refresh_from_db()
+        self.assertEqual(len(invoice.pdf_sha256), 64)
+        self.assertEqual(invoice.pdf_file.name, f'invoices/{invoice.pdf_sha256[:2]}/{invoice.pdf_sha256}.pdf')
+        with invoice.pdf_file.open('rb') as pdf:
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+    def test_markup_in_names_is_escaped(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Tom & <Jerry')
+        Course.objects.update(title='C++ <b>Basics')
+
+        invoice = self.create_invoice()
+
+        invoice.refresh_from_db()
+        self.assertEqual(len(invoice.pdf_sha256), 64)
+
+    def test_approval_email_attaches_the_stored_pdf(self):
+        invoice = self.create_invoice()
+
+        with mock.patch.object(invoices, 'render_invoice') as render:
+            self.assertTrue(send_payment_approved_email(Order.objects.get(pk=self.order.pk)))
+
+        render.assert_not_called()
+        invoice.refresh_from_db()
+        name, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual((name, mimetype), ('INV-202603-00001.pdf', 'application/pdf'))
+        with invoice.pdf_file.open('rb') as pdf:
+            self.assertEqual(content, pdf.read())
+
+    def test_download(self):
+        url = reverse('payments:download_invoice', args=[self.order.order_number])
+        self.client.force_login(self.user)
+        self.assertRedirects(
+            self.client.get(url), reverse('payments:order_detail', args=[self.order.order_number]),
+            fetch_redirect_response=False
+        )
+
+        invoice = self.create_invoice()
+        invoice.refresh_from_db()
+        response = self.client.get(url)
+
+        self.assertEqual(response['ETag'], f'"{invoice.pdf_sha256}"')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_month_export(self):
+        march = timezone.make_aware(datetime(2026, 3, 15))
+        self.create_invoice()
+        Invoice.objects.update(invoice_date=march)
+        output = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
+        self.addCleanup(shutil.os.remove, output)
+
+        call_command('export_invoices', month='2026-03', output=output, stdout=io.StringIO())
+
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), ['INV-202603-00001.pdf', 'invoices.csv'])
+            self.assertTrue(archive.read('INV-202603-00001.pdf').startswith(b'%PDF'))
+            self.assertIn('INV-202603-00001', archive.read('invoices.csv').decode())
+        self.assertFalse(invoices.invoices_for_month(2026, 4).exists())
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, VERIFICATION_BATCH_SIZE=2)
+class VerificationQueueTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reviewer = User.objects.create_superuser(username='reviewer', password='x', email='reviewer@example.com')
+        self.other = User.objects.create_superuser(username='other', password='x', email='other@example.com')
+        self.buyer = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        self.course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.reviewer, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+        self.payments = [self.create_payment(f'UTR{i}') for i in range(3)]
+
+    def create_payment(self, ref):
+        order = Order.objects.create(user=self.buyer, total_amount=499, final_amount=499, payment_method='upi')
+        OrderItem.objects.create(order=order, course=self.course, price=499)
+        return PaymentTransaction.objects.create(
+            order=order, transaction_id=ref, payment_method='upi', amount=499, upi_transaction_ref=ref,
+        )
+
+    def test_reviewers_get_separate_batches(self):
+        first = verification.claim(self.reviewer)
+        second = verification.claim(self.other)
+
+        self.assertEqual([txn.pk for txn in first], [self.payments[0].pk, self.payments[1].pk])
+        self.assertEqual([txn.pk for txn in second], [self.payments[2].pk])
+        # Reloading the queue hands back the same batch
+        self.assertEqual([txn.pk for txn in verification.claim(self.reviewer)], [txn.pk for txn in first])
+
+    def test_expired_lease_returns_to_queue(self):
+        verification.claim(self.reviewer)
+        PaymentTransaction.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(len(verification.claim(self.other)), 2)
+
+    def test_approve_batch(self):
+        ids = [txn.pk for txn in verification.claim(self.reviewer)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(verification.approve(self.reviewer, ids), 2)
+
+        self.assertEqual(set(PaymentTransaction.objects.filter(pk__in=ids).values_list('status', flat=True)), {'success'})
+        orders = Order.objects.filter(transactions__in=ids)
+        self.assertEqual(set(orders.values_list('payment_status', 'verified_by')), {('completed', self.reviewer.pk)})
+        self.assertEqual(Enrollment.objects.filter(user=self.buyer, course=self.course).count(), 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_enrollments, 1)
+        self.assertEqual(len(set(Invoice.objects.values_list('invoice_number', flat=True))), 2)
+        self.assertEqual(Invoice.objects.filter(order__in=orders).exclude(pdf_sha256='').count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Approving again does nothing
+        self.assertEqual(verification.approve(self.reviewer, ids), 0)
+
+    def test_enrollments_inserted_concurrently_are_not_counted(self):
+        order = self.payments[0].order
+        Enrollment.objects.create(user=self.buyer, course=self.course)
+        Course.objects.filter(pk=self.course.pk).update(total_enrollments=1)
+        filter_enrollments = Enrollment.objects.filter
+        calls = []
+
+        def filter_missing_the_new_row(*args, **kwargs):
+            # The first query runs before the other transaction commits its enrollment
+            calls.append(kwargs)
+            return Enrollment.objects.none() if len(calls) == 1 else filter_enrollments(*args, **kwargs)
+
+        with mock.patch.object(Enrollment.objects, 'filter', side_effect=filter_missing_the_new_row):
+            verification._enroll([order.pk])
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_enrollments, 1)
+
+    def test_invoice_numbers_continue_after_existing_invoices(self):
+        period = timezone.now().strftime('%Y%m')
+        Invoice.objects.create(
+            order=self.payments[0].order, invoice_number=f'INV-{period}-00007', subtotal=499, total_amount=499,
+        )
+
+        self.assertEqual(Invoice.generate_invoice_numbers(2), [f'INV-{period}-00008', f'INV-{period}-00009'])
+        self.assertEqual(Invoice.generate_invoice_number(), f'INV-{period}-00010')
+
+    def test_payments_leased_to_another_reviewer_are_skipped(self):
+        held = verification.claim(self.other)
+
+        self.assertEqual(verification.approve(self.reviewer, [txn.pk for txn in held]), 0)
+        self.assertEqual(verification.reject(self.reviewer, [self.payments[2].pk], 'Blurry screenshot'), 1)
+
+        order = Order.objects.get(transactions=self.payments[2])
+        self.assertEqual((order.payment_status, order.rejection_reason), ('failed', 'Blurry screenshot'))
+
+    # Admin templates use {% static %}, which needs collectstatic with the manifest storage
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_reviewer_page(self):
+        url = reverse('admin:payments_paymenttransaction_verify')
+        self.client.force_login(self.reviewer)
+
+        response = self.client.get(url)
+        self.assertContains(response, 'UTR0')
+        self.assertContains(response, 'UTR1')
+        self.assertNotContains(response, 'UTR2')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'ids': [self.payments[0].pk], 'action': 'reject', 'reason': 'Wrong amount'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get(transactions=self.payments[0]).payment_status, 'failed')
+        self.assertEqual(mail.outbox[0].subject, f'Payment Verification Issue - {self.payments[0].order.order_number}')
+
+        self.client.post(url, {'ids': [self.payments[1].pk], 'action': 'release'})
+        self.assertIsNone(PaymentTransaction.objects.get(pk=self.payments[1].pk).claimed_by)
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_settled_payments_posted_to_the_queue_are_skipped(self):
+        approved, rejected = self.payments[0], self.payments[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            verification.approve(self.reviewer, [approved.pk])
+            verification.reject(self.reviewer, [rejected.pk])
+        mail.outbox.clear()
+        url = reverse('admin:payments_paymenttransaction_verify')
+        self.client.force_login(self.reviewer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'ids': [approved.pk], 'action': 'reject', 'reason': 'Oops'})
+            self.client.post(url, {'ids': [rejected.pk], 'action': 'approve'})
+
+        self.assertEqual(
+            dict(Order.objects.filter(transactions__in=[approved, rejected]).values_list('transactions', 'payment_status')),
+            {approved.pk: 'completed', rejected.pk: 'failed'},
+        )
+        self.assertTrue(Enrollment.objects.filter(user=self.buyer, course=self.course).exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_refund_revokes_enrollments(self):
+        other_course = Course.objects.create(
+            title='Celery', slug='celery', instructor=self.reviewer, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+        refunded, kept = self.payments[0], self.payments[1]
+        OrderItem.objects.create(order=refunded.order, course=other_course, price=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            verification.approve(self.reviewer, [refunded.pk, kept.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(verification.refund(self.reviewer, [refunded.pk, self.payments[2].pk], 'Chargeback'), 1)
+
+        order = Order.objects.get(transactions=refunded)
+        self.assertEqual((order.payment_status, order.rejection_reason), ('refunded', 'Chargeback'))
+        self.assertEqual(PaymentTransaction.objects.get(pk=refunded.pk).status, 'failed')
+        # The other approved order still pays for the first course
+        self.assertEqual(
+            list(Enrollment.objects.filter(user=self.buyer).values_list('course', flat=True)), [self.course.pk],
+        )
+        other_course.refresh_from_db()
+        self.assertEqual(other_course.total_enrollments, 0)
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_status_changes_go_through_the_queue(self):
+        payment = self.payments[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            verification.reject(self.reviewer, [payment.pk])
+        url = reverse('admin:payments_paymenttransaction_change', args=[payment.pk])
+        self.client.force_login(self.reviewer)
+
+        def set_status(status):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {
+                    'order': payment.order_id, 'transaction_id': payment.transaction_id, 'payment_method': 'upi',
+                    'amount': '499.00', 'status': status, 'upi_transaction_ref': payment.upi_transaction_ref,
+                })
+            return PaymentTransaction.objects.get(pk=payment.pk).status
+
+        self.assertEqual(set_status('success'), 'failed')
+        self.assertEqual(set_status('pending'), 'pending')
+        self.assertEqual(set_status('success'), 'success')
+        self.assertTrue(Enrollment.objects.filter(user=self.buyer, course=self.course).exists())
+        self.assertEqual(set_status('pending'), 'success')
+        self.assertEqual(set_status('failed'), 'failed')
+        self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, 'refunded')
+        self.assertFalse(Enrollment.objects.filter(user=self.buyer, course=self.course).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SELECT ... FOR UPDATE SKIP LOCKED needs PostgreSQL row locks')
+class VerificationQueueLockingTests(TransactionTestCase):
+    def test_claim_skips_rows_locked_by_another_reviewer(self):
+        buyer = User.objects.create_user(username='buyer', password='x')
+        reviewer = User.objects.create_user(username='reviewer', password='x', is_staff=True)
+        payments = []
+        for ref in ['UTR0', 'UTR1']:
+            order = Order.objects.create(user=buyer, total_amount=499, final_amount=499, payment_method='upi')
+            payments.append(PaymentTransaction.objects.create(
+                order=order, transaction_id=ref, payment_method='upi', amount=499,
+            ))
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    PaymentTransaction.objects.select_for_update().get(pk=payments[0].pk)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            locked.wait(5)
+            batch = verification.claim(reviewer)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([txn.pk for txn in batch], [payments[1].pk])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent invoice numbering needs PostgreSQL row locks')
+class InvoiceNumberLockingTests(TransactionTestCase):
+    def test_concurrent_invoices_get_different_numbers(self):
+        taken, finish = threading.Event(), threading.Event()
+        first = []
+
+        def first_approval():
+            try:
+                with transaction.atomic():
+                    first.extend(Invoice.generate_invoice_numbers(2))
+                    taken.set()
+                    finish.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=first_approval)
+        thread.start()
+        try:
+            taken.wait(5)
+            # Waits on the month's sequence row until the first approval commits
+            threading.Timer(0.2, finish.set).start()
+            second = Invoice.generate_invoice_numbers(1)
+        finally:
+            finish.set()
+            thread.join()
+
+        self.assertEqual(len(set(first + second)), 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Waiting on a concurrent idempotency key needs PostgreSQL row locks')
+class IdempotencyLockingTests(TransactionTestCase):
+    def test_concurrent_claim_waits_for_the_first_request(self):
+        user = User.objects.create_user(username='buyer', password='x')
+        keys, fingerprint = ['razorpay:order_1'], idempotency.fingerprint('order_1', 'pay_1', 'sig')
+        claimed, finish = threading.Event(), threading.Event()
+
+        def first_request():
+            try:
+                with transaction.atomic():
+                    idempotency.claim(keys, user, fingerprint)
+                    claimed.set()
+                    finish.wait(5)
+                    idempotency.complete(keys, user, fingerprint, 200, {'order_number': 'ORD-1'})
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=first_request)
+        thread.start()
+        try:
+            claimed.wait(5)
+            # Blocks on the unique index until the first request commits
+            threading.Timer(0.2, finish.set).start()
+            with transaction.atomic():
+                stored = idempotency.claim(keys, user, fingerprint)
+        finally:
+            finish.set()
+            thread.join()
+            cache.clear()
+
+        self.assertEqual(stored['body'], {'order_number': 'ORD-1'})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ReconciliationTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reviewer = User.objects.create_user(username='reviewer', password='x', is_staff=True)
+        self.buyer = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        self.course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.reviewer, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+
+    def create_payment(self, ref, amount=499):
+        order = Order.objects.create(user=self.buyer, total_amount=amount, final_amount=amount, payment_method='upi')
+        OrderItem.objects.create(order=order, course=self.course, price=amount)
+        return PaymentTransaction.objects.create(
+            order=order, transaction_id=ref, payment_method='upi', amount=amount, upi_transaction_ref=ref,
+        )
+
+    def test_read_statement(self):
+        with_utr = io.StringIO('Date,UTR No.,Debit,Credit\n01/03/2026,4123 4567 8901,,"1,499.00"\n02/03/2026,999999999999,50.00,\n')
+        narrated = io.StringIO('Date,Narration,Amount\n01/03/2026,UPI/412345678901/Asha/okaxis,499.00 CR\n')
+
+        self.assertEqual(list(reconciliation.read_statement(with_utr)), [('412345678901', Decimal('1499.00'))])
+        self.assertEqual(list(reconciliation.read_statement(narrated)), [('412345678901', Decimal('499.00'))])
+        with self.assertRaises(reconciliation.StatementError):
+            list(reconciliation.read_statement(io.StringIO('Date,Memo\n')))
+
+    def test_reconcile_command(self):
+        exact = self.create_payment('412345678901')
+        short = self.create_payment('412345678902')
+        repeated = self.create_payment('412345678903')
+        statement = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(shutil.os.remove, statement.name)
+        statement.write(
+            'UTR,Amount\n412345678901,499.00\n412345678902,400.00\n412345678903,499\n412345678903,499\n555555555555,10\n'
+        )
+        statement.close()
+
+        out = io.StringIO()
+        call_command('reconcile_upi', statement.name, reviewer='reviewer', dry_run=True, stdout=out)
+        self.assertIn('4 statement credits, 1 matching payments; would approve 1', out.getvalue())
+        self.assertEqual(PaymentTransaction.objects.get(pk=exact.pk).status, 'pending')
+
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_upi', statement.name, reviewer='reviewer', stdout=out)
+
+        self.assertIn('412345678902: payment of 499.00 but statement credit of 400.00', out.getvalue())
+        self.assertIn('412345678903', out.getvalue())
+        self.assertEqual(
+            dict(PaymentTransaction.objects.values_list('pk', 'status')),
+            {exact.pk: 'success', short.pk: 'pending', repeated.pk: 'pending'},
+        )
+        self.assertEqual(Order.objects.get(pk=exact.order_id).verified_by, self.reviewer)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_duplicate_utr_is_rejected(self):
+        self.create_payment('412345678901')
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, course=self.course)
+        self.client.force_login(self.buyer)
+
+        response = self.client.post(reverse('payments:upi_payment'), {'transaction_ref': '4123 4567 8901'})
+
+        self.assertContains(response, 'This UTR number has already been submitted.')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(cart.items.exists())
+
+    def test_rejected_utr_can_be_resubmitted(self):
+        rejected = self.create_payment('412345678901')
+        verification.reject(self.reviewer, [rejected.pk], 'No such credit')
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, course=self.course)
+        self.client.force_login(self.buyer)
+
+        self.client.post(reverse('payments:upi_payment'), {'transaction_ref': '4123 4567 8901'})
+
+        self.assertEqual(
+            sorted(PaymentTransaction.objects.filter(transaction_id='412345678901').values_list('status', flat=True)),
+            ['failed', 'pending'],
+        )
+        self.assertFalse(cart.items.exists())
+
+    def test_legacy_references_are_normalized(self):
+        migration = importlib.import_module('payments.migrations.0013_resubmittable_upi_references')
+        spaced = self.create_payment('4123 4567 8901')
+        dashed = self.create_payment('4123-4567-8901')
+        lower = self.create_payment('upi-ref-7')
+
+        migration.normalize_upi_references(apps, None)
+
+        self.assertEqual(
+            dict(PaymentTransaction.objects.values_list('pk', 'transaction_id')),
+            {spaced.pk: '412345678901', dashed.pk: '4123-4567-8901', lower.pk: 'UPIREF7'},
+        )
+        self.assertEqual(PaymentTransaction.objects.get(pk=dashed.pk).upi_transaction_ref, '412345678901')
+
+
+class ScreenshotPipelineTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reviewer = User.objects.create_superuser(username='reviewer', password='x', email='reviewer@example.com')
+        self.buyer = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        self.course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.reviewer, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+
+    def test_process_screenshot(self):
+        result = screenshots.process_screenshot(make_screenshot())
+
+        review = Image.open(result['review'])
+        thumbnail = Image.open(result['thumbnail'])
+        self.assertEqual((review.format, review.size), ('WEBP', (810, 1800)))
+        self.assertLessEqual(max(thumbnail.size), 120)
+        self.assertRegex(result['hash'], r'^[0-9a-f]{64}$')
+        # The same picture in another format hashes the same
+        resent = screenshots.process_screenshot(make_screenshot(fmt='WEBP', name='resent.webp', lossless=True))
+        self.assertEqual(resent['hash'], result['hash'])
+        # A smaller, recompressed copy of one receipt stays close; another receipt doesn't
+        receipts = [
+            screenshots.process_screenshot(make_screenshot(utr=utr, **options))['hash']
+            for utr, options in (
+                ('412345678901', {}),
+                ('412345678901', {'size': (540, 1200), 'fmt': 'JPEG', 'name': 'resent.jpg', 'quality': 40}),
+                ('998877665544', {}),
+            )
+        ]
+        self.assertLessEqual(screenshots.hash_distance(receipts[0], receipts[1]), screenshots.HASH_DISTANCE)
+        self.assertGreater(screenshots.hash_distance(receipts[0], receipts[2]), screenshots.HASH_DISTANCE)
+
+    def test_invalid_uploads_are_rejected(self):
+        for upload in (
+            SimpleUploadedFile('notes.png', b'not an image'),
+            make_screenshot((100, 200), 'GIF', 'animated.gif'),
+        ):
+            with self.subTest(upload.name), self.assertRaises(ValidationError):
+                screenshots.process_screenshot(upload)
+
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, course=self.course)
+        self.client.force_login(self.buyer)
+        response = self.client.post(reverse('payments:upi_payment'), {
+            'transaction_ref': '412345678901', 'payment_screenshot': SimpleUploadedFile('notes.png', b'not an image'),
+        })
+        self.assertContains(response, screenshots.INVALID_MESSAGE)
+        self.assertFalse(Order.objects.exists())
+
+    def test_reused_screenshot_is_flagged(self):
+        # The second order sends the same receipt again, re-saved as a smaller JPEG
+        for ref, screenshot in (
+            ('412345678901', make_screenshot(utr='412345678901')),
+            ('412345678902', make_screenshot((720, 1600), 'JPEG', 'resent.jpg', utr='412345678901', quality=60)),
+        ):
+            cart, _ = Cart.objects.get_or_create(user=self.buyer)
+            CartItem.objects.create(cart=cart, course=self.course)
+            self.client.force_login(self.buyer)
+            self.client.post(reverse('payments:upi_payment'), {
+                'transaction_ref': ref, 'payment_screenshot': screenshot,
+            })
+        other = PaymentTransaction.objects.create(
+            order=Order.objects.create(user=self.buyer, total_amount=499, final_amount=499, payment_method='upi'),
+            transaction_id='412345678903', payment_method='upi', amount=499, upi_transaction_ref='412345678903',
+            payment_screenshot=make_screenshot(name='other.png', utr='412345678903'),
+        )
+
+        first = PaymentTransaction.objects.get(transaction_id='412345678901')
+        self.assertTrue(first.payment_screenshot.name.endswith('.webp'))
+        self.assertTrue(first.payment_screenshot_thumbnail)
+        batch = verification.claim(self.reviewer)
+        self.assertEqual([txn.screenshot_reused for txn in batch], [True, True, False])
+
+        # Screenshots from before the pipeline get a hash and thumbnail from the backfill
+        out = io.StringIO()
+        call_command('process_payment_screenshots', stdout=out)
+        self.assertIn('Processed 1 payment screenshots (0 failed).', out.getvalue())
+        other.refresh_from_db()
+        self.assertEqual(len(other.screenshot_hash), 64)
+        self.assertTrue(other.payment_screenshot_thumbnail.storage.exists(other.payment_screenshot_thumbnail.name))
+
+        # Review copies whose hash was dropped are hashed as stored, not processed again
+        thumbnail = first.payment_screenshot_thumbnail.name
+        PaymentTransaction.objects.filter(pk=first.pk).update(screenshot_hash='')
+        call_command('process_payment_screenshots', stdout=io.StringIO())
+        self.assertEqual(
+            PaymentTransaction.objects.filter(transaction_id='412345678901').values_list('screenshot_hash', 'payment_screenshot_thumbnail').get(),
+            (first.screenshot_hash, thumbnail),
+        )
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_annotates_only_the_changelist(self):
+        other = PaymentTransaction.objects.create(
+            order=Order.objects.create(user=self.buyer, total_amount=499, final_amount=499, payment_method='upi'),
+            transaction_id='412345678903', payment_method='upi', amount=499, status='pending',
+        )
+        self.client.force_login(self.reviewer)
+
+        with CaptureQueriesContext(connection) as page:
+            self.client.get('/admin/payments/paymenttransaction/')
+        with CaptureQueriesContext(connection) as change_form:
+            self.client.get(f'/admin/payments/paymenttransaction/{other.pk}/change/')
+        with CaptureQueriesContext(connection) as action:
+            self.client.post('/admin/payments/paymenttransaction/', {
+                'action': 'reject_payment', '_selected_action': [other.pk], 'index': 0,
+            })
+
+        self.assertTrue(any('EXISTS' in query['sql'] for query in page))
+        self.assertFalse(any('EXISTS' in query['sql'] for query in change_form))
+        self.assertFalse(any('EXISTS' in query['sql'] for query in action))
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'failed')
+
+
+@override_settings(
+    RAZORPAY_KEY_ID='rzp_test_key', RAZORPAY_KEY_SECRET='rzp_test_secret', RAZORPAY_WEBHOOK_SECRET='whsec_test',
+    BACKGROUND_TASKS_EAGER=True,
+)
+class RazorpayWebhookTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer', password='x', email='buyer@example.com')
+        self.course = Course.objects.create(
+            title='Async Django', slug='async-django', instructor=self.user, short_description='-',
+            detailed_description='-', price=499, requirements='-', what_you_will_learn='-',
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, course=self.course)
+        self.order = fulfilment.open_order(
+            self.user, list(self.cart.items.select_related('course')), Decimal('499.00'), Decimal('0.00'), None, 'order_1',
+        )
+        # Retries are driven by hand here, not by a timer firing mid-suite
+        timer = mock.patch('threading.Timer')
+        self.timer = timer.start()
+        self.addCleanup(timer.stop)
+
+    def deliver(self, body, headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            # The acknowledgement is a single insert; the event is applied afterwards
+            with self.assertNumQueries(1):
+                response = self.client.post(
+                    reverse('payments:razorpay_webhook'), body, content_type='application/json', headers=headers,
+                )
+        return response
+
+    def test_captured_payment_fulfils_order_once(self):
+        body, headers = signed_event('order_1', 49900)
+
+        self.assertEqual(self.deliver(body, headers).status_code, 200)
+        self.deliver(body, headers)
+        self.deliver(*signed_event('order_1', 49900, event='order.paid'))
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.razorpay_payment_id), ('completed', 'pay_1'))
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 2)
+        self.assertFalse(PaymentWebhookEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertTrue(Enrollment.objects.filter(user=self.user, course=self.course).exists())
+        self.assertEqual(PaymentTransaction.objects.get(transaction_id='pay_1').status, 'success')
+        self.assertTrue(Invoice.objects.filter(order=self.order).exists())
+        self.assertFalse(self.cart.items.exists())
+        self.assertEqual(len(mail.outbox), 1)
+
+        # The browser reporting back afterwards finds the order already paid
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('payments:verify_razorpay_payment'), json.dumps({
+            'razorpay_order_id': 'order_1', 'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': gateway.payment_signature('order_1', 'pay_1'),
+        }), content_type='application/json')
+        cache.clear()
+        self.assertEqual(response.json()['order_number'], self.order.order_number)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_bad_deliveries_are_rejected(self):
+        body, headers = signed_event('order_1', 49900)
+
+        forged = self.client.post(
+            reverse('payments:razorpay_webhook'), body, content_type='application/json',
+            headers={**headers, 'X-Razorpay-Signature': 'forged'},
+        )
+        self.assertEqual(forged.status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+        # A capture that doesn't match the order is kept with its error, and doesn't block later events
+        self.deliver(*signed_event('order_1', 100))
+        self.deliver(*signed_event('order_1', 49900, event='payment.failed'))
+        errors = list(PaymentWebhookEvent.objects.values_list('event', 'error'))
+        self.assertIn('CheckoutError', errors[0][1])
+        self.assertEqual(errors[1], ('payment.failed', ''))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'pending')
+
+    @override_settings(WEBHOOK_RETRY_SECONDS=60, WEBHOOK_MAX_ATTEMPTS=3)
+    def test_failed_events_are_retried_with_backoff(self):
+        # The order isn't there yet, e.g. the event raced the checkout that creates it
+        self.deliver(*signed_event('order_2', 49900, payment_id='pay_2'))
+        event = PaymentWebhookEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertAlmostEqual((event.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5)
+        self.assertAlmostEqual(self.timer.call_args.args[0], 60, delta=5)
+        self.assertEqual(webhooks.apply_pending(), 0)
+
+        PaymentWebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(webhooks.apply_pending(), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertAlmostEqual((event.next_attempt_at - timezone.now()).total_seconds(), 120, delta=5)
+
+        # Once the order exists, the retry fired by the timer applies the event
+        Order.objects.filter(pk=self.order.pk).update(razorpay_order_id='order_2')
+        PaymentWebhookEvent.objects.update(next_attempt_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            webhooks.drain()
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, event.error, event.next_attempt_at), (3, '', None))
+        self.assertIsNotNone(event.processed_at)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'completed')
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    def test_events_are_given_up_after_the_last_attempt(self):
+        self.deliver(*signed_event('order_2', 49900, payment_id='pay_2'))
+        PaymentWebhookEvent.objects.update(next_attempt_at=timezone.now())
+        webhooks.apply_pending()
+
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNotNone(event.processed_at)
+        self.assertIn('CheckoutError', event.error)
+
+    def test_replay(self):
+        self.deliver(*signed_event('order_1', 49900))
+        self.deliver(*signed_event('order_2', 49900, payment_id='pay_2'))
+
+        # Replaying the log puts a reset order back the way the events left it
+        Order.objects.filter(pk=self.order.pk).update(payment_status='pending')
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('replay_payment_webhooks', stdout=out)
+        self.assertIn('Replayed 2 webhook events (1 could not be applied).', out.getvalue())
+        self.assertEqual(PaymentWebhookEvent.objects.get(processed_at__isnull=True).attempts, 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'completed')
+        self.assertEqual(Invoice.objects.filter(order=self.order).count(), 1)
+
+    def test_replay_rebuilds_state_from_the_log(self):
+        self.deliver(*signed_event('order_1', 49900, event='payment.failed'))
+        self.deliver(*signed_event('order_1', 49900, payment_id='pay_2'))
+        emails = len(mail.outbox)
+        enrollments = Course.objects.get(pk=self.course.pk).total_enrollments
+
+        # State that drifted from the log: the failed attempt marked paid, the capture lost
+        PaymentTransaction.objects.filter(transaction_id='pay_1').update(status='success')
+        PaymentTransaction.objects.filter(transaction_id='pay_2').delete()
+        Order.objects.filter(pk=self.order.pk).update(payment_status='failed', razorpay_payment_id='pay_1')
+
+        # Replaying one event folds in the rest of the order's log too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(webhooks.replay(PaymentWebhookEvent.objects.filter(event='payment.failed')), (2, 0))
+
+        self.assertEqual(
+            dict(PaymentTransaction.objects.values_list('transaction_id', 'status')),
+            {'pay_1': 'failed', 'pay_2': 'success'},
+        )
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.razorpay_payment_id), ('completed', 'pay_2'))
+        self.assertEqual(Invoice.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).total_enrollments, enrollments)
+        self.assertEqual(len(mail.outbox), emails)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('payment/razorpay/create-order/', views.create_razorpay_order, name='create_razorpay_order'),
     path('payment/razorpay/verify/', views.verify_razorpay_payment, name='verify_razorpay_payment'),
     path('payment/upi/', views.upi_payment, name='upi_payment'),
+    path('payment/razorpay/webhook/', views.razorpay_webhook, name='razorpay_webhook'),
     
     # Coupon URLs
     path('apply-coupon/', views.apply_coupon, name='apply_coupon'),
@@ -28,6 +29,7 @@ urlpatterns = [
     # Order URLs
     path('orders/', views.order_history, name='order_history'),
     path('orders/<str:order_number>/', views.order_detail, name='order_detail'),
+    path('orders/<str:order_number>/invoice.pdf', views.download_invoice, name='download_invoice'),
     
     # Direct purchase (skip cart)
     path('buy-now/<int:course_id>/', views.buy_now, name='buy_now'),
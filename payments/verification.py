@@ -0,0 +1,251 @@
+"""
+UPI payment verification queue.
+
+Reviewers work through pending UPI payments in batches:
+
+- ``claim()`` hands a reviewer up to ``VERIFICATION_BATCH_SIZE`` payments,
+  oldest first. Rows are picked with ``SELECT ... FOR UPDATE SKIP LOCKED``
+  and leased to the reviewer for ``VERIFICATION_LEASE_SECONDS``, so two
+  reviewers are never shown the same payment. When a lease runs out the
+  payment goes back to the queue.
+- ``approve()`` and ``reject()`` settle a whole batch in one transaction.
+  Only pending payments are settled; ones leased to someone else, or
+  already settled, are skipped, so a payment is processed once even if two
+  reviewers act on it together. Each approved order gets its enrollments
+  and invoice in a few bulk queries. The customer emails and invoice PDFs
+  are sent from the background once the transaction commits.
+- ``refund()`` is the only way back from an approval. It marks the order
+  refunded and revokes the enrollments it granted. A rejected payment is
+  reviewed again by setting it back to pending.
+
+The admin's approve/reject actions and its status field go through the
+same functions.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from config.background import enqueue
+from config.metrics import record_enrollment_created
+from config.routers import record_background_write
+from courses.models import Course
+from enrollment.models import Enrollment
+from enrollment.timeline import invalidate_enrolled_course_ids
+from .emails import send_payment_approved_email, send_payment_rejected_email
+from .invoices import store_invoice_pdf
+from .models import Invoice, Order, OrderItem, PaymentTransaction
+from .screenshots import reused_screenshot
+
+
+def queue():
+    """Pending UPI payments, oldest first"""
+    return PaymentTransaction.objects.filter(status='pending', payment_method='upi').order_by('created_at', 'pk')
+
+
+def _leased_to_others(reviewer, now):
+    return Q(claimed_until__gt=now) & ~Q(claimed_by=reviewer)
+
+
+def claim(reviewer, size=None):
+    """The reviewer's batch: payments they still hold, topped up from the queue and leased afresh"""
+    size = size or settings.VERIFICATION_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        held = list(queue().filter(claimed_by=reviewer, claimed_until__gt=now).values_list('pk', flat=True)[:size])
+        free = list(
+            queue()
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lte=now))
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:size - len(held)]
+        )
+        ids = held + free
+        PaymentTransaction.objects.filter(pk__in=ids).update(
+            claimed_by=reviewer, claimed_until=now + timedelta(seconds=settings.VERIFICATION_LEASE_SECONDS),
+        )
+    return list(
+        queue().filter(pk__in=ids)
+        .annotate(screenshot_reused=reused_screenshot())
+        .select_related('order__user').prefetch_related('order__items__course')
+    )
+
+
+def release(reviewer, ids):
+    """Put the reviewer's claimed payments back in the queue"""
+    return PaymentTransaction.objects.filter(pk__in=ids, claimed_by=reviewer).update(
+        claimed_by=None, claimed_until=None,
+    )
+
+
+def _lock(reviewer, ids, status='pending'):
+    """Lock the payments in ``ids`` at ``status`` that the reviewer may settle"""
+    return list(
+        PaymentTransaction.objects
+        .filter(pk__in=ids, status=status)
+        .exclude(_leased_to_others(reviewer, timezone.now()))
+        .select_for_update(skip_locked=True)
+        .order_by('pk')
+    )
+
+
+def _settle(transactions, status, now):
+    PaymentTransaction.objects.filter(pk__in=[txn.pk for txn in transactions]).update(
+        status=status, claimed_by=None, claimed_until=None, updated_at=now,
+    )
+
+
+def _enroll(order_ids):
+    """Enroll each order's owner in its courses, skipping enrollments that already exist"""
+    wanted = set(OrderItem.objects.filter(order__in=order_ids).values_list('order__user_id', 'course_id'))
+    if not wanted:
+        return
+    existing = set(
+        Enrollment.objects.filter(
+            user__in={user_id for user_id, _ in wanted}, course__in={course_id for _, course_id in wanted},
+        ).values_list('user_id', 'course_id')
+    )
+    attempted = Enrollment.objects.bulk_create(
+        [Enrollment(user_id=user_id, course_id=course_id) for user_id, course_id in sorted(wanted - existing)],
+        ignore_conflicts=True,
+    )
+    # A row inserted concurrently is skipped without an error, so count only
+    # the rows that carry the enrolled_at this insert stamped on them
+    stamped = {(enrollment.user_id, enrollment.course_id): enrollment.enrolled_at for enrollment in attempted}
+    if not stamped:
+        return
+    created = [
+        enrollment for enrollment in Enrollment.objects.filter(
+            user__in={user_id for user_id, _ in stamped}, course__in={course_id for _, course_id in stamped},
+        ).only('id', 'user_id', 'course_id', 'enrolled_at')
+        if stamped.get((enrollment.user_id, enrollment.course_id)) == enrollment.enrolled_at
+    ]
+    for course_id, count in Counter(enrollment.course_id for enrollment in created).items():
+        Course.objects.filter(pk=course_id).update(total_enrollments=F('total_enrollments') + count)
+    # bulk_create skips post_save, so do what enrollment.signals would
+    for enrollment in created:
+        record_enrollment_created()
+    for user_id in {enrollment.user_id for enrollment in created}:
+        invalidate_enrolled_course_ids(user_id)
+
+
+def _revoke_enrollments(order_ids):
+    """Delete the enrollments these orders granted, unless another paid order grants them too"""
+    granted = set(OrderItem.objects.filter(order__in=order_ids).values_list('order__user_id', 'course_id'))
+    if not granted:
+        return
+    still_paid = set(
+        OrderItem.objects.filter(
+            order__user__in={user_id for user_id, _ in granted}, order__payment_status='completed',
+        ).exclude(order__in=order_ids).values_list('order__user_id', 'course_id')
+    )
+    revoked = Counter()
+    for user_id, course_id in sorted(granted - still_paid):
+        deleted, _ = Enrollment.objects.filter(user_id=user_id, course_id=course_id).delete()
+        # The count includes the lecture progress deleted with the enrollment
+        revoked[course_id] += bool(deleted)
+    for course_id, count in revoked.items():
+        Course.objects.filter(pk=course_id).update(total_enrollments=F('total_enrollments') - count)
+
+
+def _create_invoices(orders, reviewer):
+    orders = [order for order in orders if not hasattr(order, 'invoice')]
+    numbers = Invoice.generate_invoice_numbers(len(orders))
+    note = f"Payment verified by {reviewer.get_full_name() or reviewer.username}"
+    invoices = Invoice.objects.bulk_create([
+        Invoice(
+            order=order, invoice_number=number, subtotal=order.total_amount, discount_amount=order.discount_amount,
+            tax_amount=0, total_amount=order.final_amount, notes=note,
+        )
+        for order, number in zip(orders, numbers)
+    ])
+    # bulk_create skips the signal that queues the PDF
+    for invoice in invoices:
+        enqueue(store_invoice_pdf, invoice.id)
+
+
+def notify_approved(order_id):
+    """Background task: email the customer their approval and invoice"""
+    send_payment_approved_email(Order.objects.select_related('user').get(pk=order_id))
+
+
+def notify_rejected(order_id):
+    """Background task: tell the customer their payment couldn't be verified"""
+    order = Order.objects.select_related('user').get(pk=order_id)
+    send_payment_rejected_email(order, order.rejection_reason)
+
+
+def approve(reviewer, ids):
+    """Approve the payments in ``ids``, fulfilling their orders; returns how many were approved"""
+    now = timezone.now()
+    with transaction.atomic():
+        transactions = _lock(reviewer, ids)
+        if not transactions:
+            return 0
+        _settle(transactions, 'success', now)
+
+        orders = list(
+            Order.objects.filter(pk__in={txn.order_id for txn in transactions})
+            .exclude(payment_status='completed')
+            .select_related('invoice')
+            .select_for_update(of=('self',))
+        )
+        order_ids = [order.pk for order in orders]
+        Order.objects.filter(pk__in=order_ids).update(
+            payment_status='completed', verified_by=reviewer, verified_at=now, updated_at=now,
+        )
+        _enroll(order_ids)
+        _create_invoices(orders, reviewer)
+        record_background_write(order.user_id for order in orders)
+        for order_id in order_ids:
+            enqueue(notify_approved, order_id)
+    return len(transactions)
+
+
+def reject(reviewer, ids, reason=''):
+    """Reject the payments in ``ids`` and fail their orders; returns how many were rejected"""
+    now = timezone.now()
+    with transaction.atomic():
+        transactions = _lock(reviewer, ids)
+        if not transactions:
+            return 0
+        _settle(transactions, 'failed', now)
+
+        orders = Order.objects.filter(pk__in={txn.order_id for txn in transactions})
+        order_ids = list(orders.exclude(payment_status='failed').values_list('pk', flat=True))
+        update = {'payment_status': 'failed', 'verified_by': reviewer, 'verified_at': now, 'updated_at': now}
+        if reason:
+            update['rejection_reason'] = reason
+        Order.objects.filter(pk__in=order_ids).update(**update)
+        record_background_write(Order.objects.filter(pk__in=order_ids).values_list('user_id', flat=True))
+        for order_id in order_ids:
+            enqueue(notify_rejected, order_id)
+    return len(transactions)
+
+
+def refund(reviewer, ids, reason=''):
+    """Reverse approved payments in ``ids``: refund their orders and revoke the enrollments; returns how many"""
+    now = timezone.now()
+    with transaction.atomic():
+        transactions = _lock(reviewer, ids, status='success')
+        if not transactions:
+            return 0
+        _settle(transactions, 'failed', now)
+
+        order_ids = list(
+            Order.objects.filter(pk__in={txn.order_id for txn in transactions}, payment_status='completed')
+            .select_for_update().values_list('pk', flat=True)
+        )
+        update = {'payment_status': 'refunded', 'verified_by': reviewer, 'verified_at': now, 'updated_at': now}
+        if reason:
+            update['rejection_reason'] = reason
+        Order.objects.filter(pk__in=order_ids).update(**update)
+        # The invoice stays; it records a sale that was made and then refunded
+        _revoke_enrollments(order_ids)
+        record_background_write(Order.objects.filter(pk__in=order_ids).values_list('user_id', flat=True))
+        for order_id in order_ids:
+            enqueue(notify_rejected, order_id)
+    return len(transactions)
@@ -1,20 +1,23 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from decimal import Decimal
 import json
-from .models import Cart, CartItem, Order, OrderItem, Coupon
+from .models import Cart, CartItem, Order, OrderItem, Coupon, Invoice
 from courses.models import Course
 from enrollment.models import Enrollment
-
-try:
-    import razorpay
-except ImportError:
-    razorpay = None
+from config import async_views
+from config.background import enqueue
+from . import fulfilment, gateway, idempotency, invoices, screenshots, webhooks
 
 
 @login_required
@@ -291,6 +294,30 @@ def order_detail(request, order_number):
     return render(request, 'payments/order_detail.html', context)
 
 
+@login_required
+def download_invoice(request, order_number):
+    """Download the order's invoice as PDF"""
+    invoice = Invoice.objects.filter(order__order_number=order_number, order__user=request.user).first()
+    if invoice is None:
+        messages.info(request, 'The invoice is issued once your payment is approved.')
+        return redirect('payments:order_detail', order_number=order_number)
+    
+    # PDFs are rendered in the background when the invoice is created
+    if not invoice.pdf_sha256:
+        enqueue(invoices.store_invoice_pdf, invoice.id)
+        messages.info(request, 'Your invoice PDF is being prepared. Please try again in a minute.')
+        return redirect('payments:order_detail', order_number=order_number)
+    
+    # Stored by content, so the hash is a strong validator
+    etag = f'"{invoice.pdf_sha256}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(invoice.pdf_file.open('rb'), as_attachment=True, filename=f'{invoice.invoice_number}.pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 def buy_now(request, course_id):
     """Direct purchase - skip cart"""
@@ -309,178 +336,192 @@ def buy_now(request, course_id):
     return redirect('payments:checkout')
 
 
-@login_required
-@require_POST
-def create_razorpay_order(request):
+def _cart_totals(request):
+    """The user's cart, its items, subtotal, coupon discount and coupon"""
+    cart = Cart.objects.get(user=request.user)
+    cart_items = list(cart.items.select_related('course'))
+
+    subtotal = sum((item.course.get_actual_price() for item in cart_items), Decimal('0.00'))
+    discount = Decimal('0.00')
+    coupon = None
+
+    coupon_code = request.session.get('coupon_code')
+    if coupon_code:
+        try:
+            coupon = Coupon.objects.get(code=coupon_code)
+            if coupon.is_valid():
+                if coupon.discount_type == 'percentage':
+                    discount = subtotal * (coupon.discount_value / 100)
+                else:
+                    discount = coupon.discount_value
+        except Coupon.DoesNotExist:
+            pass
+
+    return cart, cart_items, subtotal, discount, coupon
+
+
+@async_views.login_required
+@async_views.require_POST
+async def create_razorpay_order(request):
     """Create a Razorpay order"""
-    if not razorpay:
+    if not gateway.is_configured():
         return JsonResponse({'error': 'Razorpay is not configured'}, status=400)
     
     try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('course')
+        cart, cart_items, subtotal, discount, coupon = await sync_to_async(_cart_totals)(request)
         
-        if not cart_items.exists():
+        if not cart_items:
             return JsonResponse({'error': 'Cart is empty'}, status=400)
         
-        # Calculate total
-        subtotal = cart.get_total()
-        discount = Decimal('0.00')
-        
-        coupon_code = request.session.get('coupon_code')
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=coupon_code)
-                if coupon.is_valid():
-                    if coupon.discount_type == 'percentage':
-                        discount = subtotal * (coupon.discount_value / 100)
-                    else:
-                        discount = coupon.discount_value
-            except Coupon.DoesNotExist:
-                pass
-        
         final_amount = subtotal - discount
         
-        # Initialize Razorpay client
-        client = razorpay.Client(auth=(
-            'YOUR_RAZORPAY_KEY_ID',  # Replace with your key
-            'YOUR_RAZORPAY_KEY_SECRET'  # Replace with your secret
-        ))
-        
-        # Create order
-        razorpay_order = client.order.create(data={
-            'amount': int(final_amount * 100),  # Amount in paise
-            'currency': 'INR',
-            'notes': {
+        # Create order; the worker serves other requests while the gateway answers
+        razorpay_order = await gateway.create_order(
+            fulfilment.to_paise(final_amount),  # Amount in paise
+            notes={
                 'user_id': request.user.id,
                 'user_email': request.user.email
             }
-        })
+        )
+        
+        # Open the order now, so the payment webhook can fulfil it even if the browser never reports back
+        await sync_to_async(fulfilment.open_order)(
+            request.user, cart_items, subtotal, discount, coupon, razorpay_order['id']
+        )
         
         return JsonResponse({
             'order_id': razorpay_order['id'],
             'amount': final_amount,
-            'currency': 'INR'
+            'currency': 'INR',
+            'razorpay_key': settings.RAZORPAY_KEY_ID,
         })
     
     except Cart.DoesNotExist:
         return JsonResponse({'error': 'Cart not found'}, status=404)
+    except gateway.GatewayError as e:
+        return JsonResponse({'error': str(e)}, status=502)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
-@login_required
-@require_POST
-def verify_razorpay_payment(request):
-    """Verify Razorpay payment"""
-    if not razorpay:
+def _verification_keys(request, data):
+    """Idempotency keys of a payment verification: the Razorpay order, and the client's key if it sent one"""
+    keys = [f"razorpay:{data['razorpay_order_id']}"]
+    client_key = request.headers.get('Idempotency-Key', '').strip()
+    if client_key:
+        keys.append(f'client:{request.user.pk}:{client_key[:200]}')
+    return keys
+
+
+def _complete_razorpay_order(request, data, keys, fingerprint):
+    """
+    Fulfil the paid order: enrollments, invoice, coupon use and the emptied cart.
+
+    Returns ``(order, fulfilled, response)``. ``order`` is None when another
+    request already completed this verification, and ``response`` is then
+    the stored one. ``fulfilled`` is False when the payment webhook got
+    there first.
+    """
+    with transaction.atomic():
+        # Waits for a concurrent request with the same keys, before any work is done
+        stored = idempotency.claim(keys, request.user, fingerprint)
+        if stored:
+            return None, False, stored
+        
+        order = Order.objects.filter(razorpay_order_id=data['razorpay_order_id']).order_by('pk').first()
+        if order is None:
+            # Checkouts started before create_razorpay_order opened the order
+            cart, cart_items, subtotal, discount, coupon = _cart_totals(request)
+            fulfilment.open_order(request.user, cart_items, subtotal, discount, coupon, data['razorpay_order_id'])
+        elif order.user_id != request.user.pk:
+            raise fulfilment.CheckoutError('Invalid payment details')
+        
+        order, fulfilled = fulfilment.fulfil(data['razorpay_order_id'], data['razorpay_payment_id'])
+        if 'coupon_code' in request.session:
+            del request.session['coupon_code']
+        
+        response = {
+            'status': 200,
+            'body': {
+                'success': True,
+                'order_number': order.order_number,
+                'message': 'Payment verified successfully'
+            },
+        }
+        idempotency.complete(keys, request.user, fingerprint, response['status'], response['body'])
+    
+    return order, fulfilled, response
+
+
+def _replayed(stored):
+    response = JsonResponse(stored['body'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@async_views.login_required
+@async_views.require_POST
+async def verify_razorpay_payment(request):
+    """Verify Razorpay payment; retries get the first attempt's response"""
+    if not gateway.is_configured():
         return JsonResponse({'error': 'Razorpay is not configured'}, status=400)
     
     try:
         data = json.loads(request.body)
+        keys = _verification_keys(request, data)
+        fingerprint = idempotency.fingerprint(
+            data['razorpay_order_id'], data['razorpay_payment_id'], data['razorpay_signature']
+        )
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid payment details'}, status=400)
+    
+    try:
+        # A retry of a completed verification is answered from the store, without re-verifying
+        stored = await sync_to_async(idempotency.lookup)(keys, request.user, fingerprint)
+        if stored:
+            return _replayed(stored)
         
-        # Initialize Razorpay client
-        client = razorpay.Client(auth=(
-            'YOUR_RAZORPAY_KEY_ID',  # Replace with your key
-            'YOUR_RAZORPAY_KEY_SECRET'  # Replace with your secret
-        ))
-        
-        # Verify signature
-        client.utility.verify_payment_signature({
-            'razorpay_order_id': data['razorpay_order_id'],
-            'razorpay_payment_id': data['razorpay_payment_id'],
-            'razorpay_signature': data['razorpay_signature']
-        })
-        
-        # Payment verified - create order and enrollments
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('course')
-        
-        subtotal = cart.get_total()
-        discount = Decimal('0.00')
-        coupon = None
-        
-        coupon_code = request.session.get('coupon_code')
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=coupon_code)
-                if coupon.is_valid():
-                    if coupon.discount_type == 'percentage':
-                        discount = subtotal * (coupon.discount_value / 100)
-                    else:
-                        discount = coupon.discount_value
-            except Coupon.DoesNotExist:
-                pass
-        
-        final_amount = subtotal - discount
-        
-        # Create order
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=subtotal,
-                discount_amount=discount,
-                final_amount=final_amount,
-                payment_method='razorpay',
-                payment_status='completed',
-                razorpay_payment_id=data['razorpay_payment_id'],
-                razorpay_order_id=data['razorpay_order_id']
-            )
-            
-            # Create order items and enrollments
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    course=item.course,
-                    price=item.course.get_actual_price()
-                )
-                
-                # Create enrollment
-                Enrollment.objects.create(
-                    user=request.user,
-                    course=item.course
-                )
-                
-                # Update course enrollment count
-                item.course.total_enrollments += 1
-                item.course.save()
-            
-            # Create invoice
-            from .models import Invoice
-            Invoice.objects.create(
-                order=order,
-                invoice_number=Invoice.generate_invoice_number(),
-                subtotal=subtotal,
-                discount_amount=discount,
-                tax_amount=0,
-                total_amount=final_amount,
-                notes="Razorpay payment verified automatically"
-            )
-            
-            # Update coupon usage
-            if coupon:
-                coupon.used_count += 1
-                coupon.save()
-                if 'coupon_code' in request.session:
-                    del request.session['coupon_code']
-            
-            # Clear cart
-            cart.items.all().delete()
-            
-            # Send payment approved email
-            from .emails import send_payment_approved_email
-            send_payment_approved_email(order)
+        # Verify signature (local HMAC check, no gateway round-trip)
+        gateway.verify_payment_signature(
+            data['razorpay_order_id'],
+            data['razorpay_payment_id'],
+            data['razorpay_signature']
+        )
         
-        return JsonResponse({
-            'success': True,
-            'order_number': order.order_number,
-            'message': 'Payment verified successfully'
-        })
+        # Payment verified - fulfil the order, unless the webhook already has
+        order, fulfilled, response = await sync_to_async(_complete_razorpay_order)(request, data, keys, fingerprint)
     
-    except razorpay.BadRequestError:
+    except idempotency.IdempotencyConflict as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except (gateway.SignatureVerificationError, fulfilment.CheckoutError):
         return JsonResponse({'error': 'Invalid payment details'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    
+    if order is None:
+        return _replayed(response)
+    
+    # Send payment approved email once the order is committed, unless the webhook already did
+    if fulfilled:
+        from .emails import send_payment_approved_email
+        await async_views.run_blocking(send_payment_approved_email, order)
+    
+    return JsonResponse(response['body'], status=response['status'])
+
+
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """Store a Razorpay webhook delivery and acknowledge it; it is applied in the background"""
+    try:
+        webhooks.receive(
+            request.body,
+            request.headers.get('X-Razorpay-Signature'),
+            request.headers.get('X-Razorpay-Event-Id'),
+        )
+    except webhooks.WebhookError:
+        return HttpResponseBadRequest()
+    return HttpResponse()
 
 
 @login_required
@@ -514,11 +555,28 @@ def upi_payment(request):
     
     # Handle form submission (POST request)
     if request.method == 'POST':
-        transaction_ref = request.POST.get('transaction_ref', '').strip()
-        payment_screenshot = request.FILES.get('payment_screenshot')
+        from .models import PaymentTransaction
+        from .reconciliation import normalize_utr
+        
+        transaction_ref = normalize_utr(request.POST.get('transaction_ref', ''))
+        upload = request.FILES.get('payment_screenshot')
+        screenshot = None
         
+        error = None
         if not transaction_ref:
-            messages.error(request, 'Please enter the transaction reference/UTR number.')
+            error = 'Please enter the transaction reference/UTR number.'
+        elif PaymentTransaction.objects.filter(transaction_id=transaction_ref).exclude(
+            payment_method='upi', status='failed'
+        ).exists():
+            error = 'This UTR number has already been submitted. Please check it and try again.'
+        elif upload:
+            try:
+                screenshot = screenshots.process_screenshot(upload)
+            except ValidationError as e:
+                error = e.messages[0]
+        
+        if error:
+            messages.error(request, error)
             # Get payment configuration for re-rendering
             from .models import PaymentConfig
             payment_config = PaymentConfig.get_config()
@@ -534,45 +592,52 @@ def upi_payment(request):
             return render(request, 'payments/upi_payment.html', context)
         
         # Create order with pending payment status
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=subtotal,
-                discount_amount=discount,
-                final_amount=total,
-                payment_method='upi',
-                payment_status='pending'
-            )
-            
-            # Create payment transaction record
-            from .models import PaymentTransaction
-            payment_txn = PaymentTransaction.objects.create(
-                order=order,
-                transaction_id=transaction_ref,
-                payment_method='upi',
-                amount=total,
-                status='pending',
-                upi_transaction_ref=transaction_ref,
-                payment_screenshot=payment_screenshot
-            )
-            
-            # Create order items
-            for item in cart_items:
-                OrderItem.objects.create(
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=request.user,
+                    total_amount=subtotal,
+                    discount_amount=discount,
+                    final_amount=total,
+                    payment_method='upi',
+                    payment_status='pending'
+                )
+                
+                # Create payment transaction record
+                PaymentTransaction.objects.create(
                     order=order,
-                    course=item.course,
-                    price=item.course.get_actual_price()
+                    transaction_id=transaction_ref,
+                    payment_method='upi',
+                    amount=total,
+                    status='pending',
+                    upi_transaction_ref=transaction_ref,
+                    payment_screenshot=screenshot['review'] if screenshot else None,
+                    payment_screenshot_thumbnail=screenshot['thumbnail'] if screenshot else None,
+                    screenshot_hash=screenshot['hash'] if screenshot else '',
                 )
-            
-            # Update coupon usage if applied
-            if coupon:
-                coupon.used_count += 1
-                coupon.save()
-                if 'coupon_code' in request.session:
-                    del request.session['coupon_code']
-            
-            # Clear cart
-            cart.items.all().delete()
+                
+                # Create order items
+                for item in cart_items:
+                    OrderItem.objects.create(
+                        order=order,
+                        course=item.course,
+                        price=item.course.get_actual_price()
+                    )
+                
+                # Update coupon usage if applied
+                if coupon:
+                    coupon.used_count += 1
+                    coupon.save()
+                
+                # Clear cart
+                cart.items.all().delete()
+        except IntegrityError:
+            # Someone submitted the same UTR between our check and the insert
+            messages.error(request, 'This UTR number has already been submitted. Please check it and try again.')
+            return redirect('payments:upi_payment')
+        
+        if coupon and 'coupon_code' in request.session:
+            del request.session['coupon_code']
         
         messages.success(request, 'Payment details submitted successfully! Your payment will be verified within 24 hours.')
         return redirect('payments:payment_success', order_number=order.order_number)
@@ -0,0 +1,203 @@
+"""
+Razorpay webhooks.
+
+Razorpay posts every payment event to ``razorpay_webhook``. The view checks
+the signature, appends the raw body to ``PaymentWebhookEvent`` with one
+``INSERT ... ON CONFLICT DO NOTHING`` and answers 200. Nothing else runs on
+the request, so the acknowledgement costs a single round trip to the
+database. A redelivered event has the same Razorpay event id, so storing it
+again does nothing.
+
+Every delivery queues ``drain()`` in the background, which applies the
+stored events:
+
+- Events are applied in arrival order, ``WEBHOOK_BATCH_SIZE`` at a time.
+  Each batch is locked with ``SELECT ... FOR UPDATE``, so a consumer in
+  another process waits its turn rather than overtaking.
+- Applying an event is idempotent (see ``payments.fulfilment``). A captured
+  payment fulfils its order once; a repeated or late event changes nothing.
+- If an event can't be applied, its error is recorded and it is passed
+  over, so it doesn't hold up the events behind it. It stays unprocessed and
+  is retried after ``WEBHOOK_RETRY_SECONDS``, doubling with each attempt.
+  ``drain()`` sets a timer for the next retry that falls due. After
+  ``WEBHOOK_MAX_ATTEMPTS`` attempts the event is marked processed and keeps
+  its error.
+
+The ``event`` and ``payload`` columns are never rewritten. Only
+``processed_at``, ``error``, ``attempts`` and ``next_attempt_at`` track the
+consumer's progress. ``manage.py replay_payment_webhooks`` rebuilds payment
+state from the log: see ``replay()``.
+``benchmarks/webhook_load.py`` sends signed fake events for load tests.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from config.background import enqueue
+from . import fulfilment, gateway
+from .models import Order, PaymentTransaction, PaymentWebhookEvent
+from .verification import notify_approved
+
+logger = logging.getLogger(__name__)
+
+_draining = threading.Lock()
+_drain_requested = threading.Event()
+_retry_lock = threading.Lock()
+_retry_timer = None
+
+
+class WebhookError(ValueError):
+    """The delivery isn't a Razorpay event signed with our webhook secret"""
+
+
+def receive(body, signature, event_id=None):
+    """Store a webhook delivery and queue the consumer; raises WebhookError for a bad delivery"""
+    try:
+        gateway.verify_webhook_signature(body, signature)
+        event = json.loads(body)['event']
+    except (gateway.SignatureVerificationError, ValueError, KeyError, TypeError) as e:
+        raise WebhookError(str(e)) from e
+
+    PaymentWebhookEvent.objects.bulk_create([
+        PaymentWebhookEvent(
+            event_id=event_id or hashlib.sha256(body).hexdigest(), event=str(event)[:100], payload=body.decode(),
+        )
+    ], ignore_conflicts=True)
+    enqueue(drain)
+
+
+def _payment(payload):
+    entity = payload['payment']['entity']
+    return entity['order_id'], entity['id'], entity['amount']
+
+
+def _captured(payload):
+    razorpay_order_id, payment_id, amount = _payment(payload)
+    order, fulfilled = fulfilment.fulfil(razorpay_order_id, payment_id, amount)
+    if fulfilled:
+        enqueue(notify_approved, order.pk)
+
+
+def _failed(payload):
+    razorpay_order_id, payment_id, _ = _payment(payload)
+    fulfilment.record_failure(razorpay_order_id, payment_id)
+
+
+# Other events are stored but need nothing applied
+HANDLERS = {
+    'payment.captured': _captured,
+    'order.paid': _captured,
+    'payment.failed': _failed,
+}
+
+
+def retry_delay(attempts):
+    """How long an event that failed ``attempts`` times waits before its next attempt"""
+    return timedelta(seconds=settings.WEBHOOK_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+def apply_pending(batch_size=None):
+    """Apply the oldest unprocessed events that are due, in order; returns how many were handled"""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentWebhookEvent.objects.filter(processed_at__isnull=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by('id')
+            .select_for_update()[:batch_size or settings.WEBHOOK_BATCH_SIZE]
+        )
+        for event in events:
+            handler = HANDLERS.get(event.event)
+            event.attempts += 1
+            event.error = ''
+            event.next_attempt_at = None
+            try:
+                with transaction.atomic():
+                    if handler:
+                        handler(json.loads(event.payload)['payload'])
+            except Exception as e:
+                event.error = f'{type(e).__name__}: {e}'
+                if event.attempts < settings.WEBHOOK_MAX_ATTEMPTS:
+                    logger.warning(f"Could not apply webhook event {event.event_id}, will retry: {str(e)}")
+                    event.next_attempt_at = now + retry_delay(event.attempts)
+                    continue
+                logger.error(f"Giving up on webhook event {event.event_id} after {event.attempts} attempts: {str(e)}")
+            event.processed_at = timezone.now()
+        PaymentWebhookEvent.objects.bulk_update(events, ['processed_at', 'error', 'attempts', 'next_attempt_at'])
+    return len(events)
+
+
+def _schedule_retry():
+    """Drain again when the earliest failed event is due for another attempt"""
+    global _retry_timer
+    due = PaymentWebhookEvent.objects.filter(
+        processed_at__isnull=True, next_attempt_at__isnull=False,
+    ).aggregate(due=Min('next_attempt_at'))['due']
+    with _retry_lock:
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+            _retry_timer = None
+        if due is not None:
+            # A restart loses the timer; the next delivery's drain picks the retries up
+            _retry_timer = threading.Timer(max((due - timezone.now()).total_seconds(), 0), enqueue, (drain,))
+            _retry_timer.daemon = True
+            _retry_timer.start()
+
+
+def drain():
+    """Background task: apply stored events until none are due, then time the next retry"""
+    _drain_requested.set()
+    # One drain per process. A delivery that arrives mid-drain leaves the flag
+    # set for the running drain, which goes round again before it stops.
+    while _drain_requested.is_set() and _draining.acquire(blocking=False):
+        try:
+            while _drain_requested.is_set():
+                _drain_requested.clear()
+                while apply_pending():
+                    pass
+            _schedule_retry()
+        finally:
+            _draining.release()
+
+
+def _order_id(payload):
+    try:
+        return _payment(json.loads(payload)['payload'])[0]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def replay(events):
+    """
+    Rebuild the Razorpay orders ``events`` refer to from the log; returns ``(replayed, failed)``.
+
+    The orders go back to pending and their payment transactions are
+    dropped. Then every logged event for those orders, not only the ones
+    in ``events``, is applied again in arrival order by the usual
+    handlers. Enrollments and invoices are kept, and an order that was
+    invoiced before is completed without counting its coupon again or
+    emailing the customer twice.
+    """
+    with transaction.atomic():
+        order_ids = {order_id for order_id in map(_order_id, events.values_list('payload', flat=True)) if order_id}
+        replayed = [
+            pk for pk, payload in PaymentWebhookEvent.objects.values_list('pk', 'payload').iterator()
+            if _order_id(payload) in order_ids
+        ]
+        log = PaymentWebhookEvent.objects.filter(Q(pk__in=replayed) | Q(pk__in=events.values('pk')))
+        count = log.update(processed_at=None, error='', attempts=0, next_attempt_at=None)
+        PaymentTransaction.objects.filter(payment_method='razorpay', razorpay_order_id__in=order_ids).delete()
+        Order.objects.filter(payment_method='razorpay', razorpay_order_id__in=order_ids).update(
+            payment_status='pending', razorpay_payment_id='', updated_at=timezone.now(),
+        )
+    while apply_pending():
+        pass
+    return count, log.exclude(error='').count()
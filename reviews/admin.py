@@ -1,11 +1,15 @@
 from django.contrib import admin
+
+from config.changelists import FastChangeListMixin
 from .models import Review
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'course', 'rating', 'is_approved', 'created_at']
     list_filter = ['rating', 'is_approved', 'created_at']
+    list_select_related = ['user', 'course']
     search_fields = ['user__username', 'course__title']
+    autocomplete_fields = ['user', 'course']
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
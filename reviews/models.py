@@ -18,4 +18,7 @@ class Review(models.Model):
     class Meta:
         db_table = 'reviews'
         unique_together = ['user', 'course']
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course', '-created_at'], condition=models.Q(is_approved=True), name='review_course_approved_idx'),
+        ]
\ No newline at end of file
@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+
+from config.changelists import FastChangeListMixin
 from .models import User, UserProfile, TwoFactorAuth
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(FastChangeListMixin, BaseUserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'is_instructor', 'two_factor_enabled', 'is_staff']
     list_filter = ['is_instructor', 'two_factor_enabled', 'is_staff', 'is_active']
     fieldsets = BaseUserAdmin.fieldsets + (
@@ -11,16 +13,20 @@ class UserAdmin(BaseUserAdmin):
     )
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'profession', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'profession']
+    autocomplete_fields = ['user']
 
 
 @admin.register(TwoFactorAuth)
-class TwoFactorAuthAdmin(admin.ModelAdmin):
+class TwoFactorAuthAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ['user', 'verification_code', 'code_created_at', 'is_verified', 'failed_attempts', 'locked_until']
     list_filter = ['is_verified', 'code_created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email']
+    autocomplete_fields = ['user']
     readonly_fields = ['verification_code', 'code_created_at', 'is_verified', 'failed_attempts']
     
     fieldsets = (
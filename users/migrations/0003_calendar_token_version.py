@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_two_factor_enabled_twofactorauth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_token_version',
+            field=models.PositiveIntegerField(default=0, help_text='Signed into calendar feed URLs; bump it to revoke them'),
+        ),
+    ]
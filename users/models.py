@@ -5,12 +5,16 @@ import random
 import string
 from django.utils import timezone
 from datetime import timedelta
+from config.metrics import TWO_FACTOR_ATTEMPTS, TWO_FACTOR_LOCKOUTS, child
 
 class User(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
     is_instructor = models.BooleanField(default=False)
     two_factor_enabled = models.BooleanField(default=False)  # NEW FIELD
+    calendar_token_version = models.PositiveIntegerField(
+        default=0, help_text="Signed into calendar feed URLs; bump it to revoke them"
+    )
     
     def __str__(self):
         return self.username
@@ -75,25 +79,30 @@ class TwoFactorAuth(models.Model):
         """Verify the entered code"""
         # Check if account is locked
         if self.locked_until and timezone.now() < self.locked_until:
+            child(TWO_FACTOR_ATTEMPTS, 'locked').inc()
             remaining_time = (self.locked_until - timezone.now()).seconds // 60
             return False, f"Account locked. Try again in {remaining_time} minutes."
         
         # Check if code is expired
         if not self.is_code_valid():
+            child(TWO_FACTOR_ATTEMPTS, 'expired').inc()
             return False, "Verification code has expired. Please request a new one."
         
         # Verify code
         if self.verification_code == entered_code:
+            child(TWO_FACTOR_ATTEMPTS, 'success').inc()
             self.is_verified = True
             self.failed_attempts = 0
             self.locked_until = None
             self.save()
             return True, "Verification successful!"
         else:
+            child(TWO_FACTOR_ATTEMPTS, 'invalid').inc()
             self.failed_attempts += 1
             
             # Lock account after 5 failed attempts
             if self.failed_attempts >= 5:
+                TWO_FACTOR_LOCKOUTS.inc()
                 self.locked_until = timezone.now() + timedelta(minutes=30)
                 self.save()
                 return False, "Too many failed attempts. Account locked for 30 minutes."